@@ -3,10 +3,13 @@ import json
 from typing import Optional
 import os
 import time
+import threading
 # 添加配置管理导入
 from config_manager import get_config
 # 添加OpenAI SDK支持
 from openai import OpenAI
+# JSON快速解析与容错修复
+from utils.json_utils import JSONUtils
 
 
 # 导入AI日志模块
@@ -17,6 +20,68 @@ except ImportError:
     def log_ai_process(*args, **kwargs):
         pass
 
+# 导入AI调用指标模块
+try:
+    from .metrics import record_ai_call
+except ImportError:
+    # 如果导入失败，不记录调用指标
+    def record_ai_call(*args, **kwargs):
+        pass
+
+# 导入AI结果缓存模块
+try:
+    from .ai_cache import get_ai_cache, hash_prompt
+except ImportError:
+    # 如果导入失败，则不启用结果缓存
+    def get_ai_cache():
+        return None
+
+    def hash_prompt(prompt):
+        return ""
+
+# 导入规则快速解析模块
+try:
+    from .rule_extractor import RuleBasedExtractor
+except ImportError:
+    RuleBasedExtractor = None
+
+# 导入输出结构定义模块
+try:
+    from .output_schema import build_output_schema_from_prompt
+except ImportError:
+    build_output_schema_from_prompt = None
+
+# 导入流式JSON增量解析模块
+try:
+    from .stream_json import (StreamingJSONAccumulator, StreamAbortedError,
+                              DEFAULT_MAX_PREAMBLE_CHARS, DEFAULT_MAX_TRAILING_CHARS)
+except ImportError:
+    StreamingJSONAccumulator = None
+    StreamAbortedError = None
+    DEFAULT_MAX_PREAMBLE_CHARS = None
+    DEFAULT_MAX_TRAILING_CHARS = 0
+
+# 导入调用容错模块（重试、对冲、熔断）和端点池模块
+try:
+    from .resilience import ResilientCaller, get_circuit_breaker, get_provider_stats
+    from .endpoint_pool import EndpointPool, get_endpoint_pool
+    from .health_monitor import probe_endpoint
+except ImportError:
+    # 作为脚本直接运行时使用绝对导入
+    from resilience import ResilientCaller, get_circuit_breaker, get_provider_stats
+    from endpoint_pool import EndpointPool, get_endpoint_pool
+    from health_monitor import probe_endpoint
+
+# 模型请求并发限制器（支持with语句的信号量），None表示不限制；
+# 批量处理多个任务目录时由各工作进程设置为跨进程共享的信号量，见business_logic/batch_runner.py
+_request_limiter = None
+
+
+def set_request_limiter(limiter) -> None:
+    """设置当前进程的模型请求并发限制器（如multiprocessing.Manager().Semaphore(n)），传None取消限制"""
+    global _request_limiter
+    _request_limiter = limiter
+
 class CarTestDataProcessor:
     """汽车测试数据处理器 - 支持多种AI模型提供商"""
     
@@ -63,40 +128,119 @@ class CarTestDataProcessor:
         if self.provider in ['openai', 'deepseek'] and not self.api_key:
             raise RuntimeError(f"使用{self.provider}时必须在endpoints.{self.provider}.api_key中配置API密钥")
             
-        # 初始化OpenAI客户端（用于DeepSeek和OpenAI）
+        # 根据提供商设置API端点（支持同一提供商配置多个服务地址）
+        self._setup_api_endpoint(config.ai.load_balancing or {})
+        
+        # 初始化OpenAI客户端（用于DeepSeek和OpenAI），每个服务地址一个客户端
         self.openai_client = None
+        self.openai_clients = {}
         if self.provider in ['openai', 'deepseek']:
             if OpenAI is None:
                 raise RuntimeError("使用OpenAI或DeepSeek时需要安装openai库: pip install openai")
             
-            # 从配置文件读取base_url - 消除硬编码
-            provider_config = self.endpoints_config[self.provider]
-            api_base = provider_config['base_url']
-            
-            # 对于OpenAI SDK，确保base_url格式正确（都需要/v1结尾）
-            if not api_base.endswith('/v1'):
-                api_base = api_base.rstrip('/') + '/v1'
-            
-            self.openai_client = OpenAI(
-                api_key=self.api_key,
-                base_url=api_base
-            )
-            print(f"初始化OpenAI客户端: {self.provider}, base_url: {api_base}")
+            for endpoint in self.endpoint_pool.endpoints:
+                api_base = endpoint.base_url
+                
+                # 对于OpenAI SDK，确保base_url格式正确（都需要/v1结尾）
+                if not api_base.endswith('/v1'):
+                    api_base = api_base + '/v1'
+                
+                self.openai_clients[endpoint.base_url] = OpenAI(
+                    api_key=self.api_key,
+                    base_url=api_base
+                )
+                print(f"初始化OpenAI客户端: {self.provider}, base_url: {api_base}")
             
-        # 根据提供商设置API端点
-        self._setup_api_endpoint()
+            self.openai_client = self.openai_clients[self.base_url]
         
         # 预定义的系统提示词
         self.system_prompt = self._load_system_prompt("system_prompt.txt")
+        
+        # 系统提示词哈希，提示词修改后旧的缓存结果自动失效
+        self.prompt_hash = hash_prompt(self.system_prompt)
+        
+        # Ollama模型保活时长（如 "30m"，-1 表示常驻），None则使用服务端默认值
+        self.keep_alive = config.ai.keep_alive
+        
+        # 流式输出：顶层JSON对象闭合后只继续读取到携带token用量的最后一个分片，
+        # 对象之后仍在生成多余内容时关闭连接（放弃该次统计），前导内容超出预算时提前中止
+        streaming_config = config.ai.streaming or {}
+        self.stream = bool(streaming_config.get('enabled', False) and StreamingJSONAccumulator is not None)
+        self.max_preamble_chars = streaming_config.get('max_preamble_chars', DEFAULT_MAX_PREAMBLE_CHARS)
+        self.max_trailing_chars = streaming_config.get('max_trailing_chars', DEFAULT_MAX_TRAILING_CHARS)
+        
+        # 调用容错：指数退避重试、可选对冲请求、按提供商共享的熔断器和统计
+        resilience_config = config.ai.resilience or {}
+        self.resilience = ResilientCaller(
+            provider=self.provider,
+            max_retries=self.max_retries,
+            breaker=get_circuit_breaker(
+                self.provider,
+                failure_threshold=resilience_config.get('failure_threshold', 5),
+                recovery_seconds=resilience_config.get('recovery_seconds', 30)
+            ),
+            stats=get_provider_stats(self.provider),
+            is_retryable=self._is_retryable_error,
+            base_delay=resilience_config.get('base_delay', 0.5),
+            max_delay=resilience_config.get('max_delay', 8),
+            hedge_enabled=resilience_config.get('hedge_enabled', False),
+            hedge_percentile=resilience_config.get('hedge_percentile', 95),
+            hedge_min_samples=resilience_config.get('hedge_min_samples', 20)
+        )
+        
+        # 最近一次请求的token数和服务端耗时
+        self.last_response_stats = {}
+        # 正在进行的单次请求的状态（统计、计时、取消句柄），重试和对冲的各次请求在各自线程中互不覆盖
+        self._attempt_local = threading.local()
+        
+        # AI结果缓存（配置中未启用时为None）
+        self.result_cache = get_ai_cache()
+        
+        # 结构化输出：用JSON Schema约束模型只生成合法的结果JSON
+        self.structured_output = bool(config.ai.structured_output and build_output_schema_from_prompt is not None)
+        self.output_schema = None
+        if self.structured_output:
+            self.output_schema = build_output_schema_from_prompt(
+                self.system_prompt, config.get_task_score_mapping()
+            )
+        
+        # 规则快速解析器（配置中未启用时为None）
+        self.rule_extractor = None
+        if config.ai.rule_fast_path and RuleBasedExtractor is not None:
+            self.rule_extractor = RuleBasedExtractor.from_system_prompt(
+                self.system_prompt, config.get_task_score_mapping()
+            )
 
-    def _setup_api_endpoint(self):
-        """根据提供商设置API端点 """
+    def _setup_api_endpoint(self, load_balancing: dict):
+        """
+        根据提供商设置API端点
+        
+        endpoints.<provider>.base_urls 配置多个地址时按 ai.load_balancing 策略分发请求，
+        否则使用单个 base_url
+        """
         provider_config = self.endpoints_config[self.provider]
-        base_url = provider_config['base_url']
+        base_urls = provider_config.get('base_urls') or [provider_config['base_url']]
         chat_endpoint = provider_config['chat_endpoint']
         
-        # 构建完整的API URL
-        self.api_url = base_url.rstrip('/') + chat_endpoint
+        strategy = load_balancing.get('strategy', 'least_outstanding')
+        failure_threshold = load_balancing.get('failure_threshold', 3)
+        ejection_seconds = load_balancing.get('ejection_seconds', 30)
+        
+        # 端点池按提供商在进程内共享，在途请求数对所有处理器实例可见；地址或路由参数变化（配置重新加载）时重建
+        self.endpoint_pool = get_endpoint_pool(self.provider, lambda: EndpointPool(
+            provider=self.provider,
+            base_urls=base_urls,
+            chat_endpoint=chat_endpoint,
+            strategy=strategy,
+            failure_threshold=failure_threshold,
+            ejection_seconds=ejection_seconds,
+            probe=self._probe_endpoint,
+            is_failure=self._is_retryable_error
+        ), config_key=(tuple(base_urls), chat_endpoint, strategy, failure_threshold, ejection_seconds))
+        
+        # 第一个端点作为默认地址
+        self.base_url = self.endpoint_pool.endpoints[0].base_url
+        self.api_url = self.endpoint_pool.endpoints[0].api_url
         
         # print(f"使用AI提供商: {self.provider}, 模型: {self.model_name}, API端点: {self.api_url}")
 
@@ -138,17 +282,104 @@ class CarTestDataProcessor:
         except Exception as e:
             raise RuntimeError(f"读取系统提示词文件时出错: {e}")
 
+    def _cache_options(self) -> dict:
+        """返回参与缓存键计算的推理参数（影响模型输出的部分）"""
+        options = dict(self.ai_options or {})
+        options['structured_output'] = self.structured_output
+        return options
+    
+    def _response_format(self) -> Optional[dict]:
+        """
+        OpenAI兼容接口的response_format参数
+        
+        OpenAI支持json_schema约束；DeepSeek等其他兼容接口仅支持json_object模式
+        """
+        if not self.structured_output:
+            return None
+        if self.provider == 'openai':
+            return {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "car_test_result",
+                    "schema": self.output_schema,
+                    "strict": False
+                }
+            }
+        return {"type": "json_object"}
+
+    def _build_messages(self, prompt: str) -> list:
+        """
+        构建对话消息
+        
+        系统提示词始终作为第一条system消息发送，每次请求的前缀完全一致，
+        服务端的提示词缓存（KV cache）可以直接复用，只有末尾的user消息随输入变化
+        """
+        return [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
     def _chat_with_ai(self, prompt: str, stream: bool = False) -> Optional[str]:
         """
         内部方法：调用AI API（支持多种提供商）
+        
+        Args:
+            prompt: 用户消息内容（不含系统提示词）
         """
         if self.provider == 'ollama':
-            return self._chat_with_ollama(prompt, stream)
+            chat = self._chat_with_ollama
         elif self.provider in ['openai', 'deepseek']:
-            return self._chat_with_openai_sdk(prompt, stream)
+            chat = self._chat_with_openai_sdk
         else:
             # 保持兼容性，使用原有的外部API调用方式
-            return self._chat_with_external_api(prompt, stream)
+            chat = self._chat_with_external_api
+        
+        def attempt(cancellation):
+            limiter = _request_limiter
+            if limiter is None:
+                return timed_chat(cancellation)
+            # 批量处理时多个进程共享同一个并发上限
+            with limiter:
+                return timed_chat(cancellation)
+        
+        def timed_chat(cancellation):
+            # 每次尝试（含重试和对冲）独立记录服务端统计并重新计时（用于统计流式输出首个分片耗时），
+            # 统计随结果一起返回，对冲落败的请求不会覆盖胜出请求的统计
+            state = self._attempt_local
+            state.stats = {}
+            state.started_at = time.perf_counter()
+            state.cancellation = cancellation
+            content = chat(prompt, stream)
+            return (content, state.stats) if content is not None else None
+        
+        # 超时、连接错误、429和5xx按退避策略重试，提供商不可用时熔断快速失败
+        self.last_response_stats = {}
+        outcome = self.resilience.call(attempt)
+        if outcome is None:
+            return None
+        content, self.last_response_stats = outcome
+        return content
+    
+    @staticmethod
+    def _is_retryable_error(error: Exception) -> bool:
+        """判断请求异常是否为可重试的临时错误"""
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+        
+        status_code = getattr(error, 'status_code', None)
+        if status_code is None and getattr(error, 'response', None) is not None:
+            status_code = getattr(error.response, 'status_code', None)
+        if status_code is not None:
+            return status_code == 429 or status_code >= 500
+        
+        # OpenAI SDK的连接和超时异常不带状态码
+        return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
     
     def _chat_with_ollama(self, prompt: str, stream: bool = False) -> Optional[str]:
         """
@@ -156,16 +387,19 @@ class CarTestDataProcessor:
         """
         data = {
             "model": self.model_name,
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
+            "messages": self._build_messages(prompt),
             "stream": stream,
             "options": self.ai_options,
         }
         
+        # 结构化输出：Ollama按JSON Schema约束解码
+        if self.structured_output:
+            data["format"] = self.output_schema
+        
+        # 保持模型常驻内存，避免批量处理时逐行重新加载模型
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        
         return self._make_request(data, stream, is_ollama=True)
     
     def _chat_with_openai_sdk(self, prompt: str, stream: bool = False) -> Optional[str]:
@@ -176,56 +410,63 @@ class CarTestDataProcessor:
             raise RuntimeError("OpenAI客户端未初始化")
         
         try:
-            # 构建消息
-            messages = [
-                {
-                    "role": "system",
-                    "content": self.system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-            
             # 从配置中获取参数
             kwargs = {
                 "model": self.model_name,
-                "messages": messages,
+                "messages": self._build_messages(prompt),
                 "stream": stream,
             }
+            if stream:
+                # 流式输出默认不返回用量，要求服务端在最后一个分片中附带token统计
+                kwargs["stream_options"] = {"include_usage": True}
             
             # 添加AI选项参数
-            if hasattr(self.ai_options, 'temperature') and self.ai_options.temperature is not None:
-                kwargs["temperature"] = self.ai_options.temperature
-            if hasattr(self.ai_options, 'max_tokens') and self.ai_options.max_tokens is not None:
-                kwargs["max_tokens"] = self.ai_options.max_tokens
-            if hasattr(self.ai_options, 'top_p') and self.ai_options.top_p is not None:
-                kwargs["top_p"] = self.ai_options.top_p
-            
-            print(f"使用OpenAI SDK调用: {self.provider}, 模型: {self.model_name}")
+            for option_name in ('temperature', 'max_tokens', 'top_p'):
+                if self.ai_options.get(option_name) is not None:
+                    kwargs[option_name] = self.ai_options[option_name]
             
-            # 调用API
-            response = self.openai_client.chat.completions.create(**kwargs)
+            response_format = self._response_format()
+            if response_format:
+                kwargs["response_format"] = response_format
             
-            if stream:
-                # 处理流式响应
-                result = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content:
-                        result += chunk.choices[0].delta.content
-                return result
-            else:
-                # 处理非流式响应
-                if response.choices and response.choices[0].message:
-                    return response.choices[0].message.content
+            with self.endpoint_pool.acquire() as endpoint:
+                print(f"使用OpenAI SDK调用: {self.provider}, 模型: {self.model_name}, 端点: {endpoint.base_url}")
+                
+                # 调用API
+                response = self.openai_clients[endpoint.base_url].chat.completions.create(**kwargs)
+                
+                if stream:
+                    # 对冲落败时关闭连接，服务端随即停止生成
+                    self._attempt_local.cancellation.add_callback(response.close)
+                    # 处理流式响应：读取到用量分片后结束；对象之后的多余输出超出预算或提前中止时
+                    # 关闭连接，服务端随即停止生成
+                    accumulator = StreamingJSONAccumulator(self.max_preamble_chars)
+                    try:
+                        for chunk in response:
+                            if getattr(chunk, 'usage', None):
+                                self._attempt_local.stats.update(self._extract_usage_stats(chunk.usage))
+                            content = chunk.choices[0].delta.content if chunk.choices else None
+                            if self._feed_stream(accumulator, content):
+                                break
+                    finally:
+                        response.close()
+                    return accumulator.getvalue()
                 else:
-                    print("警告: API响应中没有找到有效内容")
-                    return None
+                    # 处理非流式响应
+                    self._attempt_local.stats.update(self._extract_usage_stats(getattr(response, 'usage', None)))
+                    if response.choices and response.choices[0].message:
+                        return response.choices[0].message.content
+                    else:
+                        print("警告: API响应中没有找到有效内容")
+                        return None
                     
+        except StreamAbortedError as e:
+            print(f"流式输出已中止: {e}")
+            return None
         except Exception as e:
+            # 抛给容错层判断是否重试
             print(f"OpenAI SDK调用失败: {e}")
-            return None
+            raise
     
     def _chat_with_external_api(self, prompt: str, stream: bool = False) -> Optional[str]:
         """
@@ -236,26 +477,20 @@ class CarTestDataProcessor:
             'Authorization': f'Bearer {self.api_key}'
         }
         
-        # 为外部API构建包含system消息的请求
-        messages = [
-            {
-                "role": "system",
-                "content": self.system_prompt
-            },
-            {
-                "role": "user",
-                "content": prompt.replace(f"{self.system_prompt}\n\n", "")  # 移除重复的system prompt
-            }
-        ]
-        
         data = {
             "model": self.model_name,
-            "messages": messages,
+            "messages": self._build_messages(prompt),
             "stream": stream,
             "temperature": self.ai_options.get('temperature', 0.0),
             "top_p": self.ai_options.get('top_p', 0.3),
             "max_tokens": self.ai_options.get('max_tokens', self.ai_options.get('num_predict', 256))
         }
+        if stream:
+            data["stream_options"] = {"include_usage": True}
+        
+        response_format = self._response_format()
+        if response_format:
+            data["response_format"] = response_format
         
         return self._make_request(data, stream, headers=headers, is_ollama=False)
     
@@ -264,52 +499,159 @@ class CarTestDataProcessor:
         统一的请求方法
         """
         try:
-            response = requests.post(self.api_url, json=data, timeout=self.timeout, headers=headers)
-            response.raise_for_status()
-            
-            if stream:
-                return self._handle_stream_response(response, is_ollama)
-            else:
-                return self._handle_normal_response(response, is_ollama)
+            with self.endpoint_pool.acquire() as endpoint:
+                response = requests.post(endpoint.api_url, json=data, timeout=self.timeout, headers=headers, stream=stream)
+                response.raise_for_status()
                 
-        except requests.exceptions.RequestException as e:
-            print(f"请求错误: {e}")
+                if stream:
+                    # 读取结束、提前中止或对冲落败时关闭连接，服务端随即停止生成
+                    self._attempt_local.cancellation.add_callback(response.close)
+                    try:
+                        return self._handle_stream_response(response, is_ollama)
+                    finally:
+                        response.close()
+                else:
+                    return self._handle_normal_response(response, is_ollama)
+                
+        except StreamAbortedError as e:
+            print(f"流式输出已中止: {e}")
             return None
         except json.JSONDecodeError as e:
             print(f"JSON 解析错误: {e}")
             return None
+        except requests.exceptions.RequestException as e:
+            # 抛给容错层判断是否重试
+            print(f"请求错误: {e}")
+            raise
     
     def _handle_stream_response(self, response, is_ollama: bool) -> str:
-        """处理流式响应"""
-        result = ""
+        """
+        处理流式响应
+        
+        增量跟踪顶层JSON对象，对象闭合后继续读取到携带token用量和服务端耗时的最后一个分片
+        （Ollama的done分片 / OpenAI兼容接口的usage分片）；对象之后的多余输出超出预算时
+        立即停止读取。对象开始前的前导内容超出预算时抛出StreamAbortedError
+        """
+        accumulator = StreamingJSONAccumulator(self.max_preamble_chars)
         for line in response.iter_lines():
-            if line:
-                chunk = json.loads(line.decode('utf-8'))
-                if is_ollama:
-                    if 'message' in chunk and 'content' in chunk['message']:
-                        content = chunk['message']['content']
-                        result += content
-                    if chunk.get('done', False):
-                        break
-                else:
-                    # OpenAI/DeepSeek格式
-                    if 'choices' in chunk and len(chunk['choices']) > 0:
-                        delta = chunk['choices'][0].get('delta', {})
-                        if 'content' in delta:
-                            result += delta['content']
-                    if chunk.get('choices', [{}])[0].get('finish_reason'):
-                        break
-        return result
+            if not line:
+                continue
+            line = line.decode('utf-8')
+            
+            if is_ollama:
+                chunk = json.loads(line)
+                if self._feed_stream(accumulator, (chunk.get('message') or {}).get('content')):
+                    break
+                if chunk.get('done', False):
+                    # 最后一个数据块包含token数和服务端耗时统计
+                    self._attempt_local.stats.update(self._extract_ollama_stats(chunk))
+                    break
+            else:
+                # OpenAI/DeepSeek格式（SSE：每行以"data: "开头，以"data: [DONE]"结束，用量在[DONE]前的分片中）
+                if line.startswith('data:'):
+                    line = line[5:].strip()
+                if line == '[DONE]':
+                    break
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('usage'):
+                    self._attempt_local.stats.update(self._extract_usage_stats(chunk['usage']))
+                choices = chunk.get('choices') or [{}]
+                if self._feed_stream(accumulator, (choices[0].get('delta') or {}).get('content')):
+                    break
+        return accumulator.getvalue()
+    
+    def _feed_stream(self, accumulator, content: Optional[str]) -> bool:
+        """
+        向累加器输入一个流式分片
+        
+        Returns:
+            应停止读取返回True（对象闭合后的多余输出超过max_trailing_chars，或请求已被对冲取消）
+        """
+        if self._attempt_local.cancellation.cancelled:
+            return True
+        if not content:
+            return False
+        if not accumulator.complete:
+            self._mark_first_token()
+        accumulator.feed(content)
+        return accumulator.complete and accumulator.trailing_chars > self.max_trailing_chars
     
     def _handle_normal_response(self, response, is_ollama: bool) -> str:
         """处理普通响应"""
         result = response.json()
         if is_ollama:
+            self._attempt_local.stats.update(self._extract_ollama_stats(result))
             return result['message']['content']
         else:
             # OpenAI/DeepSeek格式
+            self._attempt_local.stats.update(self._extract_usage_stats(result.get('usage')))
             return result['choices'][0]['message']['content']
     
+    def _mark_first_token(self) -> None:
+        """记录流式输出首个分片的到达耗时（反映排队和提示词处理时间）"""
+        state = self._attempt_local
+        if 'first_token_ms' not in state.stats:
+            state.stats['first_token_ms'] = round((time.perf_counter() - state.started_at) * 1000, 2)
+    
+    @staticmethod
+    def _extract_ollama_stats(result: dict) -> dict:
+        """
+        提取Ollama响应中的token数和服务端耗时（Ollama返回纳秒，这里统一转换为毫秒）
+        
+        prompt_eval_duration 明显下降说明系统提示词前缀命中了KV cache
+        """
+        stats = {}
+        for key in ('prompt_eval_count', 'eval_count'):
+            if key in result:
+                stats[key] = result[key]
+        for key in ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration'):
+            if key in result:
+                stats[f"{key}_ms"] = round(result[key] / 1e6, 2)
+        return stats
+    
+    @staticmethod
+    def _extract_usage_stats(usage) -> dict:
+        """提取OpenAI兼容接口响应中的token用量"""
+        if not usage:
+            return {}
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, 'model_dump') else vars(usage)
+        stats = {
+            'prompt_eval_count': usage.get('prompt_tokens'),
+            'eval_count': usage.get('completion_tokens'),
+        }
+        # DeepSeek返回上下文缓存命中的token数
+        if usage.get('prompt_cache_hit_tokens') is not None:
+            stats['prompt_cache_hit_tokens'] = usage['prompt_cache_hit_tokens']
+        return {k: v for k, v in stats.items() if v is not None}
+    
+    @staticmethod
+    def _is_valid_json(text: str) -> bool:
+        """检查文本是否为合法JSON"""
+        return JSONUtils.is_valid_json(text)
+    
+    @staticmethod
+    def _clean_model_output(result: str) -> str:
+        """
+        清理非结构化模式下的模型输出：跳过思考块、代码块标记和说明文字，
+        单遍容错解析后重新序列化为JSON对象
+        
+        Args:
+            result: 模型原始输出
+            
+        Returns:
+            清理后的文本（无法解析出JSON对象时返回原始响应）
+        """
+        data = JSONUtils.tolerant_parse(result)
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False)
+        
+        # 如果没有找到JSON，保留原始结果但给出警告
+        print(f"警告：无法找到JSON格式，保留原始响应: {result}")
+        return result.strip()
+    
     def process_text(self, user_input: str) -> Optional[str]:
         """
         公开接口：处理用户输入的文本
@@ -326,12 +668,44 @@ class CarTestDataProcessor:
         # 记录开始时间
         start_time = time.time()
         
-        # 构建完整的提示词
-        full_prompt = f"{self.system_prompt}\n\n\"input\": \"{user_input.strip()}\" /no_think"
+        # 规则快速解析：格式规范的语句无需调用模型
+        if self.rule_extractor is not None:
+            rule_result = self.rule_extractor.extract_json(user_input)
+            if rule_result is not None:
+                log_ai_process(
+                    original_text=user_input,
+                    ai_result=rule_result,
+                    model_name="rule_based",
+                    processing_time_ms=(time.time() - start_time) * 1000,
+                    status="rule_hit"
+                )
+                record_ai_call(self.provider, self.model_name, "rule_hit", (time.time() - start_time) * 1000)
+                return rule_result
+        
+        # 查询结果缓存
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.make_key(
+                user_input, self.provider, self.model_name, self._cache_options(), self.prompt_hash
+            )
+            cached_result = self.result_cache.get(cache_key)
+            if cached_result is not None:
+                log_ai_process(
+                    original_text=user_input,
+                    ai_result=cached_result,
+                    model_name=self.model_name,
+                    processing_time_ms=(time.time() - start_time) * 1000,
+                    status="cache_hit"
+                )
+                record_ai_call(self.provider, self.model_name, "cache_hit", (time.time() - start_time) * 1000)
+                return cached_result
+        
+        # 构建用户消息（系统提示词作为独立的system消息发送）
+        user_prompt = f"\"input\": \"{user_input.strip()}\" /no_think"
         
         try:
             # 调用模型处理
-            result = self._chat_with_ai(full_prompt)
+            result = self._chat_with_ai(user_prompt, stream=self.stream)
             
             # 计算处理时间
             processing_time_ms = (time.time() - start_time) * 1000
@@ -347,69 +721,36 @@ class CarTestDataProcessor:
                     status="failed",
                     error_message="AI模型返回None"
                 )
+                record_ai_call(self.provider, self.model_name, "failed", processing_time_ms, self.last_response_stats)
                 return None
                 
-            # 清理结果 - 移除思考标记和代码块标记
-            result = result.strip()
-            result = result.replace("<think>", "").replace("</think>", "")
-            
-            # 清理Markdown代码块标记
-            if result.startswith("```json"):
-                result = result[7:]  # 移除开头的```json
-            if result.startswith("```"):
-                result = result[3:]   # 移除开头的```
-            if result.endswith("```"):
-                result = result[:-3]  # 移除末尾的```
-            
+            # 结构化输出模式下模型直接返回合法JSON，无需清理和修复
             result = result.strip()
-            
-            # 改进的JSON提取逻辑
-            import re
-            # 如果结果已经像JSON格式，直接使用
-            if result.startswith('{') and result.endswith('}'):
-                # 完整的JSON对象
-                pass
-            elif result.startswith('{'):
-                # 可能是不完整的JSON，尝试修复
-                print(f"检测到不完整的JSON响应: {result}")
-                # 如果没有闭合，尝试找到最后一个有意义的位置
-                if not result.endswith('}'):
-                    # 简单修复：如果以引号结尾，加上闭合大括号
-                    if result.endswith('"'):
-                        result += '}'
-                    elif result.endswith(','):
-                        result = result[:-1] + '}'
-                    else:
-                        result += '}'
-                    print(f"尝试修复为: {result}")
-            else:
-                # 尝试提取JSON对象
-                json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                if json_match:
-                    result = json_match.group(0)
-                else:
-                    # 如果没有找到JSON，保留原始结果但给出警告
-                    print(f"警告：无法找到JSON格式，保留原始响应: {result}")
-            
-            result = result.strip()
-            
-            # 验证JSON格式
-            if result:
-                try:
-                    import json
-                    json.loads(result)  # 验证JSON是否有效
-                except json.JSONDecodeError as e:
-                    print(f"JSON格式无效: {e}, 原始结果: {result}")
+            is_valid_json = self.structured_output and self._is_valid_json(result)
+            if not is_valid_json:
+                result = self._clean_model_output(result)
+                is_valid_json = self._is_valid_json(result)
+                if not is_valid_json:
+                    print(f"JSON格式无效, 原始结果: {result}")
                     # 保留原始结果，不返回None
             
+            # 仅缓存有效的JSON结果，无效结果下次仍交给模型重新处理
+            if cache_key is not None and is_valid_json:
+                self.result_cache.put(
+                    cache_key, user_input, result,
+                    provider=self.provider, model_name=self.model_name, prompt_hash=self.prompt_hash
+                )
+            
             # 记录成功日志
             log_ai_process(
                 original_text=user_input,
                 ai_result=result,
                 model_name=self.model_name,
                 processing_time_ms=processing_time_ms,
-                status="success"
+                status="success",
+                response_stats=self.last_response_stats
             )
+            record_ai_call(self.provider, self.model_name, "success", processing_time_ms, self.last_response_stats)
             
             return result
             
@@ -426,6 +767,7 @@ class CarTestDataProcessor:
                 status="error",
                 error_message=str(e)
             )
+            record_ai_call(self.provider, self.model_name, "error", processing_time_ms)
             
             print(f"处理文本时出错: {e}")
             return None
@@ -471,27 +813,22 @@ class CarTestDataProcessor:
         检查 AI 服务是否可用
         
         Returns:
-            bool: 服务是否可用
+            bool: 至少一个端点可用时返回True
         """
-        try:
-            if self.provider == 'ollama':
-                response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-                return response.status_code == 200
-            else:
-                # 对于外部API，发送一个简单的测试请求
-                test_data = {
-                    "model": self.model_name,
-                    "messages": [{"role": "user", "content": "test"}],
-                    "max_tokens": 1
-                }
-                headers = {
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {self.api_key}'
-                }
-                response = requests.post(self.api_url, json=test_data, headers=headers, timeout=10)
-                return response.status_code == 200
-        except Exception:
-            return False
+        return any(self._probe_endpoint(endpoint) for endpoint in self.endpoint_pool.endpoints)
+    
+    def _probe_endpoint(self, endpoint) -> bool:
+        """
+        探测单个端点是否可用（端点池也用它判断摘除的端点能否恢复），只调用不计费的只读接口
+        
+        Args:
+            endpoint: 端点池中的端点
+            
+        Returns:
+            bool: 端点是否可用
+        """
+        healthy, _, _ = probe_endpoint(self.provider, endpoint.base_url, self.api_key)
+        return healthy
 
 # 便捷函数接口
 def ai_process_test_text(user_input: str, model_name: str = None, provider: str = None) -> Optional[str]:
@@ -0,0 +1,330 @@
+"""
+AI结果缓存模块
+基于SQLite的持久化缓存，位于 CarTestDataProcessor.process_text 之前，
+相同（规范化后）的输入在模型、推理参数与系统提示词都不变时直接复用历史结果
+"""
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config_manager import get_config
+
+logger = logging.getLogger(__name__)
+
+# 规范化时去除的空白与标点（ASR输出中的标点并不影响解析结果）；
+# 数字间的小数点和数字前的负号/连字符保留，避免"7.5分"与"75分"、"-5"与"5"得到相同的键
+_NORMALIZE_PATTERN = re.compile(
+    r"(?:[\s，。、；：！？,;:!?\"'“”‘’（）()【】\[\]…~～]|(?<!\d)\.|\.(?!\d)|-(?!\d))+"
+)
+
+# 规范化规则版本，规则变化时使旧缓存键失效
+_NORMALIZE_VERSION = 2
+
+# 默认缓存参数
+DEFAULT_CACHE_PATH = "./data/ai_cache.db"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+
+# 每写入多少条检查一次容量，避免每次写入都做COUNT
+_EVICTION_CHECK_INTERVAL = 100
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化输入文本：全角转半角、统一小写、去除空白和标点（保留数字中的小数点和符号）
+
+    Args:
+        text: 原始输入文本
+
+    Returns:
+        规范化后的文本
+    """
+    if not text:
+        return ""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    return _NORMALIZE_PATTERN.sub("", normalized)
+
+
+def hash_prompt(prompt: str) -> str:
+    """计算系统提示词的哈希值"""
+    return hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()
+
+
+class AIResultCache:
+    """AI结果缓存 - SQLite持久化，支持TTL过期、容量淘汰（LRU）和命中统计"""
+
+    CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS ai_result_cache (
+        cache_key TEXT PRIMARY KEY,                              -- 缓存键（规范化文本+模型+参数+提示词哈希）
+        normalized_text TEXT NOT NULL,                           -- 规范化后的输入文本
+        provider VARCHAR(20),                                    -- AI提供商
+        model_name VARCHAR(100),                                 -- 模型名称
+        prompt_hash CHAR(64),                                    -- 系统提示词哈希
+        result TEXT NOT NULL,                                    -- AI处理结果（JSON字符串）
+        created_at REAL NOT NULL,                                -- 写入时间（epoch秒）
+        last_access REAL NOT NULL,                               -- 最近访问时间（epoch秒）
+        hit_count INTEGER DEFAULT 0                              -- 命中次数
+    );
+    """
+
+    CACHE_INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_ai_result_cache_last_access ON ai_result_cache(last_access);",
+        "CREATE INDEX IF NOT EXISTS idx_ai_result_cache_created_at ON ai_result_cache(created_at);",
+    ]
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        """
+        初始化缓存
+
+        Args:
+            db_path: 缓存数据库文件路径
+            ttl_seconds: 缓存有效期（秒），None或0表示永不过期
+            max_entries: 最大缓存条数，None或0表示不限制
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds or None
+        self.max_entries = max_entries or None
+
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "expired": 0, "evicted": 0}
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 缓存在多个线程间共享同一个连接，由 self._lock 串行化访问
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self.CACHE_TABLE)
+        for index_sql in self.CACHE_INDEXES:
+            self._conn.execute(index_sql)
+        self._conn.commit()
+
+        logger.info(f"AI结果缓存初始化完成: {self.db_path} (ttl={self.ttl_seconds}, max_entries={self.max_entries})")
+
+    @staticmethod
+    def make_key(text: str, provider: str, model_name: str,
+                 options: Optional[Dict[str, Any]], prompt_hash: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            text: 原始输入文本（内部做规范化）
+            provider: AI提供商
+            model_name: 模型名称
+            options: 影响输出的推理参数
+            prompt_hash: 系统提示词哈希
+
+        Returns:
+            缓存键（sha256十六进制字符串）
+        """
+        payload = json.dumps({
+            "text": normalize_text(text),
+            "provider": provider,
+            "model": model_name,
+            "options": options or {},
+            "prompt": prompt_hash,
+            "normalize": _NORMALIZE_VERSION,
+        }, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            cache_key: 缓存键
+
+        Returns:
+            缓存的AI结果，未命中或已过期返回None
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT result, created_at FROM ai_result_cache WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+
+                result, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM ai_result_cache WHERE cache_key = ?", (cache_key,))
+                    self._conn.commit()
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return None
+
+                self._conn.execute(
+                    "UPDATE ai_result_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                    (now, cache_key)
+                )
+                self._conn.commit()
+                self._stats["hits"] += 1
+                return result
+
+            except sqlite3.Error as e:
+                logger.warning(f"读取AI结果缓存失败: {e}")
+                self._stats["misses"] += 1
+                return None
+
+    def put(self, cache_key: str, text: str, result: str,
+            provider: str = None, model_name: str = None, prompt_hash: str = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            cache_key: 缓存键
+            text: 原始输入文本
+            result: AI处理结果
+            provider: AI提供商
+            model_name: 模型名称
+            prompt_hash: 系统提示词哈希
+        """
+        if not result:
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO ai_result_cache
+                    (cache_key, normalized_text, provider, model_name, prompt_hash, result, created_at, last_access, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+                    """,
+                    (cache_key, normalize_text(text), provider, model_name, prompt_hash, result, now, now)
+                )
+                self._conn.commit()
+                self._stats["writes"] += 1
+
+                self._writes_since_check += 1
+                if self._writes_since_check >= _EVICTION_CHECK_INTERVAL:
+                    self._writes_since_check = 0
+                    self._evict_locked(now)
+
+            except sqlite3.Error as e:
+                logger.warning(f"写入AI结果缓存失败: {e}")
+
+    def evict(self) -> int:
+        """
+        执行一次过期清理和容量淘汰
+
+        Returns:
+            删除的缓存条数
+        """
+        with self._lock:
+            return self._evict_locked(time.time())
+
+    def _evict_locked(self, now: float) -> int:
+        """执行淘汰（调用方需持有锁）"""
+        removed = 0
+        try:
+            if self.ttl_seconds:
+                cursor = self._conn.execute(
+                    "DELETE FROM ai_result_cache WHERE created_at < ?",
+                    (now - self.ttl_seconds,)
+                )
+                self._stats["expired"] += cursor.rowcount
+                removed += cursor.rowcount
+
+            if self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM ai_result_cache").fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    cursor = self._conn.execute(
+                        """
+                        DELETE FROM ai_result_cache WHERE cache_key IN (
+                            SELECT cache_key FROM ai_result_cache ORDER BY last_access ASC LIMIT ?
+                        )
+                        """,
+                        (overflow,)
+                    )
+                    self._stats["evicted"] += cursor.rowcount
+                    removed += cursor.rowcount
+
+            self._conn.commit()
+            if removed:
+                logger.info(f"AI结果缓存淘汰完成，删除{removed}条")
+
+        except sqlite3.Error as e:
+            logger.warning(f"AI结果缓存淘汰失败: {e}")
+        return removed
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM ai_result_cache")
+            self._conn.commit()
+            logger.info("AI结果缓存已清空")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            包含命中、未命中、命中率和当前条数的字典
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            try:
+                stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM ai_result_cache").fetchone()[0]
+            except sqlite3.Error:
+                stats["entries"] = None
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        """关闭缓存连接"""
+        with self._lock:
+            self._conn.close()
+
+
+# 全局缓存实例
+_ai_cache = None
+_ai_cache_lock = threading.Lock()
+
+
+def get_ai_cache() -> Optional[AIResultCache]:
+    """
+    获取全局AI结果缓存实例
+
+    Returns:
+        缓存实例；配置中未启用缓存时返回None
+    """
+    global _ai_cache
+    if _ai_cache is not None:
+        return _ai_cache
+
+    with _ai_cache_lock:
+        if _ai_cache is None:
+            cache_config = get_config().ai.cache or {}
+            if not cache_config.get("enabled", False):
+                return None
+            _ai_cache = AIResultCache(
+                db_path=cache_config.get("path", DEFAULT_CACHE_PATH),
+                ttl_seconds=cache_config.get("ttl_seconds", DEFAULT_TTL_SECONDS),
+                max_entries=cache_config.get("max_entries", DEFAULT_MAX_ENTRIES),
+            )
+    return _ai_cache
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    便捷函数：获取缓存统计信息
+    """
+    cache = get_ai_cache()
+    return cache.get_stats() if cache else {"enabled": False}
@@ -1,11 +1,23 @@
 """
 AI处理日志模块
 专门负责记录所有AI处理的输入和输出日志
+
+日志以JSONL格式（每行一条JSON记录）由后台线程写入：调用方只把记录放入有界队列，
+文件写入、定期fsync、按大小/时间轮转和轮转文件压缩都在后台线程完成，不阻塞AI处理
 """
 import os
+import re
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import socket
 import logging
+import threading
 from datetime import datetime
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 # 导入配置管理模块
 from config_manager import get_config
 
@@ -13,192 +25,345 @@ from config_manager import get_config
 # 获取日志实例
 logger = logging.getLogger(__name__)
 
+# 默认参数
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_FLUSH_INTERVAL = 1.0          # 秒
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+DEFAULT_ROTATE_SECONDS = 24 * 3600    # 1天
+DEFAULT_BACKUP_COUNT = 30
+
+# 非DEBUG级别时输入/输出的截断长度
+_INPUT_PREVIEW_CHARS = 100
+_RESULT_PREVIEW_CHARS = 200
+
+# 队列中的停止标记
+_STOP = object()
+
+# 清理历史日志时跳过最近修改过的文件（可能是其他进程正在压缩的文件）
+_RECENT_SECONDS = 60
+# 其他进程未压缩的日志文件可能仍在写入，长时间未修改才视为遗留文件清理
+_STALE_SECONDS = 7 * 24 * 3600
+
+# 文件名中的主机标记，多个进程（如batch_runner的工作进程）共用日志目录时区分各自的文件
+_HOST_TAG = re.sub(r'[^0-9A-Za-z-]', '-', socket.gethostname()) or "host"
+
+
 class AIProcessLogger:
-    """AI处理日志记录器"""
-    
+    """AI处理日志记录器 - 有界队列 + 后台JSONL写入线程"""
+
     def __init__(self):
         self.log_dir = self._get_log_directory()
         self.current_log_file = None
-        self.session_start_time = None
+        self.session_start_time = datetime.now()
         self.show_full_content = self._should_show_full_content()
-        self._setup_log_file()
-    
+
+        options = self._get_writer_options()
+        self.flush_interval = float(options.get('flush_interval', DEFAULT_FLUSH_INTERVAL))
+        self.max_bytes = options.get('max_bytes', DEFAULT_MAX_BYTES) or None
+        self.rotate_seconds = options.get('rotate_seconds', DEFAULT_ROTATE_SECONDS) or None
+        self.compress = bool(options.get('compress', True))
+        self.backup_count = options.get('backup_count', DEFAULT_BACKUP_COUNT) or None
+
+        self._queue = queue.Queue(maxsize=options.get('queue_size', DEFAULT_QUEUE_SIZE))
+        self._dropped = 0
+        self._file = None
+        self._file_opened_at = 0.0
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._writer_loop, name="ai-process-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close_log_session)
+
     def _should_show_full_content(self) -> bool:
         """
         根据配置文件中的日志级别决定是否显示完整内容
-        
+
         Returns:
             bool: DEBUG级别时返回True，其他级别返回False
         """
         try:
             config = get_config()
-            if config and hasattr(config, 'logging') and hasattr(config.logging, 'level'):
-                log_level = config.logging.level.upper()
-                return log_level == "DEBUG"
-            return False
+            log_level = config.logging_config.level.upper()
+            return log_level == "DEBUG"
         except Exception as e:
             logger.warning(f"获取日志级别配置失败，使用默认截断模式: {e}")
             return False
-    
+
+    def _get_writer_options(self) -> Dict[str, Any]:
+        """读取logging.ai_process_log配置"""
+        try:
+            return get_config().logging_config.ai_process_log or {}
+        except Exception as e:
+            logger.warning(f"获取AI处理日志配置失败，使用默认配置: {e}")
+            return {}
+
     def _get_log_directory(self) -> str:
         """获取日志目录路径"""
         # 获取当前文件所在目录（ai_service目录）
         current_dir = os.path.dirname(os.path.abspath(__file__))
         log_dir = os.path.join(current_dir, "ai_process_logs")
-        
+
         # 确保日志目录存在
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
             logger.info(f"创建AI处理日志目录: {log_dir}")
-        
+
         return log_dir
-    
-    def _setup_log_file(self):
-        """设置当前的日志文件"""
+
+    def _preview(self, text: Optional[str], limit: int) -> Optional[str]:
+        """非DEBUG级别时截断长文本，避免日志过大"""
+        if text is None:
+            return None
+        text = text.strip()
+        if self.show_full_content or len(text) <= limit:
+            return text
+        return text[:limit] + '...'
+
+    def _enqueue(self, record: Dict[str, Any]) -> None:
+        """放入写入队列，队列已满时丢弃并计数（不阻塞调用方）"""
+        if self._closed:
+            return
         try:
-            # 生成日志文件名（格式：ai_process_年月日_时分秒.log）
-            self.session_start_time = datetime.now()
-            timestamp = self.session_start_time.strftime("%Y%m%d_%H%M%S")
-            log_filename = f"ai_process_{timestamp}.log"
-            self.current_log_file = os.path.join(self.log_dir, log_filename)
-            
-            # 写入日志文件头部信息
-            with open(self.current_log_file, 'w', encoding='utf-8') as f:
-                f.write(f"AI处理日志 - 开始时间: {self.session_start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("=" * 60 + "\n\n")
-            
-            logger.info(f"AI处理日志文件已创建: {self.current_log_file}")
-            
-        except Exception as e:
-            logger.error(f"创建AI处理日志文件失败: {e}")
-            self.current_log_file = None
-    
-    def log_ai_process(self, 
-                      original_text: str, 
-                      ai_result: Optional[str], 
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def log_ai_process(self,
+                      original_text: str,
+                      ai_result: Optional[str],
                       model_name: str = "unknown",
                       processing_time_ms: float = 0,
                       status: str = "success",
-                      error_message: str = None):
+                      error_message: str = None,
+                      response_stats: Optional[dict] = None):
         """
         记录AI处理过程
-        
+
         Args:
             original_text: 原始输入文本
             ai_result: AI处理结果
             model_name: 使用的AI模型名称
             processing_time_ms: 处理耗时（毫秒）
-            status: 处理状态 (success/failed/error)
+            status: 处理状态 (success/failed/error/cache_hit/rule_hit)
             error_message: 错误信息（如果有）
+            response_stats: 服务端返回的token数和耗时统计（如果有）
         """
-        if not self.current_log_file:
-            return
-        
-        try:
-            with open(self.current_log_file, 'a', encoding='utf-8') as f:
-                timestamp = datetime.now().strftime('%H:%M:%S')
-                
-                # 基本信息
-                f.write(f"[{timestamp}] AI处理记录 - 状态: {status}\n")
-                f.write(f"模型: {model_name}\n")
-                f.write(f"耗时: {processing_time_ms:.1f}ms\n")
-                
-                # 根据日志级别决定是否显示完整内容
-                if self.show_full_content:
-                    # DEBUG级别：显示完整内容
-                    f.write(f"原始输入: {original_text}\n")
-                else:
-                    # 其他级别：限制长度避免日志过大
-                    original_preview = original_text[:100] + '...' if len(original_text) > 100 else original_text
-                    f.write(f"原始输入: {original_preview}\n")
-                
-                # AI处理结果
-                if ai_result:
-                    if self.show_full_content:
-                        # DEBUG级别：显示完整结果
-                        f.write(f"AI处理结果: {ai_result.strip()}\n")
-                    else:
-                        # 其他级别：限制长度
-                        result_preview = ai_result.strip()[:200] + '...' if len(ai_result.strip()) > 200 else ai_result.strip()
-                        f.write(f"AI处理结果: {result_preview}\n")
-                else:
-                    f.write("AI处理结果: None\n")
-                
-                # 错误信息（如果有）
-                if error_message:
-                    f.write(f"错误信息: {error_message}\n")
-                
-                f.write("-" * 50 + "\n\n")
-                
-        except Exception as e:
-            logger.error(f"写入AI处理日志失败: {e}")
-    
+        record = {
+            "ts": datetime.now().isoformat(timespec='milliseconds'),
+            "event": "ai_process",
+            "status": status,
+            "model": model_name,
+            "latency_ms": round(processing_time_ms, 1),
+            "cache_hit": status == "cache_hit",
+            "rule_hit": status == "rule_hit",
+            "input": self._preview(original_text or "", _INPUT_PREVIEW_CHARS),
+            "output": self._preview(ai_result, _RESULT_PREVIEW_CHARS),
+            "error": error_message,
+        }
+        # 服务端统计（prompt_tokens、completion_tokens、各阶段耗时等）展开为顶层字段
+        if response_stats:
+            record.update(response_stats)
+        self._enqueue(record)
+
     def log_batch_summary(self, total_count: int, success_count: int, failed_count: int):
         """
         记录批量处理摘要
-        
+
         Args:
             total_count: 总处理数量
             success_count: 成功数量
             failed_count: 失败数量
         """
-        if not self.current_log_file:
-            return
-        
-        try:
-            with open(self.current_log_file, 'a', encoding='utf-8') as f:
-                f.write("\n" + "=" * 60 + "\n")
-                f.write(f"批量处理摘要 - 完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"总共处理: {total_count}条数据\n")
-                f.write(f"成功处理: {success_count}条数据\n")
-                f.write(f"失败处理: {failed_count}条数据\n")
-                f.write(f"成功率: {(success_count/total_count*100):.1f}%\n" if total_count > 0 else "成功率: 0%\n")
-                f.write("=" * 60 + "\n")
-        except Exception as e:
-            logger.error(f"写入批量处理摘要失败: {e}")
-    
+        self._enqueue({
+            "ts": datetime.now().isoformat(timespec='milliseconds'),
+            "event": "batch_summary",
+            "total": total_count,
+            "success": success_count,
+            "failed": failed_count,
+            "success_rate": round(success_count / total_count, 4) if total_count > 0 else 0.0,
+        })
+
     def close_log_session(self):
-        """关闭当前日志会话"""
-        if not self.current_log_file or not self.session_start_time:
+        """关闭当前日志会话：写入会话结束记录，等待队列写完后关闭文件"""
+        if self._closed:
             return
-        
+
+        self._enqueue({
+            "ts": datetime.now().isoformat(timespec='milliseconds'),
+            "event": "session_end",
+            "session_seconds": round((datetime.now() - self.session_start_time).total_seconds(), 3),
+            "dropped": self._dropped,
+        })
+        self._closed = True
+        # 停止标记必须写入，队列已满时等待写入线程消费
+        self._queue.put(_STOP)
+        self._writer.join(timeout=5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器状态"""
+        return {
+            "log_file": self.current_log_file,
+            "queued": self._queue.qsize(),
+            "dropped": self._dropped,
+        }
+
+    # ---- 以下方法只在写入线程中调用 ----
+
+    def _writer_loop(self):
+        """后台写入循环"""
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._close_file()
+                return
+
+            try:
+                if item is not None:
+                    self._write_record(item)
+                    # 一次取完队列中积压的记录，减少flush次数
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is _STOP:
+                            self._close_file()
+                            return
+                        self._write_record(item)
+
+                if self._file is not None and time.monotonic() - last_sync >= self.flush_interval:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    last_sync = time.monotonic()
+            except Exception as e:
+                logger.error(f"写入AI处理日志失败: {e}")
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        """写入一条记录，必要时轮转文件"""
+        if self._file is None or self._should_rotate():
+            self._rotate()
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        if self.rotate_seconds and time.monotonic() - self._file_opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    def _rotate(self) -> None:
+        """关闭当前文件（可选压缩）并打开新文件"""
+        self._close_file()
+
+        # 生成日志文件名（格式：ai_process_年月日_时分秒_微秒_主机_进程号.jsonl）
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.current_log_file = os.path.join(self.log_dir, f"ai_process_{timestamp}{self._owner_suffix()}")
+        self._file = open(self.current_log_file, 'a', encoding='utf-8')
+        self._file_opened_at = time.monotonic()
+        logger.info(f"AI处理日志文件已创建: {self.current_log_file}")
+
+        self._remove_old_files()
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+            self._file = None
+
+        if self.compress and self.current_log_file and os.path.exists(self.current_log_file):
+            self._compress_file(self.current_log_file)
+
+    @staticmethod
+    def _compress_file(path: str) -> None:
+        """压缩已轮转的日志文件"""
         try:
-            session_duration = datetime.now() - self.session_start_time
-            with open(self.current_log_file, 'a', encoding='utf-8') as f:
-                f.write("\n" + "=" * 60 + "\n")
-                f.write(f"日志会话结束 - 结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"会话持续时间: {session_duration}\n")
-                f.write("=" * 60 + "\n")
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
         except Exception as e:
-            logger.error(f"关闭日志会话失败: {e}")
+            logger.warning(f"压缩AI处理日志失败: {path}: {e}")
+
+    @staticmethod
+    def _owner_suffix() -> str:
+        """本进程日志文件名的后缀（在轮转时读取进程号，fork出的子进程使用自己的进程号）"""
+        return f"_{_HOST_TAG}_{os.getpid()}.jsonl"
+
+    def _remove_old_files(self) -> None:
+        """
+        只保留最近backup_count个已轮转的历史日志文件
+
+        只清理已关闭的文件：压缩后的.jsonl.gz、本进程轮转下来的.jsonl，以及长时间未修改的遗留.jsonl；
+        其他进程正在写入的当前文件和旧版本的.log文件不参与计数和清理
+        """
+        if not self.backup_count:
+            return
+        own_suffix = self._owner_suffix()
+        now = time.time()
+        history = []
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if not name.startswith("ai_process_") or path == self.current_log_file:
+                continue
+            if not (name.endswith(".jsonl.gz") or name.endswith(".jsonl")):
+                continue
+            try:
+                idle_seconds = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if idle_seconds < _RECENT_SECONDS:
+                continue
+            if name.endswith(".jsonl") and not name.endswith(own_suffix) and idle_seconds < _STALE_SECONDS:
+                continue
+            history.append(name)
+        # 文件名以时间戳开头，按名称排序即按创建时间排序
+        history.sort()
+        for name in history[:max(0, len(history) - self.backup_count)]:
+            try:
+                os.remove(os.path.join(self.log_dir, name))
+            except OSError:
+                pass
 
 # 全局日志实例
 _ai_logger = None
+_ai_logger_lock = threading.Lock()
 
 def get_ai_logger() -> AIProcessLogger:
     """获取全局AI处理日志实例"""
     global _ai_logger
     if _ai_logger is None:
-        _ai_logger = AIProcessLogger()
+        with _ai_logger_lock:
+            if _ai_logger is None:
+                _ai_logger = AIProcessLogger()
     return _ai_logger
 
-def log_ai_process(original_text: str, 
-                  ai_result: Optional[str], 
+def log_ai_process(original_text: str,
+                  ai_result: Optional[str],
                   model_name: str = "unknown",
                   processing_time_ms: float = 0,
                   status: str = "success",
-                  error_message: str = None):
+                  error_message: str = None,
+                  response_stats: Optional[dict] = None):
     """
     便捷函数：记录AI处理过程
     """
     logger_instance = get_ai_logger()
     logger_instance.log_ai_process(
         original_text=original_text,
-        ai_result=ai_result, 
+        ai_result=ai_result,
         model_name=model_name,
         processing_time_ms=processing_time_ms,
         status=status,
-        error_message=error_message
+        error_message=error_message,
+        response_stats=response_stats
     )
 
 def log_batch_summary(total_count: int, success_count: int, failed_count: int):
@@ -213,6 +378,7 @@ def close_ai_log_session():
     便捷函数：关闭AI日志会话
     """
     global _ai_logger
-    if _ai_logger:
-        _ai_logger.close_log_session()
-        _ai_logger = None
+    with _ai_logger_lock:
+        if _ai_logger:
+            _ai_logger.close_log_session()
+            _ai_logger = None
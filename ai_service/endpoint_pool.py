@@ -0,0 +1,246 @@
+"""
+AI端点池模块
+同一提供商配置多个推理服务地址时，按最少在途请求数或延迟感知策略分发请求，
+连续失败的端点被暂时摘除，摘除期满后经健康探测通过再恢复
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 路由策略
+STRATEGY_LEAST_OUTSTANDING = "least_outstanding"
+STRATEGY_LATENCY = "latency"
+
+# 默认参数
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_EJECTION_SECONDS = 30.0
+
+# 延迟指数移动平均的平滑系数
+_EWMA_ALPHA = 0.3
+
+
+class Endpoint:
+    """单个推理服务端点及其运行状态"""
+
+    def __init__(self, base_url: str, chat_endpoint: str):
+        self.base_url = base_url.rstrip('/')
+        self.api_url = self.base_url + chat_endpoint
+        self.outstanding = 0                 # 在途请求数
+        self.ewma_latency_ms = None          # 延迟指数移动平均
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0             # 摘除截止时间（monotonic），0表示未摘除
+        self.probing = False                 # 是否正在进行恢复探测
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """端点状态快照"""
+        return {
+            "base_url": self.base_url,
+            "outstanding": self.outstanding,
+            "ewma_latency_ms": round(self.ewma_latency_ms, 2) if self.ewma_latency_ms is not None else None,
+            "ejected": self.ejected,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class EndpointPool:
+    """端点池 - 选择端点、统计在途请求与延迟、摘除和恢复故障端点"""
+
+    def __init__(self, provider: str, base_urls: List[str], chat_endpoint: str,
+                 strategy: str = STRATEGY_LEAST_OUTSTANDING,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 ejection_seconds: float = DEFAULT_EJECTION_SECONDS,
+                 probe: Optional[Callable[[Endpoint], bool]] = None,
+                 is_failure: Optional[Callable[[Exception], bool]] = None):
+        """
+        初始化端点池
+
+        Args:
+            provider: 提供商名称
+            base_urls: 服务地址列表
+            chat_endpoint: 聊天API路径
+            strategy: 路由策略，least_outstanding（最少在途请求）或 latency（延迟×在途请求数最小）
+            failure_threshold: 端点连续失败多少次后摘除
+            ejection_seconds: 摘除时长（秒），期满后探测通过才恢复
+            probe: 健康探测函数，返回端点是否可用
+            is_failure: 判断异常是否计为端点故障（默认所有异常都计入）
+        """
+        if not base_urls:
+            raise ValueError(f"{provider}未配置服务地址")
+        if strategy not in (STRATEGY_LEAST_OUTSTANDING, STRATEGY_LATENCY):
+            raise ValueError(f"不支持的路由策略: {strategy}")
+
+        self.provider = provider
+        self.endpoints = [Endpoint(url, chat_endpoint) for url in base_urls]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.probe = probe
+        self.is_failure = is_failure or (lambda e: True)
+
+        self._lock = threading.Lock()
+        self._rr_index = 0  # 得分相同时轮转，避免总是选中第一个端点
+
+    def select(self) -> Endpoint:
+        """
+        选择一个端点并登记在途请求
+
+        Returns:
+            选中的端点；所有端点都被摘除时返回最早到期的端点
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._schedule_probes_locked(now)
+
+            candidates = [ep for ep in self.endpoints if not ep.ejected]
+            if not candidates:
+                endpoint = min(self.endpoints, key=lambda ep: ep.ejected_until)
+            else:
+                count = len(candidates)
+                start = self._rr_index % count
+                self._rr_index += 1
+                rotated = candidates[start:] + candidates[:start]
+                endpoint = min(rotated, key=self._score)
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, success: bool, latency_ms: Optional[float] = None) -> None:
+        """
+        请求结束后更新端点状态
+
+        Args:
+            endpoint: select返回的端点
+            success: 请求是否成功
+            latency_ms: 请求耗时（毫秒），仅成功时计入延迟
+        """
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if success:
+                endpoint.consecutive_failures = 0
+                if latency_ms is not None:
+                    if endpoint.ewma_latency_ms is None:
+                        endpoint.ewma_latency_ms = latency_ms
+                    else:
+                        endpoint.ewma_latency_ms += _EWMA_ALPHA * (latency_ms - endpoint.ewma_latency_ms)
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold and not endpoint.ejected:
+                endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+                logger.warning(
+                    f"{self.provider}端点{endpoint.base_url}连续失败{endpoint.consecutive_failures}次，"
+                    f"摘除{self.ejection_seconds}秒"
+                )
+
+    @contextmanager
+    def acquire(self) -> Iterator[Endpoint]:
+        """
+        上下文管理器：选择端点，退出时按是否抛出异常更新端点状态
+
+        Yields:
+            选中的端点
+        """
+        endpoint = self.select()
+        start_time = time.perf_counter()
+        try:
+            yield endpoint
+        except Exception as e:
+            self.release(endpoint, success=not self.is_failure(e))
+            raise
+        self.release(endpoint, success=True, latency_ms=(time.perf_counter() - start_time) * 1000)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """获取所有端点的状态"""
+        with self._lock:
+            return [ep.snapshot() for ep in self.endpoints]
+
+    def _score(self, endpoint: Endpoint) -> float:
+        """端点得分，越小越优先"""
+        if self.strategy == STRATEGY_LATENCY:
+            # 尚无延迟样本的端点优先获得流量
+            latency = endpoint.ewma_latency_ms if endpoint.ewma_latency_ms is not None else 0.0
+            return latency * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def _schedule_probes_locked(self, now: float) -> None:
+        """摘除期满的端点在后台线程中探测，通过后恢复（调用方需持有锁）"""
+        for endpoint in self.endpoints:
+            if endpoint.ejected and not endpoint.probing and now >= endpoint.ejected_until:
+                if self.probe is None:
+                    self._restore_locked(endpoint)
+                    continue
+                endpoint.probing = True
+                threading.Thread(target=self._run_probe, args=(endpoint,), daemon=True).start()
+
+    def _run_probe(self, endpoint: Endpoint) -> None:
+        """执行一次恢复探测"""
+        try:
+            healthy = bool(self.probe(endpoint))
+        except Exception as e:
+            logger.warning(f"{self.provider}端点{endpoint.base_url}探测异常: {e}")
+            healthy = False
+
+        with self._lock:
+            endpoint.probing = False
+            if healthy:
+                self._restore_locked(endpoint)
+            else:
+                endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+
+    def _restore_locked(self, endpoint: Endpoint) -> None:
+        """恢复端点（调用方需持有锁）"""
+        endpoint.ejected_until = 0.0
+        endpoint.consecutive_failures = 0
+        logger.info(f"{self.provider}端点{endpoint.base_url}恢复")
+
+
+# 按提供商共享的端点池（同一进程内的所有处理器实例共用在途请求计数）及创建时的端点配置
+_pools: Dict[str, EndpointPool] = {}
+_pool_configs: Dict[str, Any] = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(provider: str, factory: Callable[[], EndpointPool],
+                      config_key: Any = None) -> EndpointPool:
+    """
+    获取提供商的端点池（首次调用或端点配置变化时用factory创建）
+
+    Args:
+        provider: 提供商名称
+        factory: 创建端点池的函数
+        config_key: 端点配置（可哈希比较，如地址列表和路由参数组成的元组），
+                    与现有端点池创建时的配置不同时重建端点池，配置重新加载后立即生效
+
+    Returns:
+        端点池实例
+    """
+    with _pools_lock:
+        if provider in _pools and _pool_configs.get(provider) != config_key:
+            logger.info(f"{provider}端点配置已变化，重建端点池")
+            del _pools[provider]
+        if provider not in _pools:
+            _pools[provider] = factory()
+            _pool_configs[provider] = config_key
+        return _pools[provider]
+
+
+def get_endpoint_stats() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    便捷函数：获取所有端点池的状态
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {provider: pool.get_stats() for provider, pool in pools.items()}
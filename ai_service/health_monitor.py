@@ -0,0 +1,183 @@
+"""
+AI服务健康监测模块
+后台线程按固定间隔探测当前提供商配置的每个端点，缓存可用状态和探测延迟，
+/api/system/status 直接读取缓存结果，不再为每次轮询创建处理器或发起网络请求
+
+探测只使用不计费的只读接口：Ollama为 GET /api/tags，OpenAI兼容服务为 GET {base_url}/models
+"""
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from config_manager import get_config
+
+logger = logging.getLogger(__name__)
+
+# 默认参数
+DEFAULT_INTERVAL_SECONDS = 30.0
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+
+def probe_endpoint(provider: str, base_url: str, api_key: Optional[str] = None,
+                   timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Tuple[bool, float, Optional[str]]:
+    """
+    探测单个端点是否可用
+
+    Args:
+        provider: 提供商名称
+        base_url: 服务地址
+        api_key: API密钥（OpenAI兼容服务需要）
+        timeout: 超时时间（秒）
+
+    Returns:
+        (是否可用, 探测耗时毫秒, 错误信息)
+    """
+    base_url = base_url.rstrip('/')
+    headers = {}
+    if provider == 'ollama':
+        url = f"{base_url}/api/tags"
+    else:
+        url = f"{base_url}/models"
+        if api_key:
+            headers['Authorization'] = f'Bearer {api_key}'
+
+    start_time = time.perf_counter()
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        if response.status_code == 200:
+            return True, latency_ms, None
+        return False, latency_ms, f"HTTP {response.status_code}"
+    except Exception as e:
+        return False, (time.perf_counter() - start_time) * 1000, str(e)
+
+
+class HealthMonitor:
+    """AI服务健康监测器 - 后台定时探测，状态查询只读内存"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL_SECONDS, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        """
+        初始化健康监测器
+
+        Args:
+            interval: 探测间隔（秒）
+            timeout: 单次探测超时（秒）
+        """
+        self.interval = interval
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._provider = None
+        self._endpoints: List[Dict[str, Any]] = []
+        self._checked_at = None
+        self._stop_event = threading.Event()
+        self._wakeup_event = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """启动后台探测线程（立即执行第一次探测）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="ai-health-monitor", daemon=True)
+            self._thread.start()
+        logger.info(f"AI服务健康监测已启动，探测间隔{self.interval}秒")
+
+    def stop(self) -> None:
+        """停止后台探测线程"""
+        self._stop_event.set()
+        self._wakeup_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def refresh(self) -> None:
+        """请求立即重新探测（如配置更新后），不等待探测完成"""
+        self._wakeup_event.set()
+
+    def check_now(self) -> Dict[str, Any]:
+        """同步执行一次探测并返回状态"""
+        self._probe_all()
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取缓存的健康状态
+
+        Returns:
+            包含available（None表示尚未完成首次探测）、provider、checked_at和各端点状态的字典
+        """
+        with self._lock:
+            endpoints = [dict(endpoint) for endpoint in self._endpoints]
+            checked_at = self._checked_at
+            provider = self._provider
+
+        return {
+            "available": any(ep["healthy"] for ep in endpoints) if checked_at is not None else None,
+            "provider": provider,
+            "checked_at": checked_at,
+            "interval_seconds": self.interval,
+            "endpoints": endpoints,
+        }
+
+    def _run(self) -> None:
+        """后台探测循环"""
+        while not self._stop_event.is_set():
+            try:
+                self._probe_all()
+            except Exception as e:
+                logger.error(f"AI服务健康探测失败: {e}")
+            self._wakeup_event.wait(self.interval)
+            self._wakeup_event.clear()
+
+    def _probe_all(self) -> None:
+        """按当前配置探测所有端点（每轮重新读取配置，配置重载后自动跟随）"""
+        ai_config = get_config().ai
+        provider = ai_config.provider.lower()
+        provider_config = (ai_config.endpoints or {}).get(provider) or {}
+        base_urls = provider_config.get('base_urls') or [provider_config.get('base_url')]
+        api_key = provider_config.get('api_key')
+
+        results = []
+        for base_url in base_urls:
+            if not base_url:
+                continue
+            healthy, latency_ms, error = probe_endpoint(provider, base_url, api_key, self.timeout)
+            results.append({
+                "base_url": base_url.rstrip('/'),
+                "healthy": healthy,
+                "latency_ms": round(latency_ms, 2),
+                "error": error,
+            })
+            if not healthy:
+                logger.warning(f"{provider}端点{base_url}不可用: {error}")
+
+        with self._lock:
+            self._provider = provider
+            self._endpoints = results
+            self._checked_at = time.time()
+
+
+# 全局健康监测实例
+_health_monitor = None
+_health_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """获取全局健康监测实例（首次调用时按ai.health_check配置创建并启动）"""
+    global _health_monitor
+    if _health_monitor is None:
+        with _health_monitor_lock:
+            if _health_monitor is None:
+                health_config = get_config().ai.health_check or {}
+                monitor = HealthMonitor(
+                    interval=health_config.get('interval_seconds', DEFAULT_INTERVAL_SECONDS),
+                    timeout=health_config.get('timeout', DEFAULT_TIMEOUT_SECONDS)
+                )
+                monitor.start()
+                _health_monitor = monitor
+    return _health_monitor
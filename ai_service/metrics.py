@@ -0,0 +1,245 @@
+"""
+AI调用指标模块
+按提供商/模型汇总每次模型调用的客户端耗时、服务端各阶段耗时（排队/加载、提示词处理、生成）和token数，
+以直方图形式累计，供 /api/metrics 查询，并可按任务统计单次流程的调用情况
+"""
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 直方图桶上界
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640)
+
+# 指标名 -> (桶上界, 说明)
+METRIC_DEFINITIONS = {
+    "wall_ms": (LATENCY_BUCKETS_MS, "客户端总耗时（含网络、排队和重试）"),
+    "queue_ms": (LATENCY_BUCKETS_MS, "客户端耗时减去服务端总耗时（网络和服务端排队）"),
+    "load_ms": (LATENCY_BUCKETS_MS, "服务端模型加载耗时"),
+    "prompt_eval_ms": (LATENCY_BUCKETS_MS, "服务端提示词处理耗时"),
+    "eval_ms": (LATENCY_BUCKETS_MS, "服务端生成耗时"),
+    "first_token_ms": (LATENCY_BUCKETS_MS, "流式输出首个分片到达耗时"),
+    "prompt_tokens": (TOKEN_BUCKETS, "提示词token数"),
+    "completion_tokens": (TOKEN_BUCKETS, "生成token数"),
+    "eval_tokens_per_second": (RATE_BUCKETS, "生成速度（token/秒）"),
+}
+
+# 调用状态中真正请求了模型的状态（缓存和规则命中只计数）
+MODEL_CALL_STATUSES = ("success", "failed", "error")
+
+
+class Histogram:
+    """固定桶直方图 - 记录计数、总和、最小/最大值，分位数按桶内线性插值估算"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        """记录一个样本（调用方负责加锁）"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估算分位数（0~1），没有样本时返回None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else (self.min or 0.0)
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """直方图快照"""
+        def _round(value):
+            return round(value, 2) if value is not None else None
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 2),
+            "mean": _round(self.sum / self.count) if self.count else None,
+            "min": _round(self.min),
+            "max": _round(self.max),
+            "p50": _round(self.quantile(0.5)),
+            "p95": _round(self.quantile(0.95)),
+            "p99": _round(self.quantile(0.99)),
+            "buckets": {str(bound): count for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """指标注册表 - 按(提供商, 模型)分组的调用计数和直方图"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._histograms: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+        # 当前上下文（线程/协程）中进行的单独统计，其他任务并发产生的调用不会计入
+        self._collectors: ContextVar[Tuple["MetricsRegistry", ...]] = ContextVar(
+            f"ai_metrics_collectors_{id(self)}", default=()
+        )
+
+    def record_call(self, provider: str, model: str, status: str,
+                    wall_ms: float, response_stats: Optional[Dict[str, Any]] = None) -> None:
+        """
+        记录一次AI调用
+
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            status: 调用状态（success/failed/error/cache_hit/rule_hit）
+            wall_ms: 客户端总耗时（毫秒）
+            response_stats: CarTestDataProcessor提取的服务端统计（token数和各阶段耗时）
+        """
+        values = self._derive_values(wall_ms, response_stats or {}) if status in MODEL_CALL_STATUSES else {}
+        with self._lock:
+            self._record_locked((provider, model), status, values)
+        for child in self._collectors.get():
+            child.record_values(provider, model, status, values)
+
+    def record_values(self, provider: str, model: str, status: str, values: Dict[str, float]) -> None:
+        """记录已计算好的指标值（供父注册表转发）"""
+        with self._lock:
+            self._record_locked((provider, model), status, values)
+
+    def start_collection(self) -> "MetricsRegistry":
+        """
+        开始单独统计：之后当前上下文中的调用额外记录到返回的独立注册表，用于统计单次任务
+
+        统计范围限于调用start_collection的线程（或协程上下文），同一进程中并发执行的其他任务、
+        实时处理会话的调用不会计入；新建的线程不继承该统计
+
+        Returns:
+            本次统计使用的注册表，结束时在同一上下文中传给stop_collection
+        """
+        child = MetricsRegistry()
+        self._collectors.set(self._collectors.get() + (child,))
+        return child
+
+    def stop_collection(self, child: "MetricsRegistry") -> None:
+        """结束start_collection开始的单独统计"""
+        self._collectors.set(tuple(collector for collector in self._collectors.get() if collector is not child))
+
+    @contextmanager
+    def collect(self) -> Iterator["MetricsRegistry"]:
+        """上下文管理器形式的start_collection/stop_collection"""
+        child = self.start_collection()
+        try:
+            yield child
+        finally:
+            self.stop_collection(child)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """获取所有分组的指标快照"""
+        with self._lock:
+            keys = sorted(set(self._calls) | set(self._histograms))
+            return [{
+                "provider": provider,
+                "model": model,
+                "calls": dict(self._calls.get((provider, model), {})),
+                "histograms": {name: histogram.snapshot()
+                               for name, histogram in self._histograms.get((provider, model), {}).items()},
+            } for provider, model in keys]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """精简汇总：调用数、token总数和主要耗时分位数（用于任务结束时的日志和结果）"""
+        summary = []
+        for group in self.snapshot():
+            histograms = group["histograms"]
+            item = {"provider": group["provider"], "model": group["model"], "calls": group["calls"]}
+            for name in ("prompt_tokens", "completion_tokens"):
+                if name in histograms:
+                    item[f"{name}_total"] = int(histograms[name]["sum"])
+            for name in ("wall_ms", "queue_ms", "prompt_eval_ms", "eval_ms", "first_token_ms",
+                         "eval_tokens_per_second"):
+                if name in histograms:
+                    item[name] = {key: histograms[name][key] for key in ("mean", "p50", "p95", "max")}
+            summary.append(item)
+        return summary
+
+    def to_prometheus(self, prefix: str = "ai") -> str:
+        """导出为Prometheus文本格式"""
+        lines = [f"# HELP {prefix}_calls_total AI调用次数", f"# TYPE {prefix}_calls_total counter"]
+        with self._lock:
+            for (provider, model), calls in sorted(self._calls.items()):
+                for status, count in sorted(calls.items()):
+                    lines.append(f'{prefix}_calls_total{{provider="{provider}",model="{model}",'
+                                 f'status="{status}"}} {count}')
+
+            for name, (_, help_text) in METRIC_DEFINITIONS.items():
+                metric = f"{prefix}_{name}"
+                groups = [(key, hists[name]) for key, hists in sorted(self._histograms.items()) if name in hists]
+                if not groups:
+                    continue
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (provider, model), histogram in groups:
+                    labels = f'provider="{provider}",model="{model}"'
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{metric}_sum{{{labels}}} {round(histogram.sum, 3)}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _record_locked(self, key: Tuple[str, str], status: str, values: Dict[str, float]) -> None:
+        calls = self._calls.setdefault(key, {})
+        calls[status] = calls.get(status, 0) + 1
+        if not values:
+            return
+        histograms = self._histograms.setdefault(key, {})
+        for name, value in values.items():
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram(METRIC_DEFINITIONS[name][0])
+            histogram.observe(value)
+
+    @staticmethod
+    def _derive_values(wall_ms: float, stats: Dict[str, Any]) -> Dict[str, float]:
+        """由客户端耗时和服务端统计计算各项指标值"""
+        values = {"wall_ms": wall_ms}
+        if stats.get("total_duration_ms") is not None:
+            values["queue_ms"] = max(0.0, wall_ms - stats["total_duration_ms"])
+        for source, name in (("load_duration_ms", "load_ms"), ("prompt_eval_duration_ms", "prompt_eval_ms"),
+                             ("eval_duration_ms", "eval_ms"), ("first_token_ms", "first_token_ms"),
+                             ("prompt_eval_count", "prompt_tokens"), ("eval_count", "completion_tokens")):
+            if stats.get(source) is not None:
+                values[name] = stats[source]
+        if stats.get("eval_count") and stats.get("eval_duration_ms"):
+            values["eval_tokens_per_second"] = stats["eval_count"] / stats["eval_duration_ms"] * 1000
+        return values
+
+
+# 全局指标注册表
+_metrics_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """获取全局指标注册表"""
+    return _metrics_registry
+
+
+def record_ai_call(provider: str, model: str, status: str,
+                   wall_ms: float, response_stats: Optional[Dict[str, Any]] = None) -> None:
+    """
+    便捷函数：记录一次AI调用
+    """
+    _metrics_registry.record_call(provider, model, status, wall_ms, response_stats)
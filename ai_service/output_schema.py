@@ -0,0 +1,64 @@
+"""
+AI输出结构定义模块
+根据 task.score_mapping 和系统提示词生成约束模型输出的JSON Schema，
+供Ollama的format参数和OpenAI兼容接口的response_format参数使用
+"""
+from typing import Any, Dict, Iterable, Optional
+
+from .rule_extractor import extract_prompt_section
+
+# 分数范围（与system_prompt.txt中的output_schema保持一致）
+MIN_SCORE = 0
+MAX_SCORE = 10
+
+
+def build_output_schema(score_mapping: Dict[str, str],
+                        function_keywords: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    生成模型输出的JSON Schema
+
+    Args:
+        score_mapping: 中文维度名到英文字段名的映射，子分字段使用中文维度名
+        function_keywords: 允许的功能名称，为空时不限制取值
+
+    Returns:
+        JSON Schema字典
+    """
+    score_schema = {"type": "integer", "minimum": MIN_SCORE, "maximum": MAX_SCORE}
+
+    function_schema: Dict[str, Any] = {"type": "string"}
+    keywords = list(function_keywords or [])
+    if keywords:
+        function_schema["enum"] = keywords
+
+    properties: Dict[str, Any] = {
+        "comment": {"type": "string"},
+        "function": function_schema,
+        "score": dict(score_schema),
+    }
+    for dimension_name in score_mapping:
+        properties[dimension_name] = dict(score_schema)
+    properties["是否剪辑"] = {"type": "string", "enum": ["是"]}
+    properties["status"] = {"type": "string", "enum": ["start", "end"]}
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": ["comment"],
+        "additionalProperties": False,
+    }
+
+
+def build_output_schema_from_prompt(system_prompt: str, score_mapping: Dict[str, str]) -> Dict[str, Any]:
+    """
+    读取系统提示词中的function_keywords生成JSON Schema
+
+    Args:
+        system_prompt: system_prompt.txt的内容
+        score_mapping: task.score_mapping
+
+    Returns:
+        JSON Schema字典
+    """
+    function_keywords = extract_prompt_section(system_prompt, "function_keywords", "[", "]")
+    return build_output_schema(score_mapping, function_keywords)
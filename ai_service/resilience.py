@@ -0,0 +1,417 @@
+"""
+AI调用容错模块
+为模型调用提供带抖动的指数退避重试、可选的对冲请求（延迟超过历史分位数时并发发出第二个请求）
+以及按提供商划分的熔断器，并记录各提供商的延迟与错误统计
+"""
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认参数
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_SECONDS = 30.0
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+# 延迟统计保留的样本数
+_LATENCY_WINDOW = 500
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+    pass
+
+
+class AttemptCancellation:
+    """单次请求的取消句柄 - 对冲请求分出胜负后取消落败的一方，执行其注册的回调（如关闭响应连接）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        """请求是否已被取消"""
+        return self._cancelled
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """注册取消时执行的回调；已取消时立即执行"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        self._run(callback)
+
+    def cancel(self) -> None:
+        """取消请求并执行已注册的回调"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run(callback)
+
+    @staticmethod
+    def _run(callback: Callable[[], Any]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            logger.debug(f"取消回调执行失败: {e}")
+
+
+class CircuitBreaker:
+    """熔断器 - 连续失败达到阈值后打开，冷却期结束后放行一个探测请求（半开）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_seconds: float = DEFAULT_RECOVERY_SECONDS):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后打开熔断器
+            recovery_seconds: 打开后多久允许探测请求
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """当前状态（打开状态冷却期结束后视为半开）"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        判断是否放行请求
+
+        Returns:
+            关闭状态放行；打开状态冷却期内拒绝，冷却期结束后只放行一个探测请求
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # 半开状态：同一时间只放行一个探测请求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """记录成功，关闭熔断器"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("熔断器探测成功，恢复关闭状态")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """记录失败，达到阈值或探测失败时打开熔断器"""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"连续失败{self._consecutive_failures}次，熔断器打开{self.recovery_seconds}秒")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """提供商调用统计 - 请求数、成功/失败/重试/对冲次数和滑动窗口内的延迟分位数"""
+
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._counters = {"requests": 0, "successes": 0, "failures": 0, "retries": 0,
+                          "hedges": 0, "hedge_wins": 0, "hedge_cancels": 0, "rejected": 0}
+
+    def record(self, counter: str, latency_ms: Optional[float] = None) -> None:
+        """累加计数，成功请求同时记录延迟"""
+        with self._lock:
+            self._counters[counter] += 1
+            if latency_ms is not None:
+                self._latencies.append(latency_ms)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        计算延迟分位数
+
+        Args:
+            percent: 分位（0-100）
+
+        Returns:
+            分位数延迟（毫秒），没有样本时返回None
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    @property
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._latencies)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取统计快照"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["latency_samples"] = self.sample_count
+        for percent in (50, 95, 99):
+            value = self.percentile(percent)
+            stats[f"p{percent}_ms"] = round(value, 2) if value is not None else None
+        total = stats["successes"] + stats["failures"]
+        stats["error_rate"] = round(stats["failures"] / total, 4) if total else 0.0
+        return stats
+
+
+class ResilientCaller:
+    """容错调用器 - 组合重试、对冲和熔断"""
+
+    def __init__(self, provider: str, max_retries: int,
+                 breaker: CircuitBreaker, stats: ProviderStats,
+                 is_retryable: Callable[[Exception], bool],
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 hedge_enabled: bool = False,
+                 hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES):
+        """
+        初始化容错调用器
+
+        Args:
+            provider: 提供商名称（用于日志）
+            max_retries: 最大重试次数（不含首次请求）
+            breaker: 该提供商的熔断器
+            stats: 该提供商的调用统计
+            is_retryable: 判断异常是否值得重试（超时、连接错误、429、5xx等）
+            base_delay: 退避基础时长（秒）
+            max_delay: 退避最大时长（秒）
+            hedge_enabled: 是否启用对冲请求
+            hedge_percentile: 请求耗时超过该延迟分位数时发出对冲请求
+            hedge_min_samples: 延迟样本数达到该值后才启用对冲
+        """
+        self.provider = provider
+        self.max_retries = max(0, int(max_retries or 0))
+        self.breaker = breaker
+        self.stats = stats
+        self.is_retryable = is_retryable
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    def backoff_delay(self, attempt: int) -> float:
+        """带完全抖动的指数退避时长：random(0, min(max_delay, base_delay * 2^attempt))"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func: Callable[[AttemptCancellation], Any]) -> Any:
+        """
+        执行调用
+
+        Args:
+            func: 发起一次模型请求的函数，参数为本次请求的取消句柄（对冲落败时被取消，
+                  func应在句柄上注册关闭连接的回调）；失败时抛出异常，返回None视为失败的请求
+
+        Returns:
+            func的返回值（所有请求都返回None时为None）
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            Exception: 不可重试的异常或重试耗尽后的最后一个异常
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow_request():
+                self.stats.record("rejected")
+                raise CircuitOpenError(f"{self.provider}服务熔断中，请求被拒绝")
+
+            if attempt:
+                self.stats.record("retries")
+
+            try:
+                result = self._attempt(func)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    # 服务可达但请求本身有误（如4xx），不计入熔断
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"{self.provider}请求失败（第{attempt + 1}次）: {e}，{delay:.2f}秒后重试")
+                time.sleep(delay)
+                continue
+
+            # 返回None（如输出被中止）说明服务可达，不计入熔断
+            self.breaker.record_success()
+            return result
+
+    def _attempt(self, func: Callable[[AttemptCancellation], Any]) -> Any:
+        """
+        执行一次请求（可能包含一个对冲请求）
+
+        主请求在调用方线程中执行，不受线程池容量限制；对冲计时从主请求实际开始时算起，
+        超过延迟分位数仍未返回时才在单独的线程中发出对冲请求
+        """
+        hedge_delay_ms = None
+        if self.hedge_enabled and self.stats.sample_count >= self.hedge_min_samples:
+            hedge_delay_ms = self.stats.percentile(self.hedge_percentile)
+
+        if hedge_delay_ms is None:
+            return self._timed(func, AttemptCancellation())
+
+        primary_cancellation = AttemptCancellation()
+        hedge_cancellation = AttemptCancellation()
+        lock = threading.Lock()
+        # primary_done: 主请求已结束；hedge_started: 对冲请求已发出；winner: 先成功（返回非None）的一方
+        state = {"primary_done": False, "hedge_started": False, "winner": None}
+        hedge_outcome = {}
+        primary_finished = threading.Event()
+        hedge_finished = threading.Event()
+
+        def run_hedge():
+            if primary_finished.wait(hedge_delay_ms / 1000):
+                return
+            with lock:
+                if state["primary_done"]:
+                    return
+                state["hedge_started"] = True
+            self.stats.record("hedges")
+            try:
+                hedge_outcome["result"] = self._timed(func, hedge_cancellation)
+            except Exception as e:
+                hedge_outcome["error"] = e
+            finally:
+                if hedge_outcome.get("result") is not None:
+                    with lock:
+                        cancel_primary = state["winner"] is None and not state["primary_done"]
+                        if state["winner"] is None:
+                            state["winner"] = "hedge"
+                    if cancel_primary:
+                        # 对冲请求先成功，取消仍在进行的主请求
+                        primary_cancellation.cancel()
+                hedge_finished.set()
+
+        threading.Thread(target=run_hedge, name="ai-hedge", daemon=True).start()
+
+        primary_result, primary_error = None, None
+        try:
+            primary_result = self._timed(func, primary_cancellation)
+        except Exception as e:
+            primary_error = e
+        finally:
+            primary_finished.set()
+
+        with lock:
+            state["primary_done"] = True
+            hedge_started = state["hedge_started"]
+            if primary_result is not None and state["winner"] is None:
+                state["winner"] = "primary"
+            winner = state["winner"]
+
+        if winner == "primary":
+            if hedge_started:
+                hedge_cancellation.cancel()
+                self.stats.record("hedge_cancels")
+            return primary_result
+
+        if hedge_started:
+            hedge_finished.wait()
+            if winner == "hedge" or hedge_outcome.get("result") is not None:
+                if primary_cancellation.cancelled:
+                    self.stats.record("hedge_cancels")
+                self.stats.record("hedge_wins")
+                return hedge_outcome["result"]
+
+        # 没有请求成功：有异常时抛出（优先对冲请求的异常，与其结束较晚一致），否则返回None
+        last_error = hedge_outcome.get("error") or primary_error
+        if last_error is not None:
+            raise last_error
+        return None
+
+    def _timed(self, func: Callable[[AttemptCancellation], Any], cancellation: AttemptCancellation) -> Any:
+        """执行请求并记录统计（被取消的请求不计入成功或失败）"""
+        self.stats.record("requests")
+        start_time = time.perf_counter()
+        try:
+            result = func(cancellation)
+        except Exception:
+            if not cancellation.cancelled:
+                self.stats.record("failures")
+            raise
+        if cancellation.cancelled:
+            return result
+        if result is None:
+            self.stats.record("failures")
+        else:
+            self.stats.record("successes", (time.perf_counter() - start_time) * 1000)
+        return result
+
+
+# 按提供商共享的熔断器和统计（同一进程内的所有处理器实例共用）
+_breakers: Dict[str, CircuitBreaker] = {}
+_provider_stats: Dict[str, ProviderStats] = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                        recovery_seconds: float = DEFAULT_RECOVERY_SECONDS) -> CircuitBreaker:
+    """获取提供商的熔断器（首次调用时创建）"""
+    with _registry_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(failure_threshold, recovery_seconds)
+        return _breakers[provider]
+
+
+def get_provider_stats(provider: str) -> ProviderStats:
+    """获取提供商的调用统计（首次调用时创建）"""
+    with _registry_lock:
+        if provider not in _provider_stats:
+            _provider_stats[provider] = ProviderStats()
+        return _provider_stats[provider]
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """
+    便捷函数：获取所有提供商的调用统计和熔断器状态
+    """
+    with _registry_lock:
+        providers = set(_breakers) | set(_provider_stats)
+    stats = {}
+    for provider in sorted(providers):
+        provider_stats = get_provider_stats(provider).snapshot()
+        breaker = _breakers.get(provider)
+        provider_stats["circuit_state"] = breaker.state if breaker else CircuitBreaker.CLOSED
+        stats[provider] = provider_stats
+    return stats
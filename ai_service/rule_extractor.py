@@ -0,0 +1,301 @@
+"""
+规则快速解析模块
+对格式规范的测试口述（功能场景 + 总分/小分 + 剪辑标记，或开始/结束状态）
+用预编译的正则直接生成与大模型相同结构的JSON，只有无法确定的语句才交给模型处理
+"""
+import re
+import json
+import logging
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 中文数字
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+              '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_NUMBER_CHARS = r"[0-9零〇一二两三四五六七八九十点.]+"
+
+# 常见错别字纠正（与system_prompt.txt中的规则保持一致）
+TYPO_CORRECTIONS = {
+    "飞道": "变道",
+    "导行": "导航",
+    "接官": "接管",
+    "效率线": "效率性",
+    "安全线": "安全性",
+}
+
+# 开始/结束状态语句中允许出现的语气词和填充词
+_STATUS_FILLER = re.compile(
+    r"(好的|好|我们|现在|那么|那|然后|喂|今天的|今天|测试|到这里|就|了|啊|吧|呀|嗯|哦|一下)"
+)
+
+# 句首的序号标记，如"第11条，"
+_SEQUENCE_PREFIX = re.compile(r"^第[0-9零〇一二两三四五六七八九十百]+条[\s，,。.、：:]*")
+
+# 标点与空白
+_PUNCTUATION = re.compile(r"[\s，,。.、；;：:！!？?]+")
+
+# 连续重复的词（如"超车超车"），需要模型去重
+_REPEATED_WORD = re.compile(r"(.{2,})\1")
+
+# 分数范围
+MIN_SCORE = 0
+MAX_SCORE = 10
+DEFAULT_SCORE = 7
+
+# 系统提示词默认路径
+DEFAULT_SYSTEM_PROMPT_PATH = Path(__file__).parent / "system_prompt.txt"
+
+
+def parse_chinese_number(text: str) -> Optional[float]:
+    """
+    解析阿拉伯数字或中文数字（支持"十"、"两"、"点"）
+
+    Args:
+        text: 数字文本，如 "6"、"六"、"十"、"七点五"
+
+    Returns:
+        数值，无法解析返回None
+    """
+    if not text:
+        return None
+    text = text.replace('点', '.')
+
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    integer_part, _, decimal_part = text.partition('.')
+
+    # 整数部分：支持 "十"、"十X"、"X十"、"X十X" 和单个数字
+    if '十' in integer_part:
+        tens, _, units = integer_part.partition('十')
+        if tens and tens not in _CN_DIGITS:
+            return None
+        if units and units not in _CN_DIGITS:
+            return None
+        value = (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[units] if units else 0)
+    elif len(integer_part) == 1 and integer_part in _CN_DIGITS:
+        value = _CN_DIGITS[integer_part]
+    else:
+        return None
+
+    if decimal_part:
+        if not all(ch in _CN_DIGITS for ch in decimal_part):
+            return None
+        value += float("0." + "".join(str(_CN_DIGITS[ch]) for ch in decimal_part))
+
+    return float(value)
+
+
+def load_function_keywords(prompt_path: Optional[Path] = None) -> List[str]:
+    """
+    读取系统提示词中的功能关键词列表
+
+    Args:
+        prompt_path: 提示词文件路径，默认为本模块目录下的system_prompt.txt
+
+    Returns:
+        功能关键词列表，文件不存在或解析失败时返回空列表
+    """
+    prompt_path = Path(prompt_path) if prompt_path else DEFAULT_SYSTEM_PROMPT_PATH
+    try:
+        system_prompt = prompt_path.read_text(encoding='utf-8')
+    except OSError as e:
+        logger.warning(f"读取系统提示词失败: {e}")
+        return []
+    return extract_prompt_section(system_prompt, "function_keywords", "[", "]") or []
+
+
+def extract_prompt_section(prompt: str, key: str, opener: str, closer: str) -> Any:
+    """从系统提示词中提取指定键对应的JSON片段（提示词整体不一定是严格JSON）"""
+    match = re.search(rf'"{key}"\s*:\s*({re.escape(opener)}.*?{re.escape(closer)})', prompt, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError as e:
+        logger.warning(f"解析系统提示词中的{key}失败: {e}")
+        return None
+
+
+class RuleBasedExtractor:
+    """规则快速解析器"""
+
+    def __init__(self, score_mapping: Dict[str, str],
+                 function_keywords: Iterable[str],
+                 status_keywords: Dict[str, List[str]]):
+        """
+        初始化解析器
+
+        Args:
+            score_mapping: 中文维度名到英文字段名的映射（task.score_mapping）
+            function_keywords: 功能场景关键词列表
+            status_keywords: 状态关键词，如 {"start": [...], "end": [...]}
+        """
+        self.dimension_names = list(score_mapping.keys())
+        # 长关键词优先，保证"导航变道"不会被拆成"导航"+"变道"
+        self.function_keywords = sorted(set(function_keywords), key=len, reverse=True)
+        self.start_keywords = sorted(status_keywords.get('start', []), key=len, reverse=True)
+        self.end_keywords = sorted(status_keywords.get('end', []), key=len, reverse=True)
+
+        self._typo_pattern = re.compile("|".join(re.escape(k) for k in TYPO_CORRECTIONS))
+
+        dimensions = "|".join(re.escape(name) for name in sorted(self.dimension_names, key=len, reverse=True))
+        # 分数相关标记：总分X分 / 维度X分 / 小分 / 剪辑
+        self._token_pattern = re.compile(
+            rf"(?P<total>总分\s*(?P<total_value>{_NUMBER_CHARS})\s*分)"
+            rf"|(?P<dimension>(?P<dimension_name>{dimensions})\s*(?P<dimension_value>{_NUMBER_CHARS})\s*分)"
+            r"|(?P<sub>小分)"
+            r"|(?P<clip>剪辑)"
+        )
+        # 描述部分残留的评分字样（如同音误写的"总分纠纷"），说明分数未被规则完整识别
+        self._residual_score_pattern = re.compile(
+            rf"总分|小分|{dimensions}|[0-9零〇一二两三四五六七八九十]\s*分"
+        )
+        self._function_pattern = re.compile(
+            "|".join(re.escape(k) for k in self.function_keywords)
+        ) if self.function_keywords else None
+
+    @classmethod
+    def from_system_prompt(cls, system_prompt: str, score_mapping: Dict[str, str]) -> "RuleBasedExtractor":
+        """
+        从系统提示词中读取功能关键词和状态关键词创建解析器
+
+        Args:
+            system_prompt: system_prompt.txt的内容
+            score_mapping: task.score_mapping
+
+        Returns:
+            解析器实例
+        """
+        function_keywords = extract_prompt_section(system_prompt, "function_keywords", "[", "]") or []
+        status_keywords = extract_prompt_section(system_prompt, "status_keywords", "{", "}") or {}
+        return cls(score_mapping, function_keywords, status_keywords)
+
+    def extract(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        解析一条口述文本
+
+        Args:
+            text: ASR识别文本
+
+        Returns:
+            与模型输出结构相同的字典；语句存在歧义或无法完全识别时返回None（交给模型处理）
+        """
+        if not text or not text.strip():
+            return None
+
+        normalized = unicodedata.normalize("NFKC", text).strip()
+        normalized = _SEQUENCE_PREFIX.sub("", normalized)
+        normalized = self._typo_pattern.sub(lambda m: TYPO_CORRECTIONS[m.group(0)], normalized)
+
+        tokens = list(self._token_pattern.finditer(normalized))
+        description = normalized[:tokens[0].start()] if tokens else normalized
+
+        # 分数标记之后只允许出现标点，出现其他内容说明语句结构不规范
+        for previous, current in zip(tokens, tokens[1:] + [None]):
+            end = current.start() if current else len(normalized)
+            if _PUNCTUATION.sub("", normalized[previous.end():end]):
+                return None
+
+        if self._residual_score_pattern.search(description):
+            return None
+
+        functions = self._match_functions(description)
+
+        if not tokens and not functions:
+            return self._extract_status(description)
+
+        if not functions:
+            return None
+
+        comment = self._clean_comment(description)
+        if not comment or _REPEATED_WORD.search(_PUNCTUATION.sub("", comment)):
+            return None
+
+        result: Dict[str, Any] = {"comment": comment, "function": functions[0]}
+        total_score = None
+        dimension_scores: Dict[str, Any] = {}
+        clipped = False
+
+        for token in tokens:
+            if token.group("total"):
+                if total_score is not None:
+                    return None
+                total_score = self._parse_score(token.group("total_value"))
+                if total_score is None:
+                    return None
+            elif token.group("dimension"):
+                name = token.group("dimension_name")
+                value = self._parse_score(token.group("dimension_value"))
+                if value is None or name in dimension_scores:
+                    return None
+                dimension_scores[name] = value
+            elif token.group("clip"):
+                clipped = True
+
+        result["score"] = total_score if total_score is not None else DEFAULT_SCORE
+        result.update(dimension_scores)
+        if clipped:
+            result["是否剪辑"] = "是"
+        return result
+
+    def extract_json(self, text: str) -> Optional[str]:
+        """解析一条口述文本并返回JSON字符串，无法确定时返回None"""
+        result = self.extract(text)
+        return json.dumps(result, ensure_ascii=False) if result is not None else None
+
+    def _match_functions(self, description: str) -> List[str]:
+        """
+        按出现位置匹配描述中的功能关键词（同一位置取最长的关键词）
+
+        口述以功能场景开头、后接修饰描述（如"左转复杂路口犹豫"），
+        出现多个关键词时取第一个作为function，其余作为描述保留在comment中
+        """
+        if not self._function_pattern or not description:
+            return []
+        found = []
+        for match in self._function_pattern.finditer(description):
+            if match.group(0) not in found:
+                found.append(match.group(0))
+        return found
+
+    def _extract_status(self, description: str) -> Optional[Dict[str, Any]]:
+        """识别开始/结束状态语句"""
+        compact = _PUNCTUATION.sub("", description)
+        if not compact:
+            return None
+
+        has_start = any(k in compact for k in self.start_keywords)
+        has_end = any(k in compact for k in self.end_keywords)
+        if has_start == has_end:
+            return None
+
+        keywords = self.start_keywords if has_start else self.end_keywords
+        remainder = compact
+        for keyword in keywords:
+            remainder = remainder.replace(keyword, "")
+        if _STATUS_FILLER.sub("", remainder):
+            return None
+
+        if has_start:
+            return {"comment": "开始测试", "status": "start"}
+        return {"comment": "测试结束", "status": "end"}
+
+    @staticmethod
+    def _clean_comment(description: str) -> str:
+        """清理描述文本：去除首尾标点，内部停顿统一为中文逗号"""
+        parts = [part for part in _PUNCTUATION.split(description) if part]
+        return "，".join(parts)
+
+    @staticmethod
+    def _parse_score(value_text: str) -> Optional[int]:
+        """解析并校验分数；输出schema要求整数，带小数的分数（如"七点五分"）交给模型处理"""
+        value = parse_chinese_number(value_text)
+        if value is None or not value.is_integer() or not (MIN_SCORE <= value <= MAX_SCORE):
+            return None
+        return int(value)
@@ -0,0 +1,131 @@
+"""
+流式JSON增量解析模块
+逐段接收模型流式输出，增量跟踪顶层JSON对象的括号深度：
+对象闭合即得到结果（之后只统计多余输出，供调用方决定是否继续读取用量分片）；
+对象开始前的前导内容（如<think>块）超出预算时提前中止；<think>…</think>中的括号不视为对象开始
+"""
+from typing import List, Optional
+
+# 对象开始前允许的前导字符数（<think>标记、代码块标记等）
+DEFAULT_MAX_PREAMBLE_CHARS = 1024
+
+# 对象闭合后为等待携带token用量的最后一个分片，允许继续接收的非空白字符数
+DEFAULT_MAX_TRAILING_CHARS = 32
+
+# 思考块标记（可能被拆分到多个分片中）
+_THINK_OPEN = '<think>'
+_THINK_CLOSE = '</think>'
+_TAG_WINDOW = max(len(_THINK_OPEN), len(_THINK_CLOSE))
+
+
+class StreamAbortedError(Exception):
+    """流式输出明显不是JSON时提前中止"""
+    pass
+
+
+class StreamingJSONAccumulator:
+    """流式JSON累加器 - 列表缓冲，单遍扫描，不回溯已处理的内容"""
+
+    def __init__(self, max_preamble_chars: Optional[int] = DEFAULT_MAX_PREAMBLE_CHARS):
+        """
+        初始化累加器
+
+        Args:
+            max_preamble_chars: 顶层对象开始前允许的最大字符数，None或0表示不限制
+        """
+        self.max_preamble_chars = max_preamble_chars or None
+
+        self._parts: List[str] = []
+        self._length = 0            # 已接收的总字符数
+        self._object_start = None   # 顶层对象"{"的全局位置
+        self._object_end = None     # 顶层对象"}"之后的全局位置
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._trailing_chars = 0    # 对象闭合后收到的非空白字符数
+        self._in_think = False      # 是否处于<think>块中（其中的括号不视为对象开始）
+        self._tag_window = ''       # 对象开始前最近收到的字符，用于识别跨分片的思考块标记
+
+    @property
+    def complete(self) -> bool:
+        """顶层JSON对象是否已闭合"""
+        return self._object_end is not None
+
+    @property
+    def trailing_chars(self) -> int:
+        """顶层对象闭合后继续收到的非空白字符数（含闭合分片中对象之后的部分）"""
+        return self._trailing_chars
+
+    def feed(self, delta: str) -> bool:
+        """
+        接收一段流式输出
+
+        Args:
+            delta: 本次增量文本
+
+        Returns:
+            顶层对象已闭合返回True（调用方应停止读取流）
+
+        Raises:
+            StreamAbortedError: 对象开始前的前导内容超出预算
+        """
+        if not delta:
+            return self.complete
+        if self.complete:
+            self._trailing_chars += len(delta.strip())
+            return True
+
+        offset = self._length
+        self._parts.append(delta)
+        self._length += len(delta)
+
+        for index, char in enumerate(delta):
+            if self._object_start is None:
+                self._tag_window = (self._tag_window + char)[-_TAG_WINDOW:]
+                if self._in_think:
+                    if self._tag_window.endswith(_THINK_CLOSE):
+                        self._in_think = False
+                elif self._tag_window.endswith(_THINK_OPEN):
+                    self._in_think = True
+                elif char == '{':
+                    self._object_start = offset + index
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._object_end = offset + index + 1
+                    self._trailing_chars = len(delta[index + 1:].strip())
+                    return True
+
+        if self._object_start is None and self.max_preamble_chars and self._length > self.max_preamble_chars:
+            reason = "思考块仍未结束" if self._in_think else "未出现JSON对象"
+            raise StreamAbortedError(
+                f"模型输出前{self._length}个字符内{reason}，提前中止生成"
+            )
+        return False
+
+    def getvalue(self) -> str:
+        """
+        获取累计结果
+
+        Returns:
+            顶层对象已闭合时只返回该对象（丢弃前导内容和对象之后的多余输出），
+            否则返回已接收的全部内容
+        """
+        text = "".join(self._parts)
+        if self._object_end is not None:
+            return text[self._object_start:self._object_end]
+        return text
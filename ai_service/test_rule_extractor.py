@@ -0,0 +1,52 @@
+"""
+规则快速解析测试脚本
+验证格式规范的口述由规则直接解析，且结构与模型输出一致
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ai_service.rule_extractor import RuleBasedExtractor
+from config_manager import get_config
+
+
+def _load_extractor() -> RuleBasedExtractor:
+    system_prompt = (Path(__file__).parent / 'system_prompt.txt').read_text(encoding='utf-8')
+    return RuleBasedExtractor.from_system_prompt(system_prompt, get_config().task['score_mapping'])
+
+
+def test_example_utterance():
+    """测试ai_api.py中的示例语句（描述中出现多个功能关键词时取第一个）"""
+    extractor = _load_extractor()
+    result = extractor.extract("第11条，左转复杂路口犹豫总分六分小分效率性五分剪辑")
+    assert result == {
+        "comment": "左转复杂路口犹豫",
+        "function": "左转",
+        "score": 6,
+        "效率性": 5,
+        "是否剪辑": "是",
+    }
+
+
+def test_fractional_score_goes_to_model():
+    """测试带小数的分数不由规则解析（输出schema要求整数）"""
+    extractor = _load_extractor()
+    assert extractor.extract("左转 总分七点五分") is None
+    assert extractor.extract("左转 总分7.5分") is None
+    assert extractor.extract("左转 总分七分")["score"] == 7
+
+
+def test_status_utterance():
+    """测试开始/结束状态语句"""
+    extractor = _load_extractor()
+    assert extractor.extract("好的，我们开始测试") == {"comment": "开始测试", "status": "start"}
+    assert extractor.extract("测试结束") == {"comment": "测试结束", "status": "end"}
+
+
+if __name__ == "__main__":
+    test_example_utterance()
+    test_fractional_score_goes_to_model()
+    test_status_utterance()
+    print("✅ 规则快速解析测试通过")
@@ -0,0 +1,54 @@
+"""
+流式JSON增量解析测试脚本
+验证累加器在对象闭合时结束、跳过思考块中的括号，以及前导内容超出预算时中止
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ai_service.stream_json import StreamingJSONAccumulator, StreamAbortedError
+
+
+def _feed_all(accumulator: StreamingJSONAccumulator, text: str, chunk_size: int) -> bool:
+    """按固定长度分片输入，返回是否已闭合"""
+    for start in range(0, len(text), chunk_size):
+        if accumulator.feed(text[start:start + chunk_size]):
+            return True
+    return False
+
+
+def test_object_closes_stream():
+    """测试顶层对象闭合即结束，对象之后的多余输出只计数"""
+    accumulator = StreamingJSONAccumulator()
+    assert accumulator.feed('```json\n{"function": "左转", "detail": {"score": 6}') is False
+    assert accumulator.feed('}\n``` 说明') is True
+    assert accumulator.getvalue() == '{"function": "左转", "detail": {"score": 6}}'
+    assert accumulator.trailing_chars == len('``` 说明')
+
+
+def test_braces_inside_think_block_are_ignored():
+    """测试思考块中出现的括号不被当作结果（标记被拆分到不同分片时也能识别）"""
+    text = '<think>用户要求输出{"功能":"左转"}这样的格式…</think>{"功能":"右转","总分":6}'
+    for chunk_size in (1, 3, 7, len(text)):
+        accumulator = StreamingJSONAccumulator()
+        assert _feed_all(accumulator, text, chunk_size)
+        assert accumulator.getvalue() == '{"功能":"右转","总分":6}'
+
+
+def test_think_block_counts_against_preamble_budget():
+    """测试未结束的思考块计入前导内容预算"""
+    accumulator = StreamingJSONAccumulator(max_preamble_chars=32)
+    try:
+        accumulator.feed('<think>' + '{"a":1}' * 10)
+    except StreamAbortedError:
+        return
+    raise AssertionError("思考块超出预算时应中止")
+
+
+if __name__ == "__main__":
+    test_object_closes_stream()
+    test_braces_inside_think_block_are_ignored()
+    test_think_block_counts_against_preamble_budget()
+    print("✅ 流式JSON增量解析测试通过")
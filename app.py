@@ -1,6 +1,6 @@
 from typing import *
 from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, Query
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import asyncio
 import logging
@@ -12,9 +12,11 @@ from voiceapi.asr import start_asr_stream, ASRStream, ASRResult
 import logging
 import argparse
 import glob
+import json
 import os
 from datetime import datetime
 from business_logic.business_logic import BusinessLogicRouter
+from business_logic.job_manager import get_job_manager
 from config_manager import get_config
 from toexcel.toexcel import export_to_excel 
 import time
@@ -37,14 +39,12 @@ class ExcelProcessRequest(BaseModel):
 
 # AI处理API端点
 @app.post("/ai-process-excel", 
-          description="Process Excel file from ASR task directory")
+          description="Submit a background job that processes the Excel file of an ASR task directory")
 async def ai_process_latest_excel(request: ExcelProcessRequest):
     """
-    处理指定ASR任务目录中的Excel文件并进行AI分析
-    通过业务逻辑层进行处理
+    提交后台任务：处理指定ASR任务目录中的Excel文件并进行AI分析
+    立即返回任务ID，处理进度通过 /ai-process-excel/jobs/{job_id}/events 推送
     """
-    global start_mission_time_global
-    
     # 验证目录名格式（时间戳格式）
     # import re
     # if not re.match(r'^\d{4}_\d{2}_\d{2}_\d{2}_\d{2}_\d{2}$', request.task_dir):
@@ -54,7 +54,6 @@ async def ai_process_latest_excel(request: ExcelProcessRequest):
     #     )
     
     # 检查目录是否存在
-    import os
     task_path = os.path.join("download", request.task_dir)
     if not os.path.exists(task_path):
         raise HTTPException(
@@ -62,29 +61,118 @@ async def ai_process_latest_excel(request: ExcelProcessRequest):
             detail=f"任务目录不存在: {task_path}"
         )
     
-    try:
-        # 初始化业务逻辑路由器
+    def run_task_flow(progress):
+        # 初始化业务逻辑路由器，获取对应的任务处理器
         router = BusinessLogicRouter()
-        
-        # 获取对应的任务处理器
         processor = router.route_to_processor()
         
         # 执行完整的业务流程，传入文件路径
-        result = processor.execute_task_flow(request.task_dir)
-        
-        if not result['success']:
-            raise HTTPException(
-                status_code=500,
-                detail=f"业务流程执行失败: {result.get('error', '未知错误')}"
-            )
-        
-        return
-        
-    except HTTPException:
-        raise
+        return processor.execute_task_flow(request.task_dir, progress)
+    
+    try:
+        job = get_job_manager().submit("ai-process-excel", run_task_flow, {"task_dir": request.task_dir})
+    except Exception as e:
+        logger.error(f"提交AI处理任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"提交AI处理任务失败: {str(e)}")
+    
+    return {"job_id": job.job_id, "status": job.status}
+
+class BatchProcessRequest(BaseModel):
+    """批量处理请求模型"""
+    task_dirs: Optional[List[str]] = Field(None, description="任务目录名列表，不指定时按since/until自动发现")
+    since: Optional[str] = Field(None, description="只处理目录名不小于该值的任务，如2025_01_01")
+    until: Optional[str] = Field(None, description="只处理目录名不大于该值的任务（前缀匹配），如2025_01_07")
+    max_workers: Optional[int] = Field(None, description="工作进程数，默认task.batch.max_workers")
+
+@app.post("/ai-process-excel/batch",
+          description="Submit a background job that processes many ASR task directories in parallel worker processes")
+async def ai_process_excel_batch(request: BatchProcessRequest):
+    """
+    提交批量后台任务：多个任务目录分发到进程池并行处理，模型请求并发上限由所有工作进程共享
+    进度按已完成的任务目录数推送，任务结果为各任务的汇总
+    """
+    from business_logic.batch_runner import discover_task_dirs, run_batch
+    
+    task_dirs = request.task_dirs or discover_task_dirs(since=request.since, until=request.until)
+    if not task_dirs:
+        raise HTTPException(status_code=404, detail="没有找到需要处理的任务目录")
+    
+    def run_batch_flow(progress):
+        return run_batch(task_dirs, max_workers=request.max_workers, progress=progress)
+    
+    try:
+        job = get_job_manager().submit("ai-process-excel-batch", run_batch_flow, {"task_dirs": task_dirs})
     except Exception as e:
-        logger.error(f"业务逻辑层处理失败: {e}")
-        raise HTTPException(status_code=500, detail=f"业务逻辑层处理失败: {str(e)}")
+        logger.error(f"提交批量处理任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"提交批量处理任务失败: {str(e)}")
+    
+    return {"job_id": job.job_id, "status": job.status, "task_dirs": task_dirs}
+
+def _get_job_or_404(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return job
+
+@app.get("/ai-process-excel/jobs/{job_id}", description="Get the status and progress of an AI processing job")
+async def get_ai_process_job(job_id: str):
+    """查询后台任务状态和进度"""
+    return _get_job_or_404(job_id).to_dict()
+
+@app.post("/ai-process-excel/jobs/{job_id}/cancel", description="Cancel an AI processing job")
+async def cancel_ai_process_job(job_id: str):
+    """取消后台任务（运行中的任务在处理完当前行后停止）"""
+    _get_job_or_404(job_id)
+    return get_job_manager().cancel(job_id).to_dict()
+
+# SSE连接空闲时发送保活注释的间隔（秒）
+_SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/ai-process-excel/jobs/{job_id}/events", description="Stream AI processing job progress as server-sent events")
+async def stream_ai_process_job(job_id: str):
+    """以SSE推送后台任务进度，任务结束后关闭连接"""
+    job = _get_job_or_404(job_id)
+    
+    async def event_stream():
+        last_version = -1
+        last_sent_at = time.monotonic()
+        while True:
+            # 先判断是否结束再取快照，保证最后一次推送包含最终状态
+            finished = job.finished
+            if job.version != last_version:
+                snapshot = job.to_dict()
+                last_version = snapshot["version"]
+                last_sent_at = time.monotonic()
+                yield f"data: {json.dumps(snapshot, ensure_ascii=False, default=str)}\n\n"
+            elif time.monotonic() - last_sent_at >= _SSE_KEEPALIVE_SECONDS:
+                # 长时间没有进度变化（如单次模型调用较慢）时发送注释行，避免代理因空闲断开连接
+                last_sent_at = time.monotonic()
+                yield ": keep-alive\n\n"
+            if finished:
+                return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/statistics/{task_dir}/live", description="Live rating, scene rating and average score statistics of a task")
+async def get_live_statistics(task_dir: str):
+    """
+    读取任务当前的评级统计、场景评级统计和平均分统计（增量维护的汇总表，测试过程中可轮询）
+    """
+    try:
+        statistics = await asyncio.to_thread(
+            lambda: BusinessLogicRouter().route_to_processor().get_live_statistics(task_dir)
+        )
+    except Exception as e:
+        logger.error(f"获取实时统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取实时统计失败: {str(e)}")
+
+    return {
+        "task_dir": task_dir,
+        "statistics": statistics,
+        "timestamp": datetime.now().isoformat()
+    }
 
 @app.websocket("/asr")
 async def websocket_asr(websocket: WebSocket,
@@ -99,6 +187,17 @@ async def websocket_asr(websocket: WebSocket,
         await websocket.close()
         return
 
+    # 任务启用实时处理时，识别完成的语句在后台即时进行AI处理和入库
+    task_dir = start_mission_time_global.replace(":", "_").replace(" ", "_").replace("-", "_")
+    try:
+        # 创建会话会初始化处理器和数据库连接，不在事件循环中执行
+        realtime_session = await asyncio.to_thread(BusinessLogicRouter().create_realtime_session, task_dir)
+    except Exception as e:
+        logger.error(f"启动实时处理失败: {e}")
+        realtime_session = None
+    pending_ai_tasks = set()
+    connected = True
+
     async def task_recv_pcm():
         while True:
             pcm_bytes = await websocket.receive_bytes()
@@ -106,6 +205,16 @@ async def websocket_asr(websocket: WebSocket,
                 return
             await asr_stream.write(pcm_bytes)
 
+    async def send_ai_result(result: ASRResult):
+        try:
+            message = await asyncio.wrap_future(
+                realtime_session.submit(result.text, result.start_time, result.idx)
+            )
+            if connected:
+                await websocket.send_json(message)
+        except Exception as e:
+            logger.warning(f"asr: 推送实时处理结果失败: {e}")
+
     async def task_send_result():
         while True:
             result: ASRResult = await asr_stream.read()
@@ -113,12 +222,20 @@ async def websocket_asr(websocket: WebSocket,
                 return
             await websocket.send_json(result.to_dict())
             logger.debug(result.to_dict())
+            if realtime_session is not None and result.finished:
+                ai_task = asyncio.create_task(send_ai_result(result))
+                pending_ai_tasks.add(ai_task)
+                ai_task.add_done_callback(pending_ai_tasks.discard)
     try:
         await asyncio.gather(task_recv_pcm(), task_send_result())
     except WebSocketDisconnect:
         logger.info("asr: disconnected")
     finally:
+        connected = False
         await asr_stream.close()
+        if realtime_session is not None:
+            # 已提交的语句处理完毕后释放工作线程，AI结果保留到任务提交时复用
+            await asyncio.to_thread(realtime_session.close)
 
 
 @app.websocket("/tts")
@@ -251,6 +368,9 @@ async def reload_configuration():
     try:
         from config_manager import reload_config
         reload_config()
+        # 提供商或端点可能已变更，立即重新探测
+        from ai_service.health_monitor import get_health_monitor
+        get_health_monitor().refresh()
         return {
             "status": "success",
             "message": "配置重新加载成功"
@@ -264,14 +384,19 @@ async def get_system_status():
     获取系统状态信息
     """
     try:
-        # 导入AI处理器并检查ollama服务状态
-        from ai_service.ai_api import CarTestDataProcessor
-        processor = CarTestDataProcessor()
-        ollama_status = processor.check_service_status()
+        # 读取后台健康监测缓存的探测结果，不在请求中创建处理器或发起网络调用
+        from ai_service.health_monitor import get_health_monitor
+        from ai_service.resilience import get_resilience_stats
+        from ai_service.endpoint_pool import get_endpoint_stats
+        health = get_health_monitor().get_status()
+        available = health["available"]
         
         return {
-            "api_connection": "Active" if ollama_status else "Inactive",
-            "api_connection_status": ollama_status,
+            "api_connection": "Checking" if available is None else ("Active" if available else "Inactive"),
+            "api_connection_status": bool(available),
+            "health": health,
+            "provider_stats": get_resilience_stats(),
+            "endpoint_stats": get_endpoint_stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -283,6 +408,20 @@ async def get_system_status():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/api/metrics", description="AI call metrics (token counts and latency histograms per provider/model)")
+async def get_ai_metrics(format: str = Query("json", description="json 或 prometheus")):
+    """
+    获取AI调用指标：按提供商/模型汇总的调用次数、token数和各阶段耗时直方图
+    """
+    from ai_service.metrics import get_metrics_registry
+    registry = get_metrics_registry()
+    if format == "prometheus":
+        return PlainTextResponse(registry.to_prometheus(), media_type="text/plain; version=0.0.4")
+    return {
+        "metrics": registry.snapshot(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 class ResultsData(BaseModel):
     """接收ResultsData数据的模型"""
     results: List[dict] = Field(..., description="日志数据列表")
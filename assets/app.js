@@ -125,13 +125,25 @@ const demoapp = {
 
         ws.onmessage = (e) => {
             const data = JSON.parse(e.data);
+
+            // 实时处理结果：附加到对应的识别记录上
+            if (data.type === 'ai_result') {
+                const log = self.logs.find(item => item.asr_idx === data.idx && item.result === data.text);
+                if (log) {
+                    log.ai_status = data.status;
+                    log.ai_result = data.result;
+                    self.saveLogs(self.logs);
+                }
+                return;
+            }
+
             const { text, start_time, finished, idx } = data;
 
             currentMessage = text;
             self.currentText = text
 
             if (finished) {
-                self.logs.push({ result: currentMessage, time:start_time, idx: self.logs.length });
+                self.logs.push({ result: currentMessage, time:start_time, idx: self.logs.length, asr_idx: idx });
                 // 保存更新后的logs
                 self.saveLogs(self.logs);
                 currentMessage = '';
@@ -164,6 +176,7 @@ const demoapp = {
     async processWithAI() {
         this.aiProcessing = true;
         this.aiProcessingResult = null;
+        this.aiProcessingProgress = null;
         
         try {
             let selectedTaskDir = '';
@@ -260,7 +273,49 @@ const demoapp = {
                 throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
             }
             
-            const result = await response.json();
+            // 后端立即返回任务ID，处理进度通过SSE推送
+            const { job_id } = await response.json();
+            const job = await new Promise((resolve, reject) => {
+                const events = new EventSource(`/ai-process-excel/jobs/${job_id}/events`);
+                events.onmessage = (event) => {
+                    const snapshot = JSON.parse(event.data);
+                    this.aiProcessingProgress = snapshot.progress;
+                    if (['succeeded', 'failed', 'cancelled'].includes(snapshot.status)) {
+                        events.close();
+                        resolve(snapshot);
+                    }
+                };
+                events.onerror = () => {
+                    // 连接临时中断时EventSource会自动重连，只有连接被关闭后才改为轮询任务状态
+                    if (events.readyState !== EventSource.CLOSED) {
+                        return;
+                    }
+                    const poll = async () => {
+                        try {
+                            const statusResponse = await fetch(`/ai-process-excel/jobs/${job_id}`);
+                            if (!statusResponse.ok) {
+                                throw new Error(`HTTP error! status: ${statusResponse.status}`);
+                            }
+                            const snapshot = await statusResponse.json();
+                            this.aiProcessingProgress = snapshot.progress;
+                            if (['succeeded', 'failed', 'cancelled'].includes(snapshot.status)) {
+                                resolve(snapshot);
+                            } else {
+                                setTimeout(poll, 2000);
+                            }
+                        } catch (error) {
+                            reject(new Error(`任务进度查询失败: ${error.message}`));
+                        }
+                    };
+                    poll();
+                };
+            });
+            
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `任务${job.status === 'cancelled' ? '已取消' : '失败'}`);
+            }
+            
+            const result = job.result;
             this.aiProcessingResult = result;
             
             console.log('AI处理完成:', result);
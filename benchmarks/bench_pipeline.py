@@ -0,0 +1,235 @@
+"""
+AI处理流程端到端吞吐基准
+启动本地模拟模型服务（或使用--base-url指定的服务），生成指定行数的合成ASR结果Excel，
+驱动DrivingEvaluationProcessor.execute_task_flow完整执行6个步骤，报告吞吐（行/秒）、各步骤耗时和内存占用
+
+全程离线：数据库、AI缓存、输入Excel和导出文件都位于临时目录
+
+用法:
+    python benchmarks/bench_pipeline.py --rows 100 1000 10000 --latency lognormal:3.0,0.5
+    python benchmarks/bench_pipeline.py --rows 1000 --provider openai --json
+"""
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_llm_server import MockLLM, MockLLMServer, load_answers
+
+# 合成语句模板：功能点 + 描述 + 总分 + 可选的维度评分
+_FUNCTIONS = ["跟车", "变道", "超车", "汇入匝道", "驶出匝道", "隧道通行", "施工路段", "危险接管", "路口左转", "靠边停车"]
+_DESCRIPTIONS = ["表现平稳", "跟随大车不超车", "变道犹豫", "刹车偏重", "加速迟缓", "提前减速", "车道居中良好", "识别较晚"]
+_DIMENSIONS = ["安全性", "舒适性", "效率性", "响应性", "可预测性", "压力性", "功能性"]
+
+
+def generate_sentences(rows: int, unique_ratio: float = 1.0, seed: int = 0) -> List[str]:
+    """
+    生成合成ASR语句
+
+    Args:
+        rows: 行数
+        unique_ratio: 不重复语句占比（0~1），用于评估缓存/去重等优化的效果
+        seed: 随机种子
+
+    Returns:
+        语句列表
+    """
+    rng = random.Random(seed)
+    unique_count = max(1, int(rows * unique_ratio))
+    pool = []
+    for i in range(unique_count):
+        parts = [f"{rng.choice(_FUNCTIONS)}。", f"{rng.choice(_DESCRIPTIONS)}。", f"总分{rng.randint(3, 9)}分。"]
+        for dimension in rng.sample(_DIMENSIONS, rng.randint(0, 2)):
+            parts.append(f"{dimension}{rng.randint(3, 9)}分。")
+        # 加入序号保证语句互不相同
+        parts.append(f"第{i + 1}段。")
+        pool.append(" ".join(parts))
+    return [pool[i % unique_count] for i in range(rows)]
+
+
+def write_task_excel(download_dir: Path, task_dir: str, sentences: List[str]) -> Path:
+    """按ASR结果格式（time、result列）写入任务目录下的asr_results_*.xlsx"""
+    import pandas as pd
+
+    task_path = download_dir / task_dir
+    task_path.mkdir(parents=True, exist_ok=True)
+    start = datetime(2025, 1, 1, 9, 0, 0)
+    df = pd.DataFrame({
+        'time': [(start + timedelta(seconds=5 * i)).strftime('%Y-%m-%d %H:%M:%S') for i in range(len(sentences))],
+        'result': sentences,
+    })
+    file_path = task_path / f"asr_results_{task_dir}.xlsx"
+    df.to_excel(file_path, index=False)
+    return file_path
+
+
+def configure(config, args, base_url: str, work_dir: Path) -> None:
+    """将配置指向模拟服务和临时目录（只修改内存中的配置，不写回config.yaml）"""
+    config.set('ai.provider', args.provider)
+    config.set('ai.model_name', args.model)
+    endpoint = dict(config.get(f'ai.endpoints.{args.provider}', {}) or {})
+    endpoint.pop('base_urls', None)
+    endpoint['base_url'] = base_url if args.provider == 'ollama' else f"{base_url}/v1"
+    endpoint['api_key'] = endpoint.get('api_key') or 'mock'
+    config.set(f'ai.endpoints.{args.provider}', endpoint)
+
+    config.set('ai.cache.enabled', args.cache)
+    config.set('ai.cache.path', str(work_dir / 'ai_cache.db'))
+    config.set('ai.rule_fast_path', args.rule_fast_path)
+    config.set('ai.streaming.enabled', args.stream)
+    config.set('ai.timeout', args.timeout)
+    config.set('database.path', str(work_dir / 'bench.db'))
+    config.set('storage.download_dir', str(work_dir / 'download'))
+    config.set('task.realtime.enabled', False)
+
+
+def run_once(rows: int, args, work_dir: Path) -> Dict[str, Any]:
+    """执行一次完整任务流程并返回统计"""
+    from business_logic.business_logic import BusinessLogicRouter
+    from business_logic.job_manager import TaskProgress
+
+    task_dir = f"bench_{rows}_{int(time.time() * 1000)}"
+    sentences = generate_sentences(rows, args.unique_ratio, args.seed)
+    write_task_excel(work_dir / 'download', task_dir, sentences)
+
+    processor = BusinessLogicRouter().route_to_processor()
+    progress = TaskProgress()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = processor.execute_task_flow(task_dir, progress)
+    finally:
+        elapsed = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+
+    stats = {
+        "rows": rows,
+        "success": result.get('success'),
+        "error": result.get('error'),
+        "records_processed": result.get('records_processed'),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "step_timings": result.get('step_timings', {}),
+        "ai_metrics": result.get('ai_metrics', []),
+    }
+    if traced_peak is not None:
+        stats["tracemalloc_peak_mb"] = round(traced_peak / 1024 / 1024, 1)
+    if resource is not None:
+        # Linux下ru_maxrss单位为KB，macOS为字节
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        stats["max_rss_mb"] = round(maxrss / divisor, 1)
+    return stats
+
+
+def print_report(results: List[Dict[str, Any]], server_stats: Optional[Dict[str, int]]) -> None:
+    """打印文本报告"""
+    steps = []
+    for stats in results:
+        for step in stats["step_timings"]:
+            if step not in steps:
+                steps.append(step)
+
+    header = ["rows", "ok", "seconds", "rows/s"] + steps + ["peak MB", "max RSS MB"]
+    print()
+    print("\t".join(header))
+    for stats in results:
+        row = [str(stats["rows"]), "Y" if stats["success"] else "N", str(stats["elapsed_seconds"]),
+               str(stats["rows_per_second"])]
+        row += [str(stats["step_timings"].get(step, "-")) for step in steps]
+        row += [str(stats.get("tracemalloc_peak_mb", "-")), str(stats.get("max_rss_mb", "-"))]
+        print("\t".join(row))
+        if stats["error"]:
+            print(f"  错误: {stats['error']}")
+    if server_stats:
+        print(f"\n模拟服务请求统计: {server_stats}")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="AI处理流程端到端吞吐基准（离线，使用本地模拟模型服务）")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000], help='每次运行的行数，可指定多个')
+    parser.add_argument('--provider', choices=['ollama', 'openai'], default='ollama', help='模拟的协议')
+    parser.add_argument('--model', default='mock', help='请求中的模型名')
+    parser.add_argument('--base-url', help='使用已启动的模型服务，不启动内置模拟服务')
+    parser.add_argument('--latency', default='fixed:5', help='模拟服务延迟分布，见mock_llm_server.parse_latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务错误率（0~1）')
+    parser.add_argument('--error-status', type=int, default=503, help='模拟服务错误状态码')
+    parser.add_argument('--answers', help='模拟服务固定应答JSON文件')
+    parser.add_argument('--unique-ratio', type=float, default=1.0, help='不重复语句占比（0~1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--timeout', type=int, default=30, help='AI请求超时（秒）')
+    parser.add_argument('--cache', action='store_true', help='启用AI结果缓存（默认关闭）')
+    parser.add_argument('--rule-fast-path', action='store_true', help='启用规则快速解析（默认关闭，所有行都调用模型）')
+    parser.add_argument('--stream', action='store_true', help='使用流式输出（默认关闭）')
+    parser.add_argument('--tracemalloc', action='store_true', help='用tracemalloc统计Python内存峰值（会降低吞吐）')
+    parser.add_argument('--work-dir', help='临时目录（默认自动创建并在结束后删除）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    parser.add_argument('--verbose', action='store_true', help='输出流程日志')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        llm = MockLLM(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                      answers=load_answers(args.answers), seed=args.seed)
+        server = MockLLMServer(llm=llm)
+        server.start_in_thread()
+        base_url = server.base_url
+
+    # 配置必须在创建数据库和AI处理器之前修改
+    from config_manager import get_config
+    config = get_config()
+    configure(config, args, base_url, work_dir)
+    from database.connection import get_db_manager
+    get_db_manager(str(work_dir / 'bench.db'))
+
+    results = []
+    try:
+        for rows in args.rows:
+            results.append(run_once(rows, args, work_dir))
+    finally:
+        server_stats = server.llm.stats() if server else None
+        if server:
+            server.shutdown()
+            server.server_close()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"results": results, "server": server_stats}, ensure_ascii=False, indent=2))
+    else:
+        print_report(results, server_stats)
+
+
+if __name__ == '__main__':
+    main()
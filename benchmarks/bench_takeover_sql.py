@@ -0,0 +1,290 @@
+"""
+接管统计SQL扩展性基准
+生成指定行数的合成处理记录和开始/结束状态，在临时数据库上分别执行改写前的接管统计查询
+（相关子查询配对 + 对每条接管记录EXISTS扫描全部活动时段 + LIKE '%接管%'）和当前的
+takeover_statistics.sql（窗口函数配对、合并区间、按时间排序归属 + is_takeover部分索引），报告耗时并校验结果一致
+
+旧查询随数据量近似平方增长，超过--legacy-max-rows的规模只执行新查询
+
+用法:
+    python benchmarks/bench_takeover_sql.py --rows 10000 100000 1000000
+    python benchmarks/bench_takeover_sql.py --rows 50000 --records-per-session 50 --legacy-max-rows 50000 --json
+"""
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from database.models import DatabaseSchema
+
+TASK_ID = 'bench_task'
+
+_FUNCTIONS = ["跟车", "变道", "超车", "汇入匝道", "驶出匝道", "隧道通行", "施工路段", "路口左转", "靠边停车"]
+_TAKEOVER_FUNCTIONS = ["危险接管", "主动接管", "系统请求接管"]
+
+# 改写前的takeover_statistics.sql
+LEGACY_TAKEOVER_SQL = """
+WITH activity_periods AS (
+    SELECT
+        start_session.timestamp as start_time,
+        end_session.timestamp as end_time,
+        ROUND(
+            (julianday(end_session.timestamp) - julianday(start_session.timestamp)) * 24 * 60, 2
+        ) as duration_minutes
+    FROM activity_sessions start_session
+    JOIN activity_sessions end_session ON
+        start_session.task_id = :task_id
+        AND end_session.task_id = :task_id
+        AND start_session.status = 'start'
+        AND end_session.status = 'end'
+        AND end_session.timestamp > start_session.timestamp
+        AND end_session.id = (
+            SELECT MIN(id)
+            FROM activity_sessions
+            WHERE task_id = :task_id
+            AND status = 'end'
+            AND timestamp > start_session.timestamp
+        )
+),
+total_active_time AS (
+    SELECT COALESCE(SUM(duration_minutes), 0) as total_minutes
+    FROM activity_periods
+),
+takeover_by_type AS (
+    SELECT
+        pr.function_type as 接管类型,
+        COUNT(*) as 接管次数,
+        tat.total_minutes as 总活动时间
+    FROM processed_records pr
+    CROSS JOIN total_active_time tat
+    WHERE pr.task_id = :task_id
+    AND pr.function_type LIKE '%接管%'
+    AND EXISTS (
+        SELECT 1 FROM activity_periods ap
+        WHERE pr.timestamp BETWEEN ap.start_time AND ap.end_time
+    )
+    GROUP BY pr.function_type, tat.total_minutes
+),
+takeover_stats AS (
+    SELECT
+        接管类型,
+        接管次数,
+        CASE
+            WHEN 接管次数 > 0 AND 总活动时间 > 0
+            THEN ROUND(总活动时间 / 接管次数, 2)
+            ELSE 0
+        END as 平均间隔时间_分钟,
+        ROUND(总活动时间, 2) as 总时长_分钟
+    FROM takeover_by_type
+),
+total_stats AS (
+    SELECT
+        '总计' as 接管类型,
+        SUM(接管次数) as 接管次数,
+        CASE
+            WHEN SUM(接管次数) > 0 AND MAX(总时长_分钟) > 0
+            THEN ROUND(MAX(总时长_分钟) / SUM(接管次数), 2)
+            ELSE 0
+        END as 平均间隔时间_分钟,
+        MAX(总时长_分钟) as 总时长_分钟
+    FROM takeover_stats
+),
+final_result AS (
+    SELECT 接管类型, 接管次数, 平均间隔时间_分钟, 总时长_分钟
+    FROM takeover_stats
+
+    UNION ALL
+
+    SELECT 接管类型, 接管次数, 平均间隔时间_分钟, 总时长_分钟
+    FROM total_stats
+    WHERE EXISTS (SELECT 1 FROM takeover_stats)
+)
+
+SELECT 接管类型, 接管次数, 平均间隔时间_分钟, 总时长_分钟
+FROM final_result
+ORDER BY
+    CASE
+        WHEN 接管类型 = '总计' THEN 2
+        ELSE 1
+    END,
+    接管类型;
+"""
+
+
+def create_database(db_path: Path) -> sqlite3.Connection:
+    """按项目的表结构、索引和统计汇总触发器创建数据库（与DatabaseManager.init_database一致）"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(DatabaseSchema.PROCESSED_RECORDS_TABLE)
+    conn.execute(DatabaseSchema.ACTIVITY_SESSIONS_TABLE)
+    conn.execute(DatabaseSchema.RECORD_AGGREGATES_TABLE)
+    for index_sql in DatabaseSchema.INDEXES:
+        conn.execute(index_sql)
+    for trigger_sql in DatabaseSchema.TRIGGERS:
+        conn.execute(trigger_sql)
+    conn.commit()
+    return conn
+
+
+def populate(conn: sqlite3.Connection, rows: int, records_per_session: int, takeover_ratio: float,
+             seed: int) -> Dict[str, int]:
+    """
+    写入合成数据：每5秒一条处理记录，约每records_per_session条记录一段活动时段
+
+    活动状态中混入少量缺少结束的开始、重复的开始和多余的结束，覆盖配对的边界情况
+
+    Returns:
+        写入的记录数、状态数和接管记录数
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, 0, 0)
+
+    def timestamp(seconds: int) -> str:
+        return (start + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+    takeovers = 0
+
+    def records():
+        nonlocal takeovers
+        for i in range(rows):
+            if rng.random() < takeover_ratio:
+                function_type = rng.choice(_TAKEOVER_FUNCTIONS)
+                takeovers += 1
+            else:
+                function_type = rng.choice(_FUNCTIONS)
+            yield (TASK_ID, timestamp(5 * i), '', '', function_type, 'avg', 6, 6, 6, 6, 6, 6, 6, '否')
+
+    conn.executemany(
+        "INSERT INTO processed_records (task_id, timestamp, original_text, comment, function_type, rating, "
+        "mental_load, predictability, timely_response, comfort, efficiency, features, safety, is_clipped) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        records()
+    )
+
+    sessions = []
+    span = 5 * records_per_session
+    for segment_start in range(0, 5 * rows, span):
+        begin = segment_start + rng.randint(0, span // 4)
+        finish = segment_start + rng.randint(span // 2, span - 1)
+        roll = rng.random()
+        sessions.append((TASK_ID, timestamp(begin), 'start'))
+        if roll < 0.05:
+            continue  # 缺少结束
+        if roll < 0.10:
+            sessions.append((TASK_ID, timestamp(begin + 5), 'start'))  # 重复的开始
+        sessions.append((TASK_ID, timestamp(finish), 'end'))
+        if roll > 0.95:
+            sessions.append((TASK_ID, timestamp(finish + 5), 'end'))  # 多余的结束
+    conn.executemany(
+        "INSERT INTO activity_sessions (task_id, timestamp, status, original_text) VALUES (?, ?, ?, '')",
+        sessions
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    return {"records": rows, "sessions": len(sessions), "takeovers": takeovers}
+
+
+def time_query(conn: sqlite3.Connection, sql: str, repeat: int) -> Dict[str, Any]:
+    """执行查询repeat次，返回最短耗时和结果"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = conn.execute(sql, {"task_id": TASK_ID}).fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": round(best, 4), "rows": result}
+
+
+def run_once(rows: int, args, work_dir: Path, new_sql: str) -> Dict[str, Any]:
+    """生成一个规模的数据并执行新旧查询"""
+    db_path = work_dir / f"takeover_{rows}.db"
+    if db_path.exists():
+        db_path.unlink()
+    conn = create_database(db_path)
+    try:
+        started = time.perf_counter()
+        counts = populate(conn, rows, args.records_per_session, args.takeover_ratio, args.seed)
+        stats: Dict[str, Any] = dict(counts, populate_seconds=round(time.perf_counter() - started, 2))
+
+        new = time_query(conn, new_sql, args.repeat)
+        stats["new_seconds"] = new["seconds"]
+        stats["result_rows"] = [list(row) for row in new["rows"]]
+
+        if rows <= args.legacy_max_rows:
+            legacy = time_query(conn, LEGACY_TAKEOVER_SQL, args.repeat)
+            stats["legacy_seconds"] = legacy["seconds"]
+            stats["speedup"] = round(legacy["seconds"] / new["seconds"], 1) if new["seconds"] else None
+            stats["equal"] = legacy["rows"] == new["rows"]
+        else:
+            stats["legacy_seconds"] = None
+            stats["speedup"] = None
+            stats["equal"] = None
+        return stats
+    finally:
+        conn.close()
+        db_path.unlink(missing_ok=True)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    """打印文本报告"""
+    header = ["records", "sessions", "takeovers", "legacy s", "new s", "speedup", "equal"]
+    print()
+    print("\t".join(header))
+    for stats in results:
+        row = [stats["records"], stats["sessions"], stats["takeovers"],
+               stats["legacy_seconds"] if stats["legacy_seconds"] is not None else "skipped",
+               stats["new_seconds"],
+               f"{stats['speedup']}x" if stats["speedup"] is not None else "-",
+               {True: "Y", False: "N", None: "-"}[stats["equal"]]]
+        print("\t".join(str(value) for value in row))
+    if any(stats["equal"] is False for stats in results):
+        print("\n新旧查询结果不一致")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="接管统计SQL扩展性基准（改写前后的查询对比）")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='处理记录行数，可指定多个')
+    parser.add_argument('--records-per-session', type=int, default=200, help='平均每段活动时段对应的记录数')
+    parser.add_argument('--takeover-ratio', type=float, default=0.1, help='接管记录占比（0~1）')
+    parser.add_argument('--legacy-max-rows', type=int, default=100000, help='超过该行数时不执行旧查询')
+    parser.add_argument('--repeat', type=int, default=3, help='每个查询执行次数（取最短耗时）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--work-dir', help='临时目录（默认自动创建并在结束后删除）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    new_sql = (project_root / 'business_logic' / 'driving_evaluation' / 'takeover_statistics.sql').read_text(
+        encoding='utf-8')
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='bench_takeover_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        results = [run_once(rows, args, work_dir, new_sql) for rows in args.rows]
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"sqlite_version": sqlite3.sqlite_version, "results": results},
+                         ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
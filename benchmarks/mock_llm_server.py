@@ -0,0 +1,336 @@
+"""
+本地模拟大模型服务
+同时实现Ollama `/api/chat` 和OpenAI兼容 `/v1/chat/completions`（以及DeepSeek/OpenAI SDK使用的 `/chat/completions`）协议，
+用于在没有真实模型服务的环境（如CI）中对AI处理流程做压测：可配置响应延迟分布、错误率和固定的JSON应答
+
+用法:
+    python benchmarks/mock_llm_server.py --port 11434 --latency lognormal:3.5,0.4 --error-rate 0.01
+"""
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 从用户提示词中提取原始语句（格式与CarTestDataProcessor.process_text一致）
+_INPUT_PATTERN = re.compile(r'"input":\s*"(.*)"', re.S)
+# 语句中的"总分X分"
+_SCORE_PATTERN = re.compile(r'总分\s*(\d+)\s*分')
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    解析延迟分布，返回生成单次延迟（毫秒）的函数
+
+    支持的格式:
+        fixed:50            固定50ms
+        uniform:20,80       20~80ms均匀分布
+        normal:50,10        均值50ms、标准差10ms的正态分布（截断到0）
+        lognormal:3.9,0.5   ln(ms)服从均值3.9、标准差0.5的正态分布，模拟长尾
+
+    Args:
+        spec: 延迟分布描述，空字符串或"0"表示无延迟
+
+    Returns:
+        生成延迟毫秒数的函数
+    """
+    if not spec or spec == "0":
+        return lambda: 0.0
+
+    kind, _, args = spec.partition(':')
+    try:
+        values = [float(v) for v in args.split(',')] if args else []
+        if kind == 'fixed' and len(values) == 1:
+            return lambda: values[0]
+        if kind == 'uniform' and len(values) == 2:
+            return lambda: random.uniform(values[0], values[1])
+        if kind == 'normal' and len(values) == 2:
+            return lambda: max(0.0, random.gauss(values[0], values[1]))
+        if kind == 'lognormal' and len(values) == 2:
+            return lambda: random.lognormvariate(values[0], values[1])
+    except ValueError:
+        pass
+    raise ValueError(f"无法解析的延迟分布: {spec}")
+
+
+def default_answer(text: str) -> Dict[str, Any]:
+    """
+    根据原始语句生成应答：comment为原句，function取第一个分句，score取"总分X分"（默认7分）
+
+    Args:
+        text: 原始语句
+
+    Returns:
+        模型应答JSON对象
+    """
+    function = re.split(r'[，。,.\s]', text.strip(), maxsplit=1)[0] or text.strip()
+    match = _SCORE_PATTERN.search(text)
+    return {
+        "comment": text.strip(),
+        "function": function,
+        "score": int(match.group(1)) if match else 7,
+    }
+
+
+class MockLLM:
+    """模拟模型：决定每次请求的延迟、是否出错和应答内容"""
+
+    def __init__(self,
+                 latency: str = "0",
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 answers: Optional[Dict[str, Any]] = None,
+                 chunk_chars: int = 8,
+                 seed: Optional[int] = None):
+        """
+        初始化模拟模型
+
+        Args:
+            latency: 延迟分布描述，见parse_latency
+            error_rate: 返回错误响应的概率（0~1）
+            error_status: 错误响应的HTTP状态码
+            answers: 固定应答（原始语句 -> JSON对象），未命中的语句使用default_answer
+            chunk_chars: 流式响应每个分片的字符数
+            seed: 随机种子，便于复现
+        """
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.answers = answers or {}
+        self.chunk_chars = max(1, chunk_chars)
+        if seed is not None:
+            random.seed(seed)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def next_delay(self) -> float:
+        """本次请求的延迟（秒）"""
+        return self.latency() / 1000.0
+
+    def should_fail(self) -> bool:
+        """本次请求是否返回错误"""
+        failed = self.error_rate > 0 and random.random() < self.error_rate
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+        return failed
+
+    def answer(self, messages: List[Dict[str, Any]]) -> str:
+        """根据最后一条用户消息生成应答文本"""
+        prompt = ""
+        for message in reversed(messages or []):
+            if message.get('role') == 'user':
+                prompt = message.get('content') or ""
+                break
+
+        match = _INPUT_PATTERN.search(prompt)
+        text = match.group(1) if match else prompt
+        answer = self.answers.get(text)
+        if answer is None:
+            answer = default_answer(text)
+        return answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+
+    def chunks(self, content: str) -> List[str]:
+        """将应答切分为流式分片"""
+        return [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)] or [""]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors}
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+
+    server_version = "MockLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def llm(self) -> MockLLM:
+        return self.server.llm
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        if self.path in ('/api/tags', '/api/version'):
+            self._send_json(200, {"models": [{"name": "mock", "model": "mock"}], "version": "mock"})
+        elif self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path == '/stats':
+            self._send_json(200, self.llm.stats())
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+
+        time.sleep(self.llm.next_delay())
+        if self.llm.should_fail():
+            self._send_json(self.llm.error_status, {"error": "mock server error"})
+            return
+
+        if self.path == '/api/chat':
+            self._handle_ollama(payload)
+        elif self.path.endswith('/chat/completions'):
+            self._handle_openai(payload)
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def _handle_ollama(self, payload: Dict[str, Any]) -> None:
+        """Ollama /api/chat：非流式返回单个JSON，流式返回NDJSON"""
+        model = payload.get('model', 'mock')
+        content = self.llm.answer(payload.get('messages'))
+        stats = {
+            "total_duration": 0,
+            "load_duration": 0,
+            "prompt_eval_count": sum(len(m.get('content') or "") for m in payload.get('messages') or []),
+            "prompt_eval_duration": 0,
+            "eval_count": len(content),
+            "eval_duration": 0,
+        }
+
+        if not payload.get('stream', True):
+            self._send_json(200, {"model": model, "message": {"role": "assistant", "content": content},
+                                  "done": True, "done_reason": "stop", **stats})
+            return
+
+        lines = [{"model": model, "message": {"role": "assistant", "content": chunk}, "done": False}
+                 for chunk in self.llm.chunks(content)]
+        lines.append({"model": model, "message": {"role": "assistant", "content": ""},
+                      "done": True, "done_reason": "stop", **stats})
+        self._send_stream("application/x-ndjson",
+                          [json.dumps(line, ensure_ascii=False) + "\n" for line in lines])
+
+    def _handle_openai(self, payload: Dict[str, Any]) -> None:
+        """OpenAI /chat/completions：非流式返回单个JSON，流式返回SSE"""
+        model = payload.get('model', 'mock')
+        content = self.llm.answer(payload.get('messages'))
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": sum(len(m.get('content') or "") for m in payload.get('messages') or []),
+            "completion_tokens": len(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not payload.get('stream', False):
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        events = []
+        for chunk in self.llm.chunks(content):
+            events.append({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                           "model": model,
+                           "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]})
+        events.append({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                       "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                       "usage": usage})
+        body = [f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events]
+        body.append("data: [DONE]\n\n")
+        self._send_stream("text/event-stream", body)
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content_type: str, parts: List[str]) -> None:
+        """分块传输编码逐片发送；客户端提前关闭连接时静默结束"""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for part in parts:
+                data = part.encode('utf-8')
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """模拟模型HTTP服务（每个连接一个线程）"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, llm: Optional[MockLLM] = None):
+        super().__init__((host, port), MockLLMHandler)
+        self.llm = llm or MockLLM()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_in_thread(self) -> threading.Thread:
+        """在后台线程中运行服务"""
+        thread = threading.Thread(target=self.serve_forever, name="mock-llm-server", daemon=True)
+        thread.start()
+        return thread
+
+
+def load_answers(path: Optional[str]) -> Dict[str, Any]:
+    """读取固定应答文件（JSON对象：原始语句 -> 应答JSON对象或字符串）"""
+    if not path:
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务（Ollama / OpenAI协议）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', default='0',
+                        help='延迟分布: fixed:MS | uniform:MIN,MAX | normal:MU,SIGMA | lognormal:MU,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回错误响应的概率（0~1）')
+    parser.add_argument('--error-status', type=int, default=503, help='错误响应的HTTP状态码')
+    parser.add_argument('--answers', help='固定应答JSON文件（原始语句 -> 应答）')
+    parser.add_argument('--chunk-chars', type=int, default=8, help='流式响应每个分片的字符数')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    llm = MockLLM(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                  answers=load_answers(args.answers), chunk_chars=args.chunk_chars, seed=args.seed)
+    server = MockLLMServer(args.host, args.port, llm)
+    print(f"模拟模型服务已启动: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"请求统计: {llm.stats()}")
+
+
+if __name__ == '__main__':
+    main()
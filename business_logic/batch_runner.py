@@ -0,0 +1,248 @@
+"""
+批量任务处理
+发现download目录下的多个任务目录，分发到进程池并行执行完整任务流程（每个工作进程各自创建任务处理器），
+所有工作进程通过跨进程信号量共享模型请求并发上限，结束后汇总各任务结果
+
+用法:
+    python -m business_logic.batch_runner --since 2025_01_01 --until 2025_01_08 --workers 4
+    python -m business_logic.batch_runner 2025_01_01_09_00_00 2025_01_02_09_00_00 --json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config_manager import get_config
+from business_logic.job_manager import TaskProgress, TaskCancelledError
+
+logger = logging.getLogger(__name__)
+
+# 默认参数
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+
+
+def resolve_download_dir(config=None) -> Path:
+    """storage.download_dir，相对路径按项目根目录解析"""
+    config = config or get_config()
+    download_dir = Path(config.storage.download_dir)
+    if not download_dir.is_absolute():
+        download_dir = project_root / download_dir
+    return download_dir
+
+
+def discover_task_dirs(download_dir: Optional[Path] = None, since: Optional[str] = None,
+                       until: Optional[str] = None) -> List[str]:
+    """
+    发现包含asr_results_*.xlsx的任务目录
+
+    Args:
+        download_dir: 下载目录，默认为storage.download_dir
+        since: 只包含目录名不小于该值的任务（目录名为时间戳格式，可按字符串比较，如2025_01_01）
+        until: 只包含目录名不大于该值的任务（前缀匹配，2025_01_07包含当天所有任务）
+
+    Returns:
+        按目录名排序的任务目录名列表
+    """
+    download_dir = Path(download_dir) if download_dir else resolve_download_dir()
+    if not download_dir.exists():
+        logger.warning(f"下载目录不存在: {download_dir}")
+        return []
+
+    task_dirs = []
+    for entry in sorted(os.scandir(download_dir), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        name = entry.name
+        if since and name < since:
+            continue
+        if until and name > until and not name.startswith(until):
+            continue
+        if glob.glob(os.path.join(entry.path, "asr_results_*.xlsx")):
+            task_dirs.append(name)
+    return task_dirs
+
+
+def _init_worker(request_limiter, db_path: Optional[str], config_overrides: Optional[Dict[str, Any]]) -> None:
+    """工作进程初始化：应用配置覆盖、指向同一个数据库、安装共享的模型请求并发限制"""
+    config = get_config()
+    for key, value in (config_overrides or {}).items():
+        config.set(key, value)
+
+    from database.connection import get_db_manager
+    get_db_manager(db_path)
+
+    from ai_service.ai_api import set_request_limiter
+    set_request_limiter(request_limiter)
+
+
+def _process_task_dir(task_dir: str) -> Dict[str, Any]:
+    """在工作进程中执行一个任务目录的完整流程，返回可序列化的结果摘要"""
+    from business_logic.business_logic import BusinessLogicRouter
+
+    started = time.perf_counter()
+    try:
+        result = BusinessLogicRouter().route_to_processor().execute_task_flow(task_dir)
+    except Exception as e:
+        logger.error(f"任务{task_dir}执行失败: {e}")
+        result = {'success': False, 'error': str(e)}
+
+    return {
+        'task_dir': task_dir,
+        'success': bool(result.get('success')),
+        'error': result.get('error'),
+        'records_processed': result.get('records_processed', 0),
+        'records_stored': result.get('records_stored', 0),
+        'export_file': result.get('export_file'),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'step_timings': result.get('step_timings', {}),
+        'ai_metrics': result.get('ai_metrics', []),
+        'pid': os.getpid(),
+    }
+
+
+def summarize_batch(task_results: List[Dict[str, Any]], elapsed_seconds: float) -> Dict[str, Any]:
+    """
+    汇总各任务结果
+
+    Returns:
+        包含success、error、任务数、记录数、按提供商/模型合计的调用次数和各任务结果的字典
+    """
+    ai_calls: Dict[str, Dict[str, int]] = {}
+    for task in task_results:
+        for group in task.get('ai_metrics', []):
+            calls = ai_calls.setdefault(f"{group['provider']}/{group['model']}", {})
+            for status, count in group.get('calls', {}).items():
+                calls[status] = calls.get(status, 0) + count
+
+    failed = [task['task_dir'] for task in task_results if not task['success']]
+    slowest = max((task['elapsed_seconds'] for task in task_results), default=0.0)
+    return {
+        'success': not failed,
+        'error': f"{len(failed)}个任务失败: {', '.join(failed)}" if failed else None,
+        'tasks_total': len(task_results),
+        'tasks_succeeded': len(task_results) - len(failed),
+        'tasks_failed': len(failed),
+        'records_processed': sum(task['records_processed'] or 0 for task in task_results),
+        'records_stored': sum(task['records_stored'] or 0 for task in task_results),
+        'elapsed_seconds': round(elapsed_seconds, 3),
+        'slowest_task_seconds': slowest,
+        'ai_calls': ai_calls,
+        'tasks': sorted(task_results, key=lambda task: task['task_dir']),
+    }
+
+
+def run_batch(task_dirs: List[str], max_workers: Optional[int] = None,
+              max_concurrent_requests: Optional[int] = None,
+              progress: Optional[TaskProgress] = None,
+              config_overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    用进程池并行处理多个任务目录
+
+    取消时不再启动排队中的任务，已在执行的任务会执行完毕
+
+    Args:
+        task_dirs: 任务目录名列表
+        max_workers: 工作进程数，默认为task.batch.max_workers
+        max_concurrent_requests: 所有进程合计的模型请求并发上限，默认为task.batch.max_concurrent_requests，0表示不限制
+        progress: 进度报告器（rows按已完成的任务数报告）
+        config_overrides: 工作进程中额外设置的配置项（如基准测试指向模拟服务）
+
+    Returns:
+        汇总结果，见summarize_batch
+    """
+    batch_config = get_config().task.get('batch') or {}
+    if max_workers is None:
+        max_workers = batch_config.get('max_workers', DEFAULT_MAX_WORKERS)
+    if max_concurrent_requests is None:
+        max_concurrent_requests = batch_config.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS)
+    progress = progress or TaskProgress()
+    max_workers = max(1, min(int(max_workers), len(task_dirs) or 1))
+
+    from database.connection import get_db_manager
+    db_path = get_db_manager().db_path
+
+    logger.info(f"批量处理{len(task_dirs)}个任务目录，{max_workers}个工作进程，"
+                f"模型请求并发上限{max_concurrent_requests or '不限'}")
+    progress.start_step('batch_processing')
+    started = time.perf_counter()
+    task_results = []
+
+    # 使用spawn启动工作进程，避免在多线程的服务进程中fork
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        request_limiter = manager.Semaphore(max_concurrent_requests) if max_concurrent_requests else None
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(request_limiter, db_path, config_overrides))
+        try:
+            futures = {executor.submit(_process_task_dir, task_dir): task_dir for task_dir in task_dirs}
+            progress.update_rows(0, len(task_dirs))
+            for future in as_completed(futures):
+                try:
+                    task_result = future.result()
+                except Exception as e:
+                    task_result = {'task_dir': futures[future], 'success': False, 'error': str(e),
+                                   'records_processed': 0, 'records_stored': 0, 'elapsed_seconds': 0.0}
+                task_results.append(task_result)
+                logger.info(f"批量处理进度 {len(task_results)}/{len(task_dirs)}: {task_result['task_dir']} "
+                            f"{'成功' if task_result['success'] else '失败'}")
+                progress.update_rows(len(task_results), len(task_dirs))
+        except TaskCancelledError:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    progress.finish_step('batch_processing')
+    summary = summarize_batch(task_results, time.perf_counter() - started)
+    logger.info(f"批量处理完成: {summary['tasks_succeeded']}/{summary['tasks_total']}个任务成功，"
+                f"耗时{summary['elapsed_seconds']}秒（最慢任务{summary['slowest_task_seconds']}秒）")
+    return summary
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="并行处理多个ASR任务目录")
+    parser.add_argument('task_dirs', nargs='*', help='任务目录名，不指定时按--since/--until自动发现')
+    parser.add_argument('--since', help='只处理目录名不小于该值的任务，如2025_01_01')
+    parser.add_argument('--until', help='只处理目录名不大于该值的任务（前缀匹配），如2025_01_07')
+    parser.add_argument('--workers', type=int, help='工作进程数（默认task.batch.max_workers）')
+    parser.add_argument('--max-concurrent-requests', type=int,
+                        help='所有进程合计的模型请求并发上限（默认task.batch.max_concurrent_requests，0不限制）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出汇总结果')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    task_dirs = args.task_dirs or discover_task_dirs(since=args.since, until=args.until)
+    if not task_dirs:
+        print("没有找到需要处理的任务目录")
+        return
+
+    summary = run_batch(task_dirs, args.workers, args.max_concurrent_requests)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+        return
+
+    for task in summary['tasks']:
+        status = "成功" if task['success'] else f"失败: {task['error']}"
+        print(f"{task['task_dir']}\t{task['records_stored']}条\t{task['elapsed_seconds']}秒\t{status}")
+    print(f"\n共{summary['tasks_total']}个任务，成功{summary['tasks_succeeded']}个，"
+          f"总耗时{summary['elapsed_seconds']}秒（最慢任务{summary['slowest_task_seconds']}秒）")
+
+
+if __name__ == '__main__':
+    main()
@@ -52,6 +52,27 @@ class BusinessLogicRouter:
         else:
             raise ValueError(f"不支持的任务类型: {self.task_name}")
     
+    def create_realtime_session(self, task_dir: str):
+        """
+        为任务启动实时处理会话
+        
+        Args:
+            task_dir: 任务目录名
+            
+        Returns:
+            实时处理会话；任务未启用实时处理（task.realtime.enabled）或不支持时返回None
+        """
+        realtime_config = self.task_config.get('realtime') or {}
+        if not realtime_config.get('enabled', False):
+            return None
+        
+        if self.task_name == "driving_evaluation":
+            from .driving_evaluation.realtime_pipeline import start_realtime_session
+            return start_realtime_session(task_dir, self.config, self.task_config)
+        
+        logger.warning(f"任务类型{self.task_name}不支持实时处理")
+        return None
+    
     def get_task_name(self) -> str:
         """获取当前任务名称"""
         return self.task_name
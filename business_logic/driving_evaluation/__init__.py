@@ -6,11 +6,19 @@ driving_evaluation 任务模块
 from .processor import DrivingEvaluationProcessor
 from .excel_ai_processor import ExcelAIProcessor, process_excel_file
 from .score_dimension_expander import ScoreDimensionExpander, create_expander_from_config
+from .utterance_dedup import UtteranceDeduplicator, create_deduplicator_from_config
+from .realtime_pipeline import RealtimeSession, start_realtime_session, get_realtime_session, pop_realtime_session
 
 __all__ = [
     'DrivingEvaluationProcessor',
     'ExcelAIProcessor', 
     'process_excel_file',
     'ScoreDimensionExpander',
-    'create_expander_from_config'
+    'create_expander_from_config',
+    'UtteranceDeduplicator',
+    'create_deduplicator_from_config',
+    'RealtimeSession',
+    'start_realtime_session',
+    'get_realtime_session',
+    'pop_realtime_session'
 ]
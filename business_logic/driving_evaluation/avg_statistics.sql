@@ -1,17 +1,20 @@
--- 按function_type统计各项评分的平均值
+-- 按function_type统计各项评分的平均值（参数 :task_id）
+-- 读取触发器增量维护的record_aggregates汇总表：平均分 = 合计 / 非空数，与AVG一致
 
 SELECT 
     function_type as 功能类型,
-    ROUND(AVG(mental_load), 2) as 压力性, 
-    ROUND(AVG(predictability), 2) as 可预测性, 
-    ROUND(AVG(timely_response), 2) as 响应性, 
-    ROUND(AVG(comfort), 2) as 舒适性, 
-    ROUND(AVG(efficiency), 2) as 效率性, 
-    ROUND(AVG(features), 2) as 功能性,
-    ROUND(AVG(safety), 2) as 安全性,
-    ROUND(AVG((mental_load + predictability + timely_response + comfort + efficiency + features + safety) / 7.0), 2) as 总体平均分,
-    COUNT(*) as 记录数量
-FROM processed_records 
-WHERE function_type IS NOT NULL 
+    ROUND(SUM(mental_load_sum) / SUM(mental_load_count), 2) as 压力性, 
+    ROUND(SUM(predictability_sum) / SUM(predictability_count), 2) as 可预测性, 
+    ROUND(SUM(timely_response_sum) / SUM(timely_response_count), 2) as 响应性, 
+    ROUND(SUM(comfort_sum) / SUM(comfort_count), 2) as 舒适性, 
+    ROUND(SUM(efficiency_sum) / SUM(efficiency_count), 2) as 效率性, 
+    ROUND(SUM(features_sum) / SUM(features_count), 2) as 功能性,
+    ROUND(SUM(safety_sum) / SUM(safety_count), 2) as 安全性,
+    ROUND(SUM(overall_sum) / SUM(overall_count), 2) as 总体平均分,
+    SUM(record_count) as 记录数量
+FROM record_aggregates 
+WHERE task_id = :task_id
+    AND function_type IS NOT NULL 
     AND function_type != ''
-GROUP BY function_type
\ No newline at end of file
+GROUP BY function_type
+ORDER BY function_type
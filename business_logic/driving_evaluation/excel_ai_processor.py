@@ -1,7 +1,7 @@
 """Excel数据处理与AI处理解耦模块 - 简化版"""
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Optional, Any, Union
+from typing import Iterator, List, Dict, Optional, Any, Union
 import os
 import logging
 import sys
@@ -15,11 +15,21 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 # 导入AI处理模块
-from ai_service.ai_api import ai_process_test_text
+from ai_service.ai_api import CarTestDataProcessor
+from ai_service.ai_cache import get_cache_stats
 
 # 导入配置管理器
 from config_manager import get_config
 
+# 导入任务进度报告
+from business_logic.job_manager import TaskProgress, TaskCancelledError
+
+# 导入语句去重
+from business_logic.driving_evaluation.utterance_dedup import create_deduplicator_from_config
+
+# 导入任务断点
+from database.checkpoint_store import TaskCheckpoint, create_checkpoint_from_config
+
 # 获取日志实例
 logger = logging.getLogger(__name__)
 
@@ -30,8 +40,19 @@ class ExcelAIProcessor:
     def __init__(self):
         """初始化处理器"""
         self.config = get_config()
+        # AI处理器在首次使用时创建，并在整个任务中复用（避免每行重新加载提示词和客户端）
+        self._ai_processor = None
+        # 重复语句去重（task.dedup.enabled为false时不去重）
+        self.deduplicator = create_deduplicator_from_config(self.config.task)
         logger.info("ExcelAIProcessor初始化成功")
     
+    @property
+    def ai_processor(self) -> CarTestDataProcessor:
+        """获取（懒加载）AI处理器"""
+        if self._ai_processor is None:
+            self._ai_processor = CarTestDataProcessor()
+        return self._ai_processor
+    
     def get_latest_excel_file(self) -> Optional[str]:
         """
         获取download目录下最新的子目录，并从中获取"asr_results_*.xlsx"的文件。
@@ -99,41 +120,73 @@ class ExcelAIProcessor:
         task_file = excel_files[0]
         return task_file
 
-    def process_excel_file(self, task_path: Optional[Union[str, Path]] = None) -> List[Dict[str, Any]]:
+    def process_excel_file(self, task_path: Optional[Union[str, Path]] = None,
+                           precomputed_results: Optional[Dict[str, str]] = None,
+                           progress: Optional[TaskProgress] = None) -> List[Dict[str, Any]]:
         """
         处理Excel文件的主入口方法
         
         Args:
             task_path: 任务目录路径
+            precomputed_results: 测试过程中实时处理得到的结果（原始文本 -> AI结果），命中的行不再调用模型
+            progress: 进度报告器，每处理一行更新一次进度并检查取消
             
         Returns:
             处理后的数据列表，每个元素包含原始数据和AI处理结果
         """
+        processed_data = list(self.iter_excel_file(task_path, precomputed_results, progress))
+        logger.info(f"Excel文件处理完成，共处理{len(processed_data)}条数据")
+        return processed_data
+    
+    def iter_excel_file(self, task_path: Optional[Union[str, Path]] = None,
+                        precomputed_results: Optional[Dict[str, str]] = None,
+                        progress: Optional[TaskProgress] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式处理Excel文件：逐行读取、逐行AI处理，每得到一条结果立即产出
+        
+        内存占用与行数无关（只保留去重用的不重复语句结果），下游可以边接收边入库；
+        启用task.checkpoint时每行结果写入断点表，重新执行同一任务时已成功的行不再调用模型
+        
+        Args:
+            task_path: 任务目录路径
+            precomputed_results: 测试过程中实时处理得到的结果（原始文本 -> AI结果）
+            progress: 进度报告器
+            
+        Yields:
+            处理结果记录（与process_excel_file返回的元素相同）
+            
+        Raises:
+            TaskCancelledError: 任务被取消
+            Exception: 读取或处理中途出错（找不到Excel文件时只记录错误，不产出结果）
+        """
         try:
             task_path = self.get_task_file(task_path)
             if task_path is None:
                 logger.error("没有找到可处理的Excel文件")
-                return []
+                return
             
             # 解析文件路径
             full_path = self._resolve_file_path(task_path)
-            
-            # 读取Excel数据
-            raw_data = self._read_excel_data(full_path)
-            
-            if not raw_data:
-                logger.warning("没有从Excel文件中读取到有效数据")
-                return []
-            
-            # AI处理数据
-            processed_data = self._process_with_ai(raw_data)
-            
-            logger.info(f"Excel文件处理完成，共处理{len(processed_data)}条数据")
-            return processed_data
-            
+            total_rows = self._count_excel_rows(full_path)
+            # 断点按Excel所在的任务目录名记录
+            checkpoint = create_checkpoint_from_config(Path(full_path).parent.name, self.config.task)
         except Exception as e:
             logger.error(f"处理Excel文件时出错: {e}")
-            return []
+            return
+        
+        try:
+            yield from self._iter_process_with_ai(self._iter_excel_data(full_path), total_rows,
+                                                  precomputed_results, progress, checkpoint)
+        except TaskCancelledError:
+            raise
+        except Exception as e:
+            # 中途出错时继续抛出，避免只处理了部分行的任务被当作成功
+            logger.error(f"处理Excel文件时出错: {e}")
+            raise
+        finally:
+            # 出错、取消或下游提前结束时也写入已缓冲的断点
+            if checkpoint is not None:
+                checkpoint.flush()
     
     def _resolve_file_path(self, file_path: Union[str, Path]) -> str:
         """解析文件路径"""
@@ -165,118 +218,208 @@ class ExcelAIProcessor:
     
     def _read_excel_data(self, file_path: str) -> List[Dict[str, Any]]:
         """从Excel文件读取数据"""
+        processed_data = list(self._iter_excel_data(file_path))
+        logger.info(f"Excel数据读取完成: {len(processed_data)}条有效数据")
+        return processed_data
+    
+    @staticmethod
+    def _count_excel_rows(file_path: str) -> int:
+        """读取工作表尺寸得到的数据行数（不含表头，用于进度显示）"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(file_path, read_only=True)
         try:
-            logger.info(f"开始读取Excel文件: {file_path}")
-            
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
+            return max(0, (workbook.active.max_row or 1) - 1)
+        finally:
+            workbook.close()
+    
+    def _iter_excel_data(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """以只读模式逐行读取Excel数据，不把整个表格加载到内存"""
+        from openpyxl import load_workbook
+        
+        logger.info(f"开始读取Excel文件: {file_path}")
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
             
             # 验证必要的列
-            if 'time' not in df.columns or 'result' not in df.columns:
-                raise ValueError(f"Excel文件必须包含'time'和'result'列，当前列: {list(df.columns)}")
+            if 'time' not in header or 'result' not in header:
+                raise ValueError(f"Excel文件必须包含'time'和'result'列，当前列: {header}")
+            time_column = header.index('time')
+            result_column = header.index('result')
             
             # 处理数据
-            processed_data = []
-            for index, row in df.iterrows():
+            for index, row in enumerate(rows):
                 try:
                     # 处理时间
-                    time_value = row['time']
-                    if pd.isna(time_value):
+                    time_value = row[time_column] if time_column < len(row) else None
+                    if time_value is None or pd.isna(time_value) or not str(time_value).strip():
                         continue
                     
                     time_obj = pd.to_datetime(time_value)
                     
                     # 处理结果
-                    result_value = row['result']
-                    if pd.isna(result_value) or not str(result_value).strip():
+                    result_value = row[result_column] if result_column < len(row) else None
+                    if result_value is None or not str(result_value).strip():
                         continue
                     
-                    result_value = str(result_value).strip()
-                    
                     # 创建记录
-                    record = {
+                    yield {
                         'time': time_obj,
-                        'result': result_value,
+                        'result': str(result_value).strip(),
                         'row_index': index + 1
                     }
                     
-                    processed_data.append(record)
-                    
                 except Exception as e:
                     logger.warning(f"处理第{index + 1}行数据时出错: {e}")
                     continue
-            
-            logger.info(f"Excel数据读取完成: {len(processed_data)}条有效数据")
-            return processed_data
-            
-        except Exception as e:
-            logger.error(f"读取Excel文件时出错: {e}")
-            raise
+        finally:
+            workbook.close()
+    
+    def _process_with_ai(self, data: List[Dict[str, Any]],
+                         precomputed_results: Optional[Dict[str, str]] = None,
+                         progress: Optional[TaskProgress] = None) -> List[Dict[str, Any]]:
+        """使用AI处理数据（重复语句只处理一次，结果分发回各行）"""
+        return list(self._iter_process_with_ai(iter(data), len(data), precomputed_results, progress))
     
-    def _process_with_ai(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """使用AI处理数据"""
-        logger.info(f"开始AI处理，共{len(data)}条数据")
-        processed_data = []
+    def _iter_process_with_ai(self, records: Iterator[Dict[str, Any]], total_rows: int,
+                              precomputed_results: Optional[Dict[str, str]] = None,
+                              progress: Optional[TaskProgress] = None,
+                              checkpoint: Optional[TaskCheckpoint] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐行AI处理，每处理完一行立即产出结果
+        
+        重复语句（见task.dedup）只在首次出现时调用模型，之后的行直接复用该结果，各行保留自己的时间和原文
+        
+        Args:
+            records: 读取到的原始记录
+            total_rows: 总行数（用于进度显示）
+            precomputed_results: 实时处理得到的结果（原始文本 -> AI结果）
+            progress: 进度报告器
+            checkpoint: 任务断点，断点中已成功且原文未变的行直接复用结果，其余行的结果写回断点
+            
+        Yields:
+            处理结果记录
+        """
+        logger.info(f"开始AI处理，共{total_rows}条数据")
         success_count = 0
+        precomputed_results = precomputed_results or {}
+        reused_count = 0
+        resumed_count = 0
+        progress = progress or TaskProgress()
         
-        for i, record in enumerate(data):
-            try:
-                logger.info(f"AI处理进度: {i+1}/{len(data)}")
-                
-                # 调用AI处理
-                ai_result = ai_process_test_text(record['result'])
-                
-                # 判断处理是否成功
-                processing_success = bool(ai_result and ai_result.strip())
-                
-                if processing_success:
-                    success_count += 1
-                
-                # 创建处理结果
-                processed_record = {
-                    'time': record['time'],
-                    'original_result': record['result'],
-                    'ai_processed_result': ai_result,
-                    'ai_processing_status': 'success' if processing_success else 'failed',
-                    'row_index': record['row_index']
-                }
-                
-                processed_data.append(processed_record)
-                
-            except Exception as e:
-                logger.error(f"AI处理第{i+1}条数据时出错: {e}")
-                
-                # 处理失败也保留记录
-                error_record = {
-                    'time': record['time'],
-                    'original_result': record['result'],
-                    'ai_processed_result': None,
-                    'ai_processing_status': 'error',
-                    'row_index': record['row_index'],
-                    'error_message': str(e)
-                }
-                
-                processed_data.append(error_record)
+        # 去重：组号 -> (AI结果, 状态, 错误信息)
+        if self.deduplicator is not None:
+            self.deduplicator.reset()
+        outcomes: Dict[int, tuple] = {}
         
-        success_rate = success_count / len(data) * 100 if data else 0
-        logger.info(f"AI处理完成: 成功{success_count}/{len(data)}条 ({success_rate:.1f}%)")
+        rows_done = 0
+        for record in records:
+            # 更新进度并检查取消（在单行异常处理之外，取消会中止整个处理）
+            progress.update_rows(rows_done, max(total_rows, rows_done + 1))
+            
+            group_id = None
+            # 上次执行已处理成功且原文未变的行
+            checkpoint_result = checkpoint.get(record['row_index'], record['result']) if checkpoint is not None else None
+            if self.deduplicator is not None:
+                group_id, is_new = self.deduplicator.assign(record['result'])
+                outcome = None if is_new else outcomes.get(group_id)
+            else:
+                outcome = None
+            
+            if outcome is None:
+                error_message = None
+                try:
+                    logger.info(f"AI处理进度: {rows_done + 1}/{total_rows}")
+                    
+                    # 实时处理过的文本直接复用结果（测试后被修改过的文本仍调用模型）
+                    ai_result = precomputed_results.get(record['result'])
+                    if ai_result is not None:
+                        reused_count += 1
+                    elif checkpoint_result is not None:
+                        ai_result = checkpoint_result
+                        resumed_count += 1
+                    else:
+                        # 调用AI处理
+                        ai_result = self.ai_processor.process_text(record['result'])
+                    
+                    # 判断处理是否成功
+                    status = 'success' if ai_result and ai_result.strip() else 'failed'
+                    
+                except Exception as e:
+                    logger.error(f"AI处理第{record['row_index']}行数据时出错: {e}")
+                    ai_result, status, error_message = None, 'error', str(e)
+                
+                outcome = (ai_result, status, error_message)
+                if group_id is not None:
+                    outcomes[group_id] = outcome
+            
+            ai_result, status, error_message = outcome
+            if checkpoint is not None and checkpoint_result is None:
+                checkpoint.record(record['row_index'], record['result'], ai_result, status, error_message)
+            if status == 'success':
+                success_count += 1
+            
+            processed_record = {
+                'time': record['time'],
+                'original_result': record['result'],
+                'ai_processed_result': ai_result,
+                'ai_processing_status': status,
+                'row_index': record['row_index']
+            }
+            # 处理失败也保留记录
+            if error_message is not None:
+                processed_record['error_message'] = error_message
+            rows_done += 1
+            yield processed_record
         
-        return processed_data
+        progress.update_rows(rows_done, rows_done)
+        success_rate = success_count / rows_done * 100 if rows_done else 0
+        logger.info(f"AI处理完成: 成功{success_count}/{rows_done}条 ({success_rate:.1f}%)")
+        if self.deduplicator is not None:
+            logger.info(f"语句去重: {rows_done}条数据中有{len(outcomes)}条不重复语句")
+        if precomputed_results:
+            logger.info(f"复用实时处理结果{reused_count}条")
+        if checkpoint is not None and checkpoint.completed_count:
+            logger.info(f"复用断点结果{resumed_count}条")
+        logger.info(f"AI结果缓存统计: {get_cache_stats()}")
 
 
 # 便捷函数
-def process_excel_file(file_path: Optional[Union[str, Path]] = None) -> List[Dict[str, Any]]:
+def process_excel_file(file_path: Optional[Union[str, Path]] = None,
+                       precomputed_results: Optional[Dict[str, str]] = None,
+                       progress: Optional[TaskProgress] = None) -> List[Dict[str, Any]]:
     """
     便捷函数：处理Excel文件
     
     Args:
         file_path: Excel文件路径，如果为None则自动获取最新的asr_results文件
+        precomputed_results: 实时处理得到的结果（原始文本 -> AI结果）
+        progress: 进度报告器
         
     Returns:
         处理后的数据列表
     """
     processor = ExcelAIProcessor()
-    return processor.process_excel_file(file_path)
+    return processor.process_excel_file(file_path, precomputed_results, progress)
+
+def iter_excel_file(file_path: Optional[Union[str, Path]] = None,
+                    precomputed_results: Optional[Dict[str, str]] = None,
+                    progress: Optional[TaskProgress] = None) -> Iterator[Dict[str, Any]]:
+    """
+    便捷函数：流式处理Excel文件，每处理完一行立即产出结果
+    
+    Args:
+        file_path: 任务目录路径，如果为None则自动获取最新的asr_results文件
+        precomputed_results: 实时处理得到的结果（原始文本 -> AI结果）
+        progress: 进度报告器
+        
+    Yields:
+        处理结果记录
+    """
+    processor = ExcelAIProcessor()
+    return processor.iter_excel_file(file_path, precomputed_results, progress)
 
 def select_excel_file(initial_dir: str = "./download") -> Optional[str]:
     """
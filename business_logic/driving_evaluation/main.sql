@@ -15,6 +15,7 @@ FROM (
         ROUND((mental_load + predictability + timely_response + comfort + efficiency + features + safety) / 7.0, 2) as 平均,
         is_clipped as 是否剪辑
     FROM processed_records 
+    WHERE task_id = :task_id
 
     UNION ALL
 
@@ -35,6 +36,7 @@ FROM (
         ROUND(AVG((mental_load + predictability + timely_response + comfort + efficiency + features + safety) / 7.0), 2) as 平均,
         '' as 是否剪辑
     FROM processed_records
+    WHERE task_id = :task_id
 
     ORDER BY id
 ) AS result;
\ No newline at end of file
@@ -11,34 +11,65 @@ from config_manager import get_config
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-import logging
 import json
+import time
+import queue
+import logging
+import threading
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
-from database.data_service import DataService
+from database.data_service import DataService, DataServiceError
+from database.models import ProcessedRow
+from database.checkpoint_store import TaskCheckpointStore
+from database.sql_loader import get_sql_loader
 from utils.score_evaluator import ScoreEvaluator
+from utils.json_utils import parse_json
+from business_logic.job_manager import TaskProgress, TaskCancelledError
+from ai_service.metrics import get_metrics_registry
 
 # 根据运行方式选择不同的导入方式
 try:
     # 当作为模块导入时使用相对导入
     from .score_dimension_expander import create_expander_from_config
+    from .report_engine import ReportEngine
 except ImportError:
     # 当直接运行时使用绝对导入
     from score_dimension_expander import create_expander_from_config
+    from report_engine import ReportEngine
 
 logger = logging.getLogger(__name__)
 
+# 流式管道中AI处理与存储之间的队列容量
+PIPELINE_QUEUE_SIZE = 64
+# 队列结束标记
+_PIPELINE_END = object()
+# 队列满时每次等待的秒数，超时后检查存储线程是否仍在运行
+_PIPELINE_PUT_TIMEOUT = 1.0
+# 批量入库默认参数（task.insert_batch）：每批最多行数、未满一批时最长等待秒数
+DEFAULT_INSERT_BATCH_SIZE = 200
+DEFAULT_INSERT_FLUSH_SECONDS = 1.0
+
+_INSERT_PROCESSED_RECORD_SQL = (
+    f"INSERT INTO processed_records ({', '.join(ProcessedRow.INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in ProcessedRow.INSERT_COLUMNS)})"
+)
+_INSERT_ACTIVITY_SESSION_SQL = (
+    "INSERT INTO activity_sessions (task_id, timestamp, original_text, status, comment) VALUES (?, ?, ?, ?, ?)"
+)
+
 class DrivingEvaluationProcessor:
     """
     驾驶评估任务处理器
     
     实现driving_evaluation任务的完整流程：
-    1. 调用excel_ai_processor.py处理Excel
-    2. 调用score_dimension_expander展开评分维度
-    3. 调用数据服务层存储数据
-    4. 执行SQL查询获取导出数据
+    1-3. 流式管道：逐行读取Excel并调用模型（excel_ai_processor.py），结果经有界队列交给存储线程，
+         展开评分维度（score_dimension_expander）后分批在一个事务中写入，数据库写入与模型调用并行
+    4. 报表引擎单次扫描任务记录，生成导出数据（主数据和四个统计sheet）
     5. 调用toexcel.py生成Excel文件
+    6. 按task.retention清理过期数据
+    
+    记录和活动状态都带task_id（任务目录名），统计SQL只查询当前任务，多个任务可同时处理并保留历史数据
     """
     
     def __init__(self, config, task_config):
@@ -47,32 +78,45 @@ class DrivingEvaluationProcessor:
         self.task_config = task_config
         self.data_service = DataService()
         self.score_expander = create_expander_from_config(config)
+        self.score_evaluator = ScoreEvaluator()
+        # 统计SQL：首次创建时加载并在数据库上校验本目录下所有SQL，之后从内存读取
+        self.sql_loader = get_sql_loader(Path(__file__).parent)
+        if self.sql_loader.validation_results is None:
+            self.sql_loader.validate_with_database(self.data_service.db_manager)
         
         # 业务流程数据（类变量）
-        self.ai_results = []
-        self.expanded_results = []
+        self.task_id = ''
+        self.records_processed = 0
+        self.records_expanded = 0
         self.stored_ids = []
+        self.stored_status_ids = []
         self.export_data = []
         self.export_file = None
+        # 存储线程批量入库期间累积的活动状态参数（为None时活动状态立即写入）
+        self._pending_statuses: Optional[List[tuple]] = None
         
         logger.info("驾驶评估处理器初始化完成")
 
-    def execute_task_flow(self, task_dir: str) -> Dict[str, Any]:
+    def execute_task_flow(self, task_dir: str, progress: Optional[TaskProgress] = None) -> Dict[str, Any]:
         """
         执行完整的驾驶评估任务流程
 
         Args:
             task_dir (str): 任务目录
+            progress: 进度报告器（后台任务执行时传入，用于进度推送和取消）
 
         Returns:
             处理结果字典
         """
         logger.info("开始执行驾驶评估任务流程...")
         self.task_dir = task_dir
+        self.task_id = self.task_id_for(task_dir)
+        progress = progress or TaskProgress()
         # 重置流程数据
-        self.ai_results = []
-        self.expanded_results = []
+        self.records_processed = 0
+        self.records_expanded = 0
         self.stored_ids = []
+        self.stored_status_ids = []
         self.export_data = []
         self.export_file = None
         
@@ -84,49 +128,60 @@ class DrivingEvaluationProcessor:
             'records_stored': 0,
             'export_file': None,
             'error': None,
+            'cancelled': False,
+            'step_timings': {},
+            'ai_metrics': [],
             'execution_time': None
         }
         
         start_time = datetime.now()
+        # 单独统计本次流程中的模型调用（token数、各阶段耗时）
+        ai_metrics = get_metrics_registry().start_collection()
         
         try:
             print("*" * 50)
-            # 步骤1: Excel AI处理
-            logger.info("步骤1: 调用模型处理excel...")
-            self._step1_excel_ai_processing()
-            result['steps_completed'].append('excel_ai_processing')
-            result['records_processed'] = len(self.ai_results)
-            logger.info(f"模型处理完成，共处理{len(self.ai_results)}条记录")
-
-            # 步骤2: 评分维度展开
-            logger.info("步骤2: 开始评分维度展开...")
-            self._step2_score_dimension_expansion()
-            result['steps_completed'].append('score_dimension_expansion')
-            logger.info(f"评分维度展开完成，展开了{len(self.expanded_results)}条记录")
+            # 测试过程中开启了实时处理时，先回收实时写入的数据，AI结果供步骤1复用
+            precomputed_results = self._collect_realtime_results(task_dir)
+            # 同一任务重新执行时替换上次写入的数据
+            self._delete_task_data()
             
-            # 步骤3: 数据库存储
-            logger.info("步骤3: 开始数据库存储...")
-            self._step3_database_storage()
-            result['steps_completed'].append('database_storage')
+            # 步骤1-3: Excel AI处理 -> 评分维度展开 -> 数据库存储（流式管道）
+            logger.info("步骤1-3: 流式处理excel：模型处理、评分维度展开和数据库存储...")
+            progress.start_step('excel_ai_processing')
+            self._step1_to_3_streaming_pipeline(precomputed_results, progress)
+            progress.finish_step('excel_ai_processing')
+            result['steps_completed'].extend(['excel_ai_processing', 'score_dimension_expansion', 'database_storage'])
+            result['records_processed'] = self.records_processed
             result['records_stored'] = len(self.stored_ids)
-            logger.info(f"数据库存储完成，存储了{len(self.stored_ids)}条记录")
+            logger.info(f"模型处理完成，共处理{self.records_processed}条记录，"
+                        f"展开了{self.records_expanded}条记录，存储了{len(self.stored_ids)}条记录")
             
             # 步骤4: SQL查询获取导出数据
             logger.info("步骤4: SQL查询获取导出数据...")
+            progress.start_step('sql_query_for_export')
             self._step4_sql_query_for_export()
+            progress.finish_step('sql_query_for_export')
             result['steps_completed'].append('sql_query_for_export')
             logger.info(f"SQL查询完成，获取了{len(self.export_data)}条导出记录")
             
             # 步骤5: Excel文件生成
             logger.info("步骤5: 生成Excel文件...")
+            progress.start_step('excel_generation')
             self._step5_excel_generation(self.task_dir)
+            progress.finish_step('excel_generation')
             result['steps_completed'].append('excel_generation')
             result['export_file'] = self.export_file
             logger.info(f"Excel文件生成完成: {self.export_file}")
             
-            # 步骤6: 删除表中所有数据
-            logger.info("步骤6: 删除所有数据...")
-            self._step6_delete_all_data()
+            # 导出成功后清理断点（仍有失败行时保留，重新执行只处理失败的行）
+            self._finish_task_checkpoint(task_dir)
+            
+            # 步骤6: 按保留策略清理过期数据（本任务数据保留，供历史统计）
+            logger.info("步骤6: 清理过期数据...")
+            progress.start_step('apply_retention')
+            self._step6_apply_retention()
+            progress.finish_step('apply_retention')
+            result['steps_completed'].append('apply_retention')
 
             # 计算执行时间
             end_time = datetime.now()
@@ -135,155 +190,294 @@ class DrivingEvaluationProcessor:
             
             logger.info("驾驶评估任务流程完成")
             
+        except TaskCancelledError as e:
+            logger.warning(f"驾驶评估任务流程已取消: {e}")
+            result['cancelled'] = True
+            result['error'] = str(e)
+            # 回收本次已写入的记录，避免残留数据进入下一次统计
+            self.delete_stored_records()
         except Exception as e:
             logger.error(f"驾驶评估任务流程失败: {e}")
             result['error'] = str(e)
             import traceback
             traceback.print_exc()
         
+        get_metrics_registry().stop_collection(ai_metrics)
+        result['ai_metrics'] = ai_metrics.summary()
+        for group in result['ai_metrics']:
+            logger.info(f"AI调用统计 [{group['provider']}/{group['model']}]: {json.dumps(group, ensure_ascii=False)}")
+        
+        result['step_timings'] = dict(progress.step_timings)
         return result
     
-    def _step1_excel_ai_processing(self) -> None:
-        """步骤1: 调用excel_ai_processor.py处理Excel"""
+    @staticmethod
+    def task_id_for(task_dir: str) -> str:
+        """任务ID：任务目录名（与断点、实时处理会话使用同一个键）"""
+        return Path(str(task_dir)).name
+    
+    def _task_params(self) -> Dict[str, str]:
+        """统计SQL的命名参数"""
+        return {'task_id': self.task_id}
+    
+    def _collect_realtime_results(self, task_dir: str) -> Dict[str, str]:
+        """
+        结束任务的实时处理会话
+        
+        Returns:
+            实时处理得到的AI结果（原始文本 -> AI结果），没有实时会话时返回空字典
+        """
         try:
-            # 导入excel_ai_processor
+            from .realtime_pipeline import pop_realtime_session
+        except ImportError:
+            from realtime_pipeline import pop_realtime_session
+        
+        session = pop_realtime_session(task_dir)
+        if session is None:
+            return {}
+        
+        # 实时写入的记录以最终Excel为准重新写入（测试员可能在前端修改过文本）
+        return session.finish()
+    
+    def _step1_to_3_streaming_pipeline(self, precomputed_results: Optional[Dict[str, str]] = None,
+                                         progress: Optional[TaskProgress] = None) -> None:
+        """
+        步骤1-3: 流式管道
+        
+        当前线程逐行读取Excel并调用模型，每条AI结果放入有界队列；存储线程从队列取出后
+        展开评分维度并写入数据库。队列满时模型处理等待存储（背压），内存占用与任务行数无关
+        
+        Raises:
+            Exception: Excel读取或模型处理中途出错，或存储线程异常退出（存储线程的异常在其结束后重新抛出）
+        """
+        # 导入excel_ai_processor
+        try:
+            # 当作为模块导入时使用相对导入
+            from .excel_ai_processor import iter_excel_file
+        except ImportError:
+            # 当直接运行时使用绝对导入
+            from excel_ai_processor import iter_excel_file
+        
+        stage_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        storage_errors: List[BaseException] = []
+        storage_thread = threading.Thread(target=self._run_storage_stage, args=(stage_queue, storage_errors),
+                                          name="pipeline-storage", daemon=True)
+        storage_thread.start()
+        
+        ai_results = iter_excel_file(self.task_dir, precomputed_results, progress)
+        try:
+            for ai_result in ai_results:
+                self.records_processed += 1
+                if not self._put_stage(stage_queue, ai_result, storage_thread):
+                    # 存储线程已异常退出，停止读取和模型处理
+                    break
+        finally:
+            # 提前结束时关闭生成器，写入已缓冲的断点
+            ai_results.close()
+            # 取消或出错时也要等存储线程处理完已入队的记录，已存储的ID由调用方统一回收
+            self._put_stage(stage_queue, _PIPELINE_END, storage_thread)
+            storage_thread.join()
+        
+        if storage_errors:
+            raise storage_errors[0]
+        
+        if self.records_processed == 0:
+            logger.warning("excel_ai_processor未返回数据")
+    
+    @staticmethod
+    def _put_stage(stage_queue: queue.Queue, item: Any, storage_thread: threading.Thread) -> bool:
+        """
+        放入队列，队列满时等待存储线程消费
+        
+        Returns:
+            是否已放入；存储线程已退出（不会再消费队列）时返回False，避免永久阻塞
+        """
+        while storage_thread.is_alive():
             try:
-                # 当作为模块导入时使用相对导入
-                from .excel_ai_processor import process_excel_file
-            except ImportError:
-                # 当直接运行时使用绝对导入
-                from excel_ai_processor import process_excel_file
-            
-            # 调用AI处理
-            self.ai_results = process_excel_file(self.task_dir)
-            
-            if not self.ai_results:
-                logger.warning("excel_ai_processor未返回数据")
-                self.ai_results = []
-            
-            logger.debug(f"excel_ai_processor返回了{len(self.ai_results)}条结果")
-            
-        except Exception as e:
-            logger.error(f"Excel AI处理失败: {e}")
-            raise
+                stage_queue.put(item, timeout=_PIPELINE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
     
-    def _step2_score_dimension_expansion(self) -> None:
-        """步骤2: 调用score_dimension_expander展开评分维度"""
+    def _run_storage_stage(self, stage_queue: queue.Queue, errors: List[BaseException]) -> None:
+        """存储线程入口：记录异常，由流水线在线程结束后重新抛出"""
         try:
-            self.expanded_results = []
-            
-            for ai_result in self.ai_results:
+            self._storage_stage(stage_queue)
+        except BaseException as e:
+            logger.error(f"存储线程异常退出: {e}")
+            errors.append(e)
+    
+    def _storage_stage(self, stage_queue: queue.Queue) -> None:
+        """
+        存储线程：评分维度展开 -> 批量入库，单条记录失败不影响后续记录
+        
+        展开后的行记录和活动状态先在内存中累积，满task.insert_batch.size行或等待超过flush_seconds时
+        在一个事务中批量插入（每批一次磁盘同步，而不是每行一次）
+        """
+        batch_config = self.task_config.get('insert_batch') or {}
+        batch_size = max(1, int(batch_config.get('size', DEFAULT_INSERT_BATCH_SIZE)))
+        flush_seconds = float(batch_config.get('flush_seconds', DEFAULT_INSERT_FLUSH_SECONDS))
+        
+        busy_seconds = 0.0
+        pending_rows: List[ProcessedRow] = []
+        self._pending_statuses = []
+        try:
+            while True:
+                has_pending = bool(pending_rows or self._pending_statuses)
                 try:
-                    # 检查AI处理状态
-                    if ai_result.get('ai_processing_status') != 'success':
-                        self.expanded_results.append(ai_result)
-                        continue
-                    
-                    # 获取AI处理的JSON数据
-                    ai_json_str = ai_result.get('ai_processed_result', '{}')
-                    if not ai_json_str or ai_json_str.strip() == '{}':
-                        self.expanded_results.append(ai_result)
-                        continue
-                    
-                    # 解析JSON
-                    try:
-                        ai_data = json.loads(ai_json_str)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析失败: {e}")
-                        self.expanded_results.append(ai_result)
-                        continue
-                    
-                    # 0. 检查status字段，如果不为空则存储到活动状态表
-                    if ai_data.get('status'):
-                        logger.debug(f"检测到status字段: {ai_data['status']}，存储到活动状态表")
-                        self._store_activity_status(ai_result, ai_data)
-                        continue
-                    # 调用score_dimension_expander进行评分维度展开
-                    expanded_scores = self.score_expander.expand_scores(ai_data)
-                    
-                    # 将展开的分数添加到ai_data中
-                    ai_data.update(expanded_scores)
-                    
-                    # 更新AI结果
-                    ai_result['ai_processed_result'] = json.dumps(ai_data, ensure_ascii=False)
-                    self.expanded_results.append(ai_result)
-                    
-                    logger.debug(f"评分维度展开完成: 记录{ai_result.get('row_index', 'unknown')}")
-                    
+                    ai_result = stage_queue.get(timeout=flush_seconds if has_pending else None)
+                except queue.Empty:
+                    # 一段时间没有新记录，先写入已累积的记录（实时统计及时更新）
+                    started = time.perf_counter()
+                    self._flush_pending_records(pending_rows)
+                    busy_seconds += time.perf_counter() - started
+                    continue
+                if ai_result is _PIPELINE_END:
+                    break
+                
+                started = time.perf_counter()
+                try:
+                    row = self.expand_record(ai_result)
                 except Exception as e:
                     logger.error(f"评分维度展开失败（记录{ai_result.get('row_index', 'unknown')}）: {e}")
-                    self.expanded_results.append(ai_result)
-                    continue
-            logger.info("评分维度展开完成")
-        except Exception as e:
-            logger.error(f"评分维度展开步骤失败: {e}")
-            raise
+                    row = None
+                
+                if row is not None:
+                    self.records_expanded += 1
+                    pending_rows.append(row)
+                if len(pending_rows) + len(self._pending_statuses) >= batch_size:
+                    self._flush_pending_records(pending_rows)
+                busy_seconds += time.perf_counter() - started
+        finally:
+            # 取消或出错时也写入已累积的记录，已存储的ID由调用方统一回收
+            started = time.perf_counter()
+            self._flush_pending_records(pending_rows)
+            self._pending_statuses = None
+            busy_seconds += time.perf_counter() - started
+        
+        per_row_ms = busy_seconds * 1000 / self.records_processed if self.records_processed else 0.0
+        logger.info(f"存储线程完成，评分维度展开和存储共耗时{busy_seconds:.3f}秒"
+                    f"（平均每行{per_row_ms:.3f}毫秒，与模型调用并行）")
     
-    def _step3_database_storage(self) -> None:
-        """步骤3: 调用数据服务层存储数据"""
-        try:
-            self.stored_ids = []
-            
-            for ai_result in self.expanded_results:
-                try:
-                    # 检查AI处理状态
-                    if ai_result.get('ai_processing_status') != 'success':
-                        continue
-                    
-                    # 获取AI处理的JSON数据
-                    ai_json_str = ai_result.get('ai_processed_result', '{}')
-                    if not ai_json_str or ai_json_str.strip() == '{}':
-                        continue
-                    
-                    # 解析JSON
+    def _flush_pending_records(self, pending_rows: List[ProcessedRow]) -> None:
+        """批量写入累积的活动状态和行记录并清空；整批失败时改为逐条写入，只跳过出错的记录"""
+        if self._pending_statuses:
+            statuses = list(self._pending_statuses)
+            self._pending_statuses.clear()
+            try:
+                self.stored_status_ids.extend(
+                    self.data_service.execute_many_insert_sql(_INSERT_ACTIVITY_SESSION_SQL, statuses)
+                )
+            except DataServiceError as e:
+                logger.warning(f"批量存储{len(statuses)}条活动状态失败，改为逐条存储: {e}")
+                for params in statuses:
                     try:
-                        ai_data = json.loads(ai_json_str)
-                    except json.JSONDecodeError:
-                        continue
-                    
-                    if ai_data.get('status','') == "start" or ai_data.get('status','') == "end":
-                        continue
-                    
-                    record_data = {
-                        'timestamp': ai_result.get('time', datetime.now()).strftime('%Y-%m-%d %H:%M:%S'),
-                        'original_text': ai_result.get('original_result', ''),
-                        'comment': ai_data.get('comment', ''),
-                        'function_type': ai_data.get('function', ''),
-                        'rating': self._determine_rating(ai_data),
-                        'mental_load': ai_data.get('Mental_Load', 0.0),
-                        'predictability': ai_data.get('Predictable', 0.0),
-                        'timely_response': ai_data.get('Timely_Response', 0.0),
-                        'comfort': ai_data.get('Comfort', 0.0),
-                        'efficiency': ai_data.get('Efficiency', 0.0),
-                        'features': ai_data.get('Features', 0.0),
-                        'safety': ai_data.get('Safety', 0.0),
-                        'is_clipped': ai_data.get('是否剪辑', '否')
-                    }
-                    
-                    # 调用数据服务层存储到数据库
-                    sql, params = self._build_insert_sql(record_data)
-                    record_id = self.data_service.execute_insert_sql(sql, params)
-                    self.stored_ids.append(record_id)
-                    logger.debug(f"存储记录成功: ID={record_id}")
-                    
-                except Exception as e:
-                    logger.error(f"存储记录失败（记录{ai_result.get('row_index', 'unknown')}）: {e}")
-                    continue
+                        self._insert_activity_status(params)
+                    except Exception as e:
+                        logger.error(f"存储活动状态失败（{params[1]}）: {e}")
+        
+        if pending_rows:
+            rows = list(pending_rows)
+            pending_rows.clear()
+            try:
+                self.store_rows(rows)
+            except DataServiceError as e:
+                logger.warning(f"批量存储{len(rows)}条记录失败，改为逐条存储: {e}")
+                for row in rows:
+                    try:
+                        self.store_record(row)
+                    except Exception as e:
+                        logger.error(f"存储记录失败（记录{row.row_index}）: {e}")
+    
+    def expand_record(self, ai_result: Dict[str, Any]) -> Optional[ProcessedRow]:
+        """
+        解析单条AI结果并展开评分维度
+        
+        AI结果JSON只在这里解析一次，展开、评级后生成ProcessedRow交给store_record，不再反复序列化
+        
+        Args:
+            ai_result: AI处理结果记录
             
-        except Exception as e:
-            logger.error(f"数据库存储步骤失败: {e}")
-            raise
+        Returns:
+            待入库的行记录；处理失败、无有效JSON或开始/结束状态记录（已存储到活动状态表）返回None
+        """
+        # 检查AI处理状态
+        if ai_result.get('ai_processing_status') != 'success':
+            return None
+        
+        # 获取AI处理的JSON数据
+        ai_json_str = ai_result.get('ai_processed_result', '{}')
+        if not ai_json_str or ai_json_str.strip() == '{}':
+            return None
+        
+        # 解析JSON
+        ai_data = parse_json(ai_json_str)
+        if not isinstance(ai_data, dict):
+            logger.error(f"JSON解析失败: {ai_json_str[:100]}")
+            return None
+        
+        timestamp = ai_result.get('time', datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # 0. 检查status字段，如果不为空则存储到活动状态表
+        if ai_data.get('status'):
+            logger.debug(f"检测到status字段: {ai_data['status']}，存储到活动状态表")
+            self._store_activity_status(timestamp, ai_result.get('original_result', ''), ai_data)
+            return None
+        # 调用score_dimension_expander进行评分维度展开
+        ai_data.update(self.score_expander.expand_scores(ai_data))
+        
+        row = ProcessedRow.from_ai_data(
+            ai_data,
+            task_id=self.task_id,
+            timestamp=timestamp,
+            original_text=ai_result.get('original_result', ''),
+            rating=self._determine_rating(ai_data),
+            row_index=ai_result.get('row_index')
+        )
+        logger.debug(f"评分维度展开完成: 记录{row.row_index}")
+        return row
+    
+    def store_record(self, row: ProcessedRow) -> int:
+        """
+        存储单条展开后的行记录
+        
+        Args:
+            row: expand_record返回的行记录
+            
+        Returns:
+            记录ID
+        """
+        # 调用数据服务层存储到数据库
+        record_id = self.data_service.execute_insert_sql(_INSERT_PROCESSED_RECORD_SQL, row.to_params())
+        self.stored_ids.append(record_id)
+        logger.debug(f"存储记录成功: ID={record_id}")
+        return record_id
+    
+    def store_rows(self, rows: List[ProcessedRow]) -> List[int]:
+        """
+        在一个事务中批量存储展开后的行记录
+        
+        Args:
+            rows: expand_record返回的行记录列表
+            
+        Returns:
+            记录ID列表（与rows顺序一致）
+        """
+        record_ids = self.data_service.execute_many_insert_sql(
+            _INSERT_PROCESSED_RECORD_SQL, [row.to_params() for row in rows]
+        )
+        self.stored_ids.extend(record_ids)
+        logger.debug(f"批量存储记录成功: {len(record_ids)}条")
+        return record_ids
     
     def _get_main_data(self):
         """获取主数据"""
         try:
-            # 读取main.sql文件
-            sql_file_path = Path(__file__).parent / 'main.sql'
-            with open(sql_file_path, 'r', encoding='utf-8') as f:
-                sql = f.read().strip()
+            # 读取main.sql（内存缓存，文件修改后自动重新加载）
+            sql = self.sql_loader.load_sql('main.sql')
             
             # 执行SQL查询
-            data = self.data_service.execute_select_sql(sql)
+            data = self.data_service.execute_select_sql(sql, self._task_params())
 
             return {"data": data, "name": "main_data"}
         except Exception as e:
@@ -293,13 +487,11 @@ class DrivingEvaluationProcessor:
     def _get_rating_statistics(self):
         """获取评级统计"""
         try:
-            # 读取rating_statistics.sql文件
-            sql_file_path = Path(__file__).parent / 'rating_statistics.sql'
-            with open(sql_file_path, 'r', encoding='utf-8') as f:
-                sql = f.read().strip()
+            # 读取rating_statistics.sql
+            sql = self.sql_loader.load_sql('rating_statistics.sql')
             
             # 执行SQL查询
-            data = self.data_service.execute_select_sql(sql)
+            data = self.data_service.execute_select_sql(sql, self._task_params())
             return {"data": data, "name": "rating_statistics"}
         except Exception as e:
             logger.error(f"获取评级统计失败: {e}")
@@ -309,11 +501,9 @@ class DrivingEvaluationProcessor:
         """获取各场景的评级统计"""
         try:
 
-            # 读取rating_statistics.sql文件
-            sql_file_path = Path(__file__).parent / 'scene_rating_statistics.sql'
-            with open(sql_file_path, 'r', encoding='utf-8') as f:
-                sql = f.read().strip()
-            data = self.data_service.execute_select_sql(sql)
+            # 读取scene_rating_statistics.sql
+            sql = self.sql_loader.load_sql('scene_rating_statistics.sql')
+            data = self.data_service.execute_select_sql(sql, self._task_params())
             return {"data": data, "name": "scene_rating_statistics"}
         except Exception as e:
             logger.error(f"获取场景评级统计失败: {e}")
@@ -323,41 +513,43 @@ class DrivingEvaluationProcessor:
         """获取各场景各个项目的平均分统计"""
         try:
 
-            # 读取avg_statistics.sql文件
-            sql_file_path = Path(__file__).parent / 'avg_statistics.sql'
-            with open(sql_file_path, 'r', encoding='utf-8') as f:
-                sql = f.read().strip()
-            data = self.data_service.execute_select_sql(sql)
+            # 读取avg_statistics.sql
+            sql = self.sql_loader.load_sql('avg_statistics.sql')
+            data = self.data_service.execute_select_sql(sql, self._task_params())
             return {"data": data, "name": "avg_statistics"}
         except Exception as e:
             logger.error(f"获取场景平均分统计失败: {e}")
             return {"data": [], "error": str(e)}
         
+    def _task_has_activity_sessions(self) -> bool:
+        """当前任务是否有开始/结束状态记录"""
+        rows = self.data_service.execute_select_sql(
+            "SELECT EXISTS(SELECT 1 FROM activity_sessions WHERE task_id = :task_id) AS has_rows",
+            self._task_params()
+        )
+        return bool(rows and rows[0]['has_rows'])
+    
     def _get_takeover_statistics(self):
         """获取接管统计"""
         try:
-            if self.data_service.is_table_empty("activity_sessions"):
+            if not self._task_has_activity_sessions():
                 logger.info("活动表为空，使用简化的接管统计查询")
                 
                 # 使用简化的SQL查询（基于主表时间范围）
-                sql_file_path = Path(__file__).parent / 'takeover_statistics_simple.sql'
-                with open(sql_file_path, 'r', encoding='utf-8') as f:
-                    sql = f.read().strip()
+                sql = self.sql_loader.load_sql('takeover_statistics_simple.sql')
                 
                 # 执行SQL查询
-                data = self.data_service.execute_select_sql(sql)
+                data = self.data_service.execute_select_sql(sql, self._task_params())
                 logger.debug(f"简化接管统计查询返回{len(data)}条记录")
                 return {"data": data, "name": "takeover_statistics"}
             else:
                 logger.info("活动表不为空，使用完整的接管统计查询")
                 
-                # 读取完整的takeover_statistics.sql文件
-                sql_file_path = Path(__file__).parent / 'takeover_statistics.sql'
-                with open(sql_file_path, 'r', encoding='utf-8') as f:
-                    sql = f.read().strip()
+                # 读取完整的takeover_statistics.sql
+                sql = self.sql_loader.load_sql('takeover_statistics.sql')
                 
                 # 执行SQL查询
-                data = self.data_service.execute_select_sql(sql)
+                data = self.data_service.execute_select_sql(sql, self._task_params())
                 logger.debug(f"完整接管统计查询返回{len(data)}条记录")
                 return {"data": data, "name": "takeover_statistics"}
                 
@@ -365,8 +557,56 @@ class DrivingEvaluationProcessor:
             logger.error(f"获取接管统计失败: {e}")
             return {"data": [], "error": str(e)}
 
+    def get_live_statistics(self, task_dir: str) -> List[Dict[str, Any]]:
+        """
+        获取任务当前的评级统计、场景评级统计和平均分统计
+
+        三个统计SQL读取触发器增量维护的record_aggregates汇总表，开销只与分组数有关，
+        实时处理写入过程中可以频繁调用（实时仪表盘）
+
+        Args:
+            task_dir: 任务目录名
+
+        Returns:
+            [评级统计, 场景评级统计, 平均分统计]，格式与导出数据一致
+        """
+        self.task_id = self.task_id_for(task_dir)
+        return [self._get_rating_statistics(), self._get_scene_rating_statistics(), self._get_avg_statistics()]
+
+    def _finish_task_checkpoint(self, task_dir: str) -> None:
+        """任务导出成功后删除断点；有失败行或配置了keep_on_success时保留"""
+        checkpoint_config = self.task_config.get('checkpoint') or {}
+        if not checkpoint_config.get('enabled', False) or checkpoint_config.get('keep_on_success', False):
+            return
+        
+        try:
+            store = TaskCheckpointStore()
+            # 断点按任务目录名记录（见ExcelAIProcessor.iter_excel_file）
+            checkpoint_key = self.task_id_for(task_dir)
+            status_counts = store.summary(checkpoint_key)
+            unfinished = sum(count for status, count in status_counts.items() if status != 'success')
+            if unfinished:
+                logger.warning(f"任务{checkpoint_key}有{unfinished}行AI处理失败，保留断点，重新执行时只处理这些行")
+                return
+            store.clear(checkpoint_key)
+        except Exception as e:
+            logger.error(f"清理任务断点失败: {e}")
+    
     def _step4_sql_query_for_export(self) -> None:
-        """步骤4: 执行SQL查询获取导出数据"""
+        """
+        步骤4: 获取导出数据
+        
+        默认由报表引擎单次扫描任务记录生成全部五个sheet；task.report.engine为sql时逐个执行统计SQL
+        """
+        engine = (self.task_config.get('report') or {}).get('engine', 'single_scan')
+        if engine == 'single_scan':
+            try:
+                self.export_data = ReportEngine(self.data_service.db_manager).build(self.task_id)
+                logger.debug(f"报表引擎生成了{len(self.export_data)}个导出对象")
+                return
+            except Exception as e:
+                logger.error(f"报表引擎生成导出数据失败，改用SQL查询: {e}")
+        
         try:
             export_data = []
             export_data.append(self._get_main_data())
@@ -389,10 +629,12 @@ class DrivingEvaluationProcessor:
             # 使用task_dir替换timestamp
             filename = filename.format(timestamp=task_dir)
 
-            # 确保下载目录存在 - 使用绝对路径
-            download_dir = Path(project_root) / 'download'
-            download_dir.mkdir(exist_ok=True)
+            # 确保任务目录存在 - 与输入Excel同在storage.download_dir下，相对路径按项目根目录解析
+            download_dir = Path(self.config.storage.download_dir)
+            if not download_dir.is_absolute():
+                download_dir = Path(project_root) / download_dir
             output_path = download_dir / task_dir / filename
+            output_path.parent.mkdir(parents=True, exist_ok=True)
 
             # 格式化数据以适配toexcel
             # formatted_data = self._format_main_data_for_excel(self.export_data)
@@ -408,15 +650,35 @@ class DrivingEvaluationProcessor:
             logger.error(f"Excel文件生成失败: {e}")
             raise
     
-    def _step6_delete_all_data(self) -> None:
-        """步骤6: 删除表中所有数据"""
+    def delete_stored_records(self) -> None:
+        """按ID删除本处理器写入的记录（处理记录和活动状态）"""
+        for table_name, ids in (("processed_records", self.stored_ids),
+                                ("activity_sessions", self.stored_status_ids)):
+            ids = [record_id for record_id in ids if record_id is not None]
+            # 分批删除，避免超出SQLite单条语句的参数个数上限
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.data_service.execute_update_sql(
+                    f"DELETE FROM {table_name} WHERE id IN ({placeholders})", tuple(chunk)
+                )
+    
+    def _delete_task_data(self) -> None:
+        """删除当前任务已有的记录和活动状态"""
+        for table_name in ("processed_records", "activity_sessions"):
+            self.data_service.delete_task_data_from_table(table_name, self.task_id)
+    
+    def _step6_apply_retention(self) -> None:
+        """步骤6: 删除超过task.retention.keep_days天的数据（keep_days为0时永久保留）"""
         try:
-            # 调用数据服务层删除所有记录
-            self.data_service.delete_all_data_from_table("processed_records")
-            self.data_service.delete_all_data_from_table("activity_sessions")
-            logger.info("所有数据已成功删除")
+            keep_days = (self.task_config.get('retention') or {}).get('keep_days', 0)
+            if not keep_days:
+                logger.info("未配置数据保留天数，保留所有历史数据")
+                return
+            for table_name in ("processed_records", "activity_sessions"):
+                self.data_service.delete_expired_data_from_table(table_name, keep_days)
         except Exception as e:
-            logger.error(f"删除所有数据失败: {e}")
+            logger.error(f"清理过期数据失败: {e}")
             raise
     def _format_main_data_for_excel(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """格式化主数据以适配Excel导出"""
@@ -449,17 +711,13 @@ class DrivingEvaluationProcessor:
             raise
     
     def _determine_rating(self, ai_data: Dict[str, Any]) -> str:
-        config = get_config()
-        score_mapping = config.get('task.score_mapping', {})
-        field_names = list(score_mapping.values())    # 英文字段名列表
-        # 获取ai_data所有field_names字段的分数并计算平均值
+        # 获取ai_data所有评分字段的分数并计算平均值
+        field_names = self.score_expander.field_names    # 英文字段名列表
         scores = [ai_data.get(field, 0) for field in field_names]
         avg_score = sum(scores) / len(scores) if scores else 0
 
         # 使用ScoreEvaluator进行评级
-        evaluator = ScoreEvaluator()
-        rating = evaluator.evaluate_score(avg_score)
-        return rating
+        return self.score_evaluator.evaluate_score(avg_score)
     
     # def export_data(self, filters: Dict[str, Any] = None) -> str:
     #     """
@@ -490,72 +748,25 @@ class DrivingEvaluationProcessor:
     #         logger.error(f"独立导出失败: {e}")
     #         raise
     
-    def _build_insert_sql(self, record_data: Dict[str, Any]) -> tuple:
-        """
-        构建插入SQL语句和参数
-        
-        Args:
-            record_data: 记录数据字典
-            
-        Returns:
-            tuple: (sql语句, 参数元组)
-        """
-        sql = """
-        INSERT INTO processed_records (
-            timestamp, original_text, comment, function_type, rating,
-            mental_load, predictability, timely_response, comfort,
-            efficiency, features, safety, is_clipped
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+    def _store_activity_status(self, timestamp: str, original_text: str, ai_data: Dict[str, Any]) -> None:
+        """存储活动状态到数据库（存储线程批量入库期间先累积，随下一批记录写入）"""
+        params = (self.task_id, timestamp, original_text, ai_data.get('status', ''), ai_data.get('comment', ''))
+        if self._pending_statuses is not None:
+            self._pending_statuses.append(params)
+            return
         
-        params = (
-            record_data.get('timestamp'),
-            record_data.get('original_text', ''),
-            record_data.get('comment', ''),
-            record_data.get('function_type', ''),
-            record_data.get('rating', 'bad'),
-            record_data.get('mental_load', 0.0),
-            record_data.get('predictability', 0.0),
-            record_data.get('timely_response', 0.0),
-            record_data.get('comfort', 0.0),
-            record_data.get('efficiency', 0.0),
-            record_data.get('features', 0.0),
-            record_data.get('safety', 0.0),
-            record_data.get('is_clipped', ''),
-        )
-        
-        return sql, params
-
-    def _store_activity_status(self, ai_result: Dict[str, Any], ai_data: Dict[str, Any]) -> None:
-        """存储活动状态到数据库"""
         try:
-            status_data = {
-                'timestamp': ai_result.get('time', datetime.now()).strftime('%Y-%m-%d %H:%M:%S'),
-                'original_text': ai_result.get('original_result', ''),
-                'status': ai_data.get('status', ''),
-                'comment': ai_data.get('comment', '')
-            }
-            
-            # 构建插入活动状态的SQL
-            sql = """
-            INSERT INTO activity_sessions (timestamp, original_text, status, comment)
-            VALUES (?, ?, ?, ?)
-            """
-            
-            params = (
-                status_data['timestamp'],
-                status_data['original_text'],
-                status_data['status'],
-                status_data['comment']
-            )
-            
-            # 执行插入
-            record_id = self.data_service.execute_insert_sql(sql, params)
-            logger.debug(f"活动状态存储成功: ID={record_id}, status={status_data['status']}")
-            
+            self._insert_activity_status(params)
         except Exception as e:
             logger.error(f"存储活动状态失败: {e}")
             raise
+    
+    def _insert_activity_status(self, params: tuple) -> int:
+        """插入单条活动状态"""
+        record_id = self.data_service.execute_insert_sql(_INSERT_ACTIVITY_SESSION_SQL, params)
+        self.stored_status_ids.append(record_id)
+        logger.debug(f"活动状态存储成功: ID={record_id}, status={params[3]}")
+        return record_id
 
 if __name__ == "__main__":
 
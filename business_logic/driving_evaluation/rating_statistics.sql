@@ -1,12 +1,17 @@
+-- 评级统计（参数 :task_id）
+-- 读取触发器增量维护的record_aggregates汇总表，开销只与分组数有关
+
 SELECT 
     rating as 评级,
-    COUNT(*) as 数量,
-    ROUND((COUNT(*) * 100.0 / (SELECT COUNT(*) FROM processed_records)), 1) || '%' as 比例
-FROM processed_records 
+    SUM(record_count) as 数量,
+    ROUND((SUM(record_count) * 100.0 / (SELECT SUM(record_count) FROM record_aggregates WHERE task_id = :task_id)), 1) || '%' as 比例
+FROM record_aggregates 
+WHERE task_id = :task_id
 GROUP BY rating
 UNION ALL
 SELECT 
     '总计' as 评级,
-    COUNT(*) as 数量,
+    COALESCE(SUM(record_count), 0) as 数量,
     '100.0%' as 比例
-FROM processed_records;
+FROM record_aggregates
+WHERE task_id = :task_id;
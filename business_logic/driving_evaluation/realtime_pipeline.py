@@ -0,0 +1,220 @@
+"""
+驾驶评估实时处理管道
+测试过程中每条识别完成的ASR结果在后台线程中依次经过AI处理、评分维度展开和数据库存储，
+处理结果通过同一个WebSocket推送给前端；任务结束时流程直接复用这些AI结果
+"""
+import json
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config_manager import get_config
+
+try:
+    from .processor import DrivingEvaluationProcessor
+except ImportError:
+    from processor import DrivingEvaluationProcessor
+
+logger = logging.getLogger(__name__)
+
+# 连接断开后会话（AI结果和实时记录）保留的时长，超时仍未提交任务则清理
+DEFAULT_SESSION_TTL_SECONDS = 6 * 3600
+
+class RealtimeSession:
+    """单个测试任务的实时处理会话"""
+
+    def __init__(self, task_dir: str, config=None, task_config: Optional[Dict[str, Any]] = None):
+        """
+        初始化实时处理会话
+
+        Args:
+            task_dir: 任务目录名（与ASR音频和Excel所在目录一致）
+            config: 配置实例
+            task_config: 任务配置
+        """
+        self.task_dir = task_dir
+        config = config or get_config()
+        self.processor = DrivingEvaluationProcessor(config, task_config or config.task)
+        self.processor.task_id = DrivingEvaluationProcessor.task_id_for(task_dir)
+
+        # 单线程按识别顺序处理，模型调用不阻塞WebSocket事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="realtime-ai")
+        self._ai_processor = None
+        self._lock = threading.Lock()
+        self._results: Dict[str, str] = {}
+        self._finished = False
+        self.closed_at: Optional[float] = None  # 停止接收语句的时间（monotonic），None表示仍在接收
+
+        logger.info(f"实时处理会话已启动: {task_dir}")
+
+    @property
+    def ai_processor(self):
+        """获取（懒加载）AI处理器，在工作线程中首次使用时创建"""
+        if self._ai_processor is None:
+            from ai_service.ai_api import CarTestDataProcessor
+            self._ai_processor = CarTestDataProcessor()
+        return self._ai_processor
+
+    def submit(self, text: str, start_time: Optional[str], idx: int) -> Future:
+        """
+        提交一条识别完成的语句
+
+        Args:
+            text: 识别文本
+            start_time: 语句开始时间（%Y-%m-%d %H:%M:%S）
+            idx: ASR分段序号
+
+        Returns:
+            Future，结果为推送给前端的消息字典
+        """
+        with self._lock:
+            if self._finished:
+                raise RuntimeError(f"实时处理会话已结束: {self.task_dir}")
+            return self._executor.submit(self._process_segment, text, start_time, idx)
+
+    def _process_segment(self, text: str, start_time: Optional[str], idx: int) -> Dict[str, Any]:
+        """处理一条语句：AI处理 -> 评分维度展开 -> 数据库存储"""
+        text = (text or "").strip()
+        message = {"type": "ai_result", "idx": idx, "text": text, "start_time": start_time,
+                   "status": "failed", "result": None, "record_id": None}
+        if not text:
+            return message
+
+        try:
+            ai_output = self.ai_processor.process_text(text)
+            if not (ai_output and ai_output.strip()):
+                return message
+
+            with self._lock:
+                self._results[text] = ai_output
+
+            record = {
+                'time': self._parse_time(start_time),
+                'original_result': text,
+                'ai_processed_result': ai_output,
+                'ai_processing_status': 'success',
+                'row_index': idx + 1
+            }
+            expanded = self.processor.expand_record(record)
+            if expanded is not None:
+                message["record_id"] = self.processor.store_record(expanded)
+
+            message["status"] = "success"
+            try:
+                message["result"] = json.loads(ai_output)
+            except json.JSONDecodeError:
+                message["result"] = ai_output
+
+        except Exception as e:
+            logger.error(f"实时处理失败（分段{idx}）: {e}")
+            message["status"] = "error"
+            message["error"] = str(e)
+
+        return message
+
+    def close(self) -> None:
+        """
+        停止接收语句：等待已提交的语句处理完毕并释放工作线程（WebSocket断开时调用）
+
+        AI结果和实时写入的记录保留，任务提交时由流程通过finish()复用和清理
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self.closed_at = time.monotonic()
+        self._executor.shutdown(wait=True)
+        logger.info(f"实时处理会话已停止接收: {self.task_dir}，共{len(self._results)}条AI结果")
+
+    def finish(self) -> Dict[str, str]:
+        """
+        结束会话：等待未完成的语句处理完毕，删除实时写入的记录
+
+        任务流程以前端最终提交的Excel为准重新写入数据库，实时记录只用于测试过程中的即时反馈
+
+        Returns:
+            实时处理得到的AI结果（原始文本 -> AI结果）
+        """
+        self.close()
+
+        self.processor.delete_stored_records()
+        logger.info(f"实时处理会话已结束: {self.task_dir}，共{len(self._results)}条AI结果")
+
+        with self._lock:
+            return dict(self._results)
+
+    @staticmethod
+    def _parse_time(start_time: Optional[str]) -> datetime:
+        """解析ASR分段时间，缺失或格式不正确时使用当前时间"""
+        if start_time:
+            try:
+                return datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                pass
+        return datetime.now()
+
+
+# 进行中的实时处理会话（任务目录 -> 会话）
+_sessions: Dict[str, RealtimeSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def start_realtime_session(task_dir: str, config=None, task_config: Optional[Dict[str, Any]] = None) -> RealtimeSession:
+    """
+    启动（或获取已存在的）任务实时处理会话
+
+    Args:
+        task_dir: 任务目录名
+        config: 配置实例
+        task_config: 任务配置
+
+    Returns:
+        实时处理会话
+    """
+    config = config or get_config()
+    task_config = task_config or config.task
+    realtime_config = task_config.get('realtime') or {}
+    expire_realtime_sessions(realtime_config.get('session_ttl_seconds', DEFAULT_SESSION_TTL_SECONDS))
+
+    with _sessions_lock:
+        session = _sessions.get(task_dir)
+        if session is None:
+            session = RealtimeSession(task_dir, config, task_config)
+            _sessions[task_dir] = session
+        return session
+
+
+def expire_realtime_sessions(ttl_seconds: float) -> int:
+    """
+    清理连接断开超过ttl_seconds仍未提交任务的会话（删除其实时写入的记录）
+
+    Returns:
+        清理的会话数
+    """
+    now = time.monotonic()
+    with _sessions_lock:
+        expired = [task_dir for task_dir, session in _sessions.items()
+                   if session.closed_at is not None and now - session.closed_at >= ttl_seconds]
+        sessions = [_sessions.pop(task_dir) for task_dir in expired]
+
+    for session in sessions:
+        try:
+            session.finish()
+        except Exception as e:
+            logger.warning(f"清理过期实时处理会话失败: {session.task_dir}: {e}")
+    return len(sessions)
+
+
+def get_realtime_session(task_dir: str) -> Optional[RealtimeSession]:
+    """获取任务的实时处理会话，不存在返回None"""
+    with _sessions_lock:
+        return _sessions.get(task_dir)
+
+
+def pop_realtime_session(task_dir: str) -> Optional[RealtimeSession]:
+    """移除并返回任务的实时处理会话，不存在返回None"""
+    with _sessions_lock:
+        return _sessions.pop(task_dir, None)
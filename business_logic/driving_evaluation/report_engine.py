@@ -0,0 +1,319 @@
+"""
+单次扫描报表引擎
+一次顺序读取任务的processed_records（和数量很少的activity_sessions），同时累计主数据、评级统计、
+场景评级统计、平均分统计和接管统计五个导出sheet，替代对处理记录表分别做五次（部分两次）全表扫描的SQL查询
+
+输出的sheet名称、列名、取值和排序与对应的.sql文件一致（ROUND按SQLite的四舍五入规则，百分比文本按SQLite的实数格式），
+task_id为None时统计全部历史数据
+"""
+import bisect
+import logging
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 评分列（与main.sql、avg_statistics.sql中的顺序一致）及导出列名
+SCORE_COLUMNS = (
+    ('mental_load', '压力性'),
+    ('predictability', '可预测性'),
+    ('timely_response', '响应性'),
+    ('comfort', '舒适性'),
+    ('efficiency', '效率性'),
+    ('features', '功能性'),
+    ('safety', '安全性'),
+)
+SCENE_RATINGS = ('pos', 'avg', 'neg', 'bad')
+
+_RECORD_COLUMNS = ('timestamp', 'original_text', 'comment', 'function_type') + \
+    tuple(column for column, _ in SCORE_COLUMNS) + ('rating', 'is_clipped', 'is_takeover')
+
+
+def sql_round(value: Optional[float], digits: int = 0) -> Optional[float]:
+    """与SQLite ROUND一致的四舍五入（远离零方向），NULL返回None"""
+    if value is None:
+        return None
+    scale = 10 ** digits
+    rounded = math.floor(abs(value) * scale + 0.5) / scale
+    return math.copysign(rounded, value) if rounded else 0.0
+
+
+def sql_real_text(value: float) -> str:
+    """与SQLite将实数转换为文本一致的格式（如100.0、33.3）"""
+    text = '%.15g' % value
+    if not any(ch in text for ch in '.eni'):
+        text += '.0'
+    return text
+
+
+def _julianday_ms(timestamp: Any) -> Optional[int]:
+    """SQLite julianday的内部整数毫秒表示（'YYYY-MM-DD HH:MM:SS'），无法解析时返回None"""
+    try:
+        moment = datetime.strptime(str(timestamp)[:19], '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+    seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+    return int((moment.toordinal() + 1721424.5) * 86400000) + seconds * 1000
+
+
+def _minutes_between(start: Any, end: Any) -> Optional[float]:
+    """等价于ROUND((julianday(end) - julianday(start)) * 24 * 60, 2)"""
+    start_ms, end_ms = _julianday_ms(start), _julianday_ms(end)
+    if start_ms is None or end_ms is None:
+        return None
+    return sql_round((end_ms / 86400000.0 - start_ms / 86400000.0) * 24 * 60, 2)
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """SQLite的排序规则：NULL < 数值 < 文本"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+class _ScoreAccumulator:
+    """一组记录的计数和各评分列（含7项平均分）的求和，忽略NULL（与AVG一致）"""
+    __slots__ = ('count', 'sums', 'counts')
+
+    def __init__(self):
+        self.count = 0
+        # 7个评分列 + 7项平均分
+        self.sums = [0.0] * (len(SCORE_COLUMNS) + 1)
+        self.counts = [0] * (len(SCORE_COLUMNS) + 1)
+
+    def add(self, scores: Tuple, overall: Optional[float]) -> None:
+        self.count += 1
+        sums, counts = self.sums, self.counts
+        for index, score in enumerate(scores):
+            if score is not None:
+                sums[index] += score
+                counts[index] += 1
+        if overall is not None:
+            sums[-1] += overall
+            counts[-1] += 1
+
+    def averages(self) -> List[Optional[float]]:
+        """各列ROUND(AVG(...), 2)"""
+        return [sql_round(total / count, 2) if count else None for total, count in zip(self.sums, self.counts)]
+
+
+class ReportEngine:
+    """单次扫描报表引擎"""
+
+    def __init__(self, db_manager):
+        """
+        初始化报表引擎
+
+        Args:
+            db_manager: 数据库管理器
+        """
+        self.db_manager = db_manager
+
+    def build(self, task_id: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        生成五个导出sheet
+
+        Args:
+            task_id: 任务ID，None表示全部历史数据
+
+        Returns:
+            [主数据, 评级统计, 场景评级统计, 平均分统计, 接管统计]，格式与步骤4的SQL查询结果一致
+        """
+        where, params = ("WHERE task_id = ?", (task_id,)) if task_id is not None else ("", ())
+
+        main_rows = []
+        overall = _ScoreAccumulator()
+        rating_counts: Dict[Any, int] = {}
+        scene_counts: Dict[Any, List[int]] = {}  # 功能类型 -> [pos, avg, neg, bad, 总数]
+        scene_scores: Dict[Any, _ScoreAccumulator] = {}
+        takeover_records: List[Tuple[Any, Any]] = []  # (功能类型, 时间戳)
+        min_timestamp = max_timestamp = None
+
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # 按元组读取，避免为每行构造sqlite3.Row
+            cursor.execute(f"SELECT {', '.join(_RECORD_COLUMNS)} FROM processed_records {where} ORDER BY id", params)
+            for row in cursor:
+                timestamp, original_text, comment, function_type = row[:4]
+                scores = row[4:11]
+                rating, is_clipped, is_takeover = row[11], row[12], row[13]
+                overall_score = None if None in scores else sql_round(sum(scores) / 7.0, 2)
+                raw_overall = None if None in scores else sum(scores) / 7.0
+
+                main_row = {'timestamp': timestamp, 'original_text': original_text, 'comment': comment,
+                            'function_type': function_type}
+                for (_, label), score in zip(SCORE_COLUMNS, scores):
+                    main_row[label] = score
+                main_row['评价'] = rating
+                main_row['平均'] = overall_score
+                main_row['是否剪辑'] = is_clipped
+                main_rows.append(main_row)
+
+                overall.add(scores, raw_overall)
+                rating_counts[rating] = rating_counts.get(rating, 0) + 1
+
+                counts = scene_counts.get(function_type)
+                if counts is None:
+                    counts = scene_counts[function_type] = [0, 0, 0, 0, 0]
+                if rating in SCENE_RATINGS:
+                    counts[SCENE_RATINGS.index(rating)] += 1
+                counts[4] += 1
+
+                if function_type:
+                    accumulator = scene_scores.get(function_type)
+                    if accumulator is None:
+                        accumulator = scene_scores[function_type] = _ScoreAccumulator()
+                    accumulator.add(scores, raw_overall)
+                    if is_takeover:
+                        takeover_records.append((function_type, timestamp))
+
+                if timestamp is not None:
+                    if min_timestamp is None or _sort_key(timestamp) < _sort_key(min_timestamp):
+                        min_timestamp = timestamp
+                    if max_timestamp is None or _sort_key(timestamp) > _sort_key(max_timestamp):
+                        max_timestamp = timestamp
+
+            cursor.execute(f"SELECT id, timestamp, status FROM activity_sessions {where} ORDER BY id", params)
+            sessions = cursor.fetchall()
+
+        main_rows.append(self._average_row(overall))
+        logger.info(f"报表引擎单次扫描完成: {overall.count}条记录，{len(sessions)}条活动状态")
+
+        return [
+            {"data": main_rows, "name": "main_data"},
+            {"data": self._rating_statistics(rating_counts, overall.count), "name": "rating_statistics"},
+            {"data": self._scene_rating_statistics(scene_counts), "name": "scene_rating_statistics"},
+            {"data": self._avg_statistics(scene_scores), "name": "avg_statistics"},
+            {"data": self._takeover_statistics(takeover_records, sessions, min_timestamp, max_timestamp),
+             "name": "takeover_statistics"},
+        ]
+
+    @staticmethod
+    def _average_row(overall: _ScoreAccumulator) -> Dict[str, Any]:
+        """main.sql末尾的平均分行"""
+        averages = overall.averages()
+        row = {'timestamp': '', 'original_text': '', 'comment': '', 'function_type': '平均分'}
+        for (_, label), average in zip(SCORE_COLUMNS, averages):
+            row[label] = average
+        row['评价'] = ''
+        row['平均'] = averages[-1]
+        row['是否剪辑'] = ''
+        return row
+
+    @staticmethod
+    def _rating_statistics(rating_counts: Dict[Any, int], total: int) -> List[Dict[str, Any]]:
+        """rating_statistics.sql：各评级数量和比例，最后为总计"""
+        rows = [{'评级': rating, '数量': count, '比例': sql_real_text(sql_round(count * 100.0 / total, 1)) + '%'}
+                for rating, count in sorted(rating_counts.items(), key=lambda item: _sort_key(item[0]))]
+        rows.append({'评级': '总计', '数量': total, '比例': '100.0%'})
+        return rows
+
+    @staticmethod
+    def _scene_rating_statistics(scene_counts: Dict[Any, List[int]]) -> List[Dict[str, Any]]:
+        """scene_rating_statistics.sql：各场景的评级占比"""
+        rows = []
+        for function_type in sorted(scene_counts, key=_sort_key):
+            counts = scene_counts[function_type]
+            row = {'function_type': function_type}
+            for index, rating in enumerate(SCENE_RATINGS):
+                row[rating] = sql_real_text(sql_round(counts[index] * 100.0 / counts[4], 2)) + '%'
+            row['场景总数'] = counts[4]
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _avg_statistics(scene_scores: Dict[Any, _ScoreAccumulator]) -> List[Dict[str, Any]]:
+        """avg_statistics.sql：各场景各评分项的平均分"""
+        rows = []
+        for function_type in sorted(scene_scores, key=_sort_key):
+            accumulator = scene_scores[function_type]
+            averages = accumulator.averages()
+            row = {'功能类型': function_type}
+            for (_, label), average in zip(SCORE_COLUMNS, averages):
+                row[label] = average
+            row['总体平均分'] = averages[-1]
+            row['记录数量'] = accumulator.count
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _activity_periods(sessions: List[Tuple]) -> List[Tuple[Any, Any, Optional[float]]]:
+        """
+        takeover_statistics.sql的activity_periods：每个start与其后时间戳更晚、ID最小的end配对
+
+        Returns:
+            [(开始时间, 结束时间, 时长分钟)]
+        """
+        ends = sorted((_sort_key(timestamp), session_id, timestamp)
+                      for session_id, timestamp, status in sessions if status == 'end')
+        # 按时间戳从后往前累计"时间戳不早于该位置的end中的最小ID"
+        suffix_min = [None] * (len(ends) + 1)
+        for index in range(len(ends) - 1, -1, -1):
+            candidate = (ends[index][1], ends[index][2])
+            following = suffix_min[index + 1]
+            suffix_min[index] = candidate if following is None or candidate[0] < following[0] else following
+
+        periods = []
+        keys = [end[0] for end in ends]
+        for _, start_time, status in sessions:
+            if status != 'start':
+                continue
+            matched = suffix_min[bisect.bisect_right(keys, _sort_key(start_time))]
+            if matched is not None:
+                end_time = matched[1]
+                periods.append((start_time, end_time, _minutes_between(start_time, end_time)))
+        return periods
+
+    def _takeover_statistics(self, takeover_records: List[Tuple[Any, Any]], sessions: List[Tuple],
+                             min_timestamp: Any, max_timestamp: Any) -> List[Dict[str, Any]]:
+        """接管统计：有活动状态时按takeover_statistics.sql，否则按takeover_statistics_simple.sql"""
+        if sessions:
+            periods = self._activity_periods(sessions)
+            total_minutes = sum(duration for _, _, duration in periods if duration is not None)
+            duration = sql_round(total_minutes, 2)
+            intervals = self._merge_intervals((_sort_key(start), _sort_key(end)) for start, end, _ in periods)
+            starts = [start for start, _ in intervals]
+            counts: Dict[Any, int] = {}
+            for function_type, timestamp in takeover_records:
+                key = _sort_key(timestamp)
+                position = bisect.bisect_right(starts, key) - 1
+                if timestamp is not None and position >= 0 and key <= intervals[position][1]:
+                    counts[function_type] = counts.get(function_type, 0) + 1
+            interval_minutes = total_minutes
+        else:
+            duration = (_minutes_between(min_timestamp, max_timestamp)
+                        if min_timestamp is not None else None)
+            counts = {}
+            for function_type, _ in takeover_records:
+                counts[function_type] = counts.get(function_type, 0) + 1
+            interval_minutes = duration
+
+        rows = []
+        for function_type in sorted(counts, key=_sort_key):
+            count = counts[function_type]
+            average_interval = (sql_round(interval_minutes / count, 2)
+                                if interval_minutes is not None and interval_minutes > 0 else 0)
+            rows.append({'接管类型': function_type, '接管次数': count,
+                         '平均间隔时间_分钟': average_interval, '总时长_分钟': duration})
+        if rows:
+            total_count = sum(counts.values())
+            rows.append({'接管类型': '总计', '接管次数': total_count,
+                         '平均间隔时间_分钟': (sql_round(duration / total_count, 2)
+                                        if duration is not None and duration > 0 else 0),
+                         '总时长_分钟': duration})
+        return rows
+
+    @staticmethod
+    def _merge_intervals(intervals) -> List[List]:
+        """合并重叠的闭区间，便于对每条记录二分查找是否落在任一活动时段内"""
+        merged: List[List] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        return merged
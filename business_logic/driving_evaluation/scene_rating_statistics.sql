@@ -1,18 +1,22 @@
+-- 按function_type统计各评级的占比（参数 :task_id）
+-- 读取触发器增量维护的record_aggregates汇总表，开销只与分组数有关
+
 SELECT 
     function_type,
     ROUND(
-        (COUNT(CASE WHEN rating = 'pos' THEN 1 END) * 100.0 / COUNT(*)), 2
+        (SUM(CASE WHEN rating = 'pos' THEN record_count ELSE 0 END) * 100.0 / SUM(record_count)), 2
     ) || '%' as pos,
     ROUND(
-        (COUNT(CASE WHEN rating = 'avg' THEN 1 END) * 100.0 / COUNT(*)), 2
+        (SUM(CASE WHEN rating = 'avg' THEN record_count ELSE 0 END) * 100.0 / SUM(record_count)), 2
     ) || '%' as avg,
     ROUND(
-        (COUNT(CASE WHEN rating = 'neg' THEN 1 END) * 100.0 / COUNT(*)), 2
+        (SUM(CASE WHEN rating = 'neg' THEN record_count ELSE 0 END) * 100.0 / SUM(record_count)), 2
     ) || '%' as neg,
     ROUND(
-        (COUNT(CASE WHEN rating = 'bad' THEN 1 END) * 100.0 / COUNT(*)), 2
+        (SUM(CASE WHEN rating = 'bad' THEN record_count ELSE 0 END) * 100.0 / SUM(record_count)), 2
     ) || '%' as bad,
-    COUNT(*) as 场景总数
-FROM processed_records 
+    SUM(record_count) as 场景总数
+FROM record_aggregates 
+WHERE task_id = :task_id
 GROUP BY function_type 
 ORDER BY function_type;
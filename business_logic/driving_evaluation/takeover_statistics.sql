@@ -1,45 +1,110 @@
 -- 接管统计查询 - 按接管类型分别统计
 -- 计算每种接管类型的次数、平均间隔和总时长
+-- 参数 :task_id - 只统计该任务的记录和活动状态
+--
+-- 开始/结束状态的配对、活动时段的合并和接管记录的归属都通过按时间排序的窗口函数完成，
+-- 每个步骤只需一次排序扫描（不再对每个start做相关子查询、对每条接管记录扫描全部活动时段）
 
-WITH activity_periods AS (
+WITH session_events AS (
+    -- 当前任务的开始/结束状态
+    SELECT id, timestamp, status
+    FROM activity_sessions
+    WHERE task_id = :task_id
+    AND status IN ('start', 'end')
+    AND timestamp IS NOT NULL
+),
+start_sessions AS (
+    -- 按时间倒序累计"之后的end中ID最小者"：同一时间戳的start排在end之前，
+    -- 因此每个start取到的是时间戳严格更晚的end中ID最小的一个
+    SELECT 
+        status,
+        timestamp as start_time,
+        MIN(CASE WHEN status = 'end' THEN id END) OVER (
+            ORDER BY timestamp DESC, status = 'end'
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) as end_id
+    FROM session_events
+),
+activity_periods AS (
     -- 计算活动时段
     SELECT 
-        start_session.timestamp as start_time,
+        ss.start_time,
         end_session.timestamp as end_time,
         ROUND(
-            (julianday(end_session.timestamp) - julianday(start_session.timestamp)) * 24 * 60, 2
+            (julianday(end_session.timestamp) - julianday(ss.start_time)) * 24 * 60, 2
         ) as duration_minutes
-    FROM activity_sessions start_session
-    JOIN activity_sessions end_session ON 
-        start_session.status = 'start' 
-        AND end_session.status = 'end'
-        AND end_session.timestamp > start_session.timestamp
-        AND end_session.id = (
-            SELECT MIN(id) 
-            FROM activity_sessions 
-            WHERE status = 'end' 
-            AND timestamp > start_session.timestamp
-        )
+    FROM start_sessions ss
+    JOIN activity_sessions end_session ON end_session.id = ss.end_id
+    WHERE ss.status = 'start'
 ),
 total_active_time AS (
     -- 计算总活动时间
     SELECT COALESCE(SUM(duration_minutes), 0) as total_minutes
     FROM activity_periods
 ),
+period_bounds AS (
+    -- 按开始时间排序，取之前各时段的最晚结束时间
+    SELECT 
+        start_time,
+        end_time,
+        MAX(end_time) OVER (
+            ORDER BY start_time, end_time
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) as previous_end
+    FROM activity_periods
+),
+period_groups AS (
+    -- 与之前的时段不相交时开始新的合并区间
+    SELECT 
+        start_time,
+        end_time,
+        SUM(CASE WHEN previous_end IS NULL OR start_time > previous_end THEN 1 ELSE 0 END) OVER (
+            ORDER BY start_time, end_time
+            ROWS UNBOUNDED PRECEDING
+        ) as group_no
+    FROM period_bounds
+),
+covered_ranges AS (
+    -- 合并后互不相交的活动区间
+    SELECT MIN(start_time) as start_time, MAX(end_time) as end_time
+    FROM period_groups
+    GROUP BY group_no
+),
+takeover_timeline AS (
+    -- 活动区间起点和接管记录按时间合并排序，同一时间点区间起点在前
+    SELECT start_time as point_time, 0 as point_kind, end_time, NULL as function_type
+    FROM covered_ranges
+
+    UNION ALL
+
+    SELECT timestamp, 1, NULL, function_type
+    FROM processed_records
+    WHERE task_id = :task_id
+    AND is_takeover = 1
+),
+takeover_coverage AS (
+    -- 区间互不相交，每条接管记录之前起点的区间中结束时间最晚的即为可能包含它的区间
+    SELECT 
+        point_kind,
+        point_time,
+        function_type,
+        MAX(end_time) OVER (
+            ORDER BY point_time, point_kind
+            ROWS UNBOUNDED PRECEDING
+        ) as covering_end
+    FROM takeover_timeline
+),
 takeover_by_type AS (
-    -- 按接管类型统计
+    -- 按接管类型统计活动区间内的接管记录
     SELECT 
-        pr.function_type as 接管类型,
+        tc.function_type as 接管类型,
         COUNT(*) as 接管次数,
         tat.total_minutes as 总活动时间
-    FROM processed_records pr
+    FROM takeover_coverage tc
     CROSS JOIN total_active_time tat
-    WHERE pr.function_type LIKE '%接管%'
-    AND EXISTS (
-        SELECT 1 FROM activity_periods ap
-        WHERE pr.timestamp BETWEEN ap.start_time AND ap.end_time
-    )
-    GROUP BY pr.function_type, tat.total_minutes
+    WHERE tc.point_kind = 1
+    AND tc.point_time <= tc.covering_end
+    GROUP BY tc.function_type, tat.total_minutes
 ),
 takeover_stats AS (
     -- 计算每种接管类型的统计数据
@@ -1,5 +1,6 @@
 -- 简化的接管统计查询 - 当活动表为空时使用
 -- 基于主表的第一条和最后一条数据计算时间范围，然后统计接管次数
+-- 参数 :task_id - 只统计该任务的记录
 
 WITH time_range AS (
     -- 获取主表数据的时间范围
@@ -10,7 +11,8 @@ WITH time_range AS (
             (julianday(MAX(timestamp)) - julianday(MIN(timestamp))) * 24 * 60, 2
         ) as duration_minutes
     FROM processed_records
-    WHERE timestamp IS NOT NULL
+    WHERE task_id = :task_id
+    AND timestamp IS NOT NULL
 ),
 takeover_by_type AS (
     -- 按接管类型统计
@@ -20,7 +22,8 @@ takeover_by_type AS (
         tr.duration_minutes as 总时长_分钟
     FROM processed_records pr
     CROSS JOIN time_range tr
-    WHERE pr.function_type LIKE '%接管%'
+    WHERE pr.task_id = :task_id
+    AND pr.is_takeover = 1
     GROUP BY pr.function_type, tr.duration_minutes
 ),
 takeover_stats AS (
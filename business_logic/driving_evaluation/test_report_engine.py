@@ -0,0 +1,103 @@
+"""
+报表引擎一致性测试脚本
+在测试数据库中写入随机任务数据，验证单次扫描报表引擎生成的五个sheet与逐个执行统计SQL的结果完全一致
+"""
+import sys
+import uuid
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from config_manager import get_config
+from database.connection import get_db_manager
+from business_logic.driving_evaluation.processor import DrivingEvaluationProcessor
+from business_logic.driving_evaluation.report_engine import ReportEngine
+
+TEST_DB_PATH = './data/test_voiceapi_flow.db'
+
+_FUNCTIONS = ["跟车", "变道", "左转", "复杂路口", "导航变道", "危险接管", "车机接管", "人为接管", "", None]
+_RATINGS = ["pos", "avg", "neg", "bad", None]
+
+
+def _populate(db_manager, task_id: str, rows: int, with_sessions: bool, seed: int) -> None:
+    """写入随机处理记录和（可选的）开始/结束状态，活动状态中包含缺少结束、重复开始和多余结束的情况"""
+    rng = random.Random(seed)
+    start = datetime(2025, 3, 1, 9, 0, 0)
+
+    def timestamp(seconds: int) -> str:
+        return (start + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+    records = []
+    for i in range(rows):
+        scores = [rng.randint(0, 10) if rng.random() > 0.05 else None for _ in range(7)]
+        records.append((task_id, timestamp(7 * i + rng.randint(0, 5)), f"语句{i}", f"评论{i}",
+                        rng.choice(_FUNCTIONS), *scores, rng.choice(_RATINGS), rng.choice(["是", "否"])))
+    db_manager.execute_many_insert(
+        "INSERT INTO processed_records (task_id, timestamp, original_text, comment, function_type, mental_load, "
+        "predictability, timely_response, comfort, efficiency, features, safety, rating, is_clipped) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        records
+    )
+
+    if not with_sessions:
+        return
+    sessions = []
+    for segment_start in range(0, 7 * rows, 300):
+        begin = segment_start + rng.randint(0, 60)
+        finish = segment_start + rng.randint(150, 290)
+        roll = rng.random()
+        sessions.append((task_id, timestamp(begin), '', 'start', ''))
+        if roll < 0.1:
+            continue
+        if roll < 0.2:
+            sessions.append((task_id, timestamp(begin + 5), '', 'start', ''))
+        sessions.append((task_id, timestamp(finish), '', 'end', ''))
+        if roll > 0.9:
+            sessions.append((task_id, timestamp(finish + 5), '', 'end', ''))
+    db_manager.execute_many_insert(
+        "INSERT INTO activity_sessions (task_id, timestamp, original_text, status, comment) VALUES (?, ?, ?, ?, ?)",
+        sessions
+    )
+
+
+def _check_parity(with_sessions: bool, seed: int) -> None:
+    db_manager = get_db_manager(TEST_DB_PATH)
+    config = get_config()
+    processor = DrivingEvaluationProcessor(config, config.task)
+    processor.task_id = f"parity_{uuid.uuid4().hex[:8]}"
+    try:
+        _populate(db_manager, processor.task_id, 300, with_sessions, seed)
+
+        engine_data = ReportEngine(db_manager).build(processor.task_id)
+        sql_data = [processor._get_main_data(), processor._get_rating_statistics(),
+                    processor._get_scene_rating_statistics(), processor._get_avg_statistics(),
+                    processor._get_takeover_statistics()]
+
+        for engine_sheet, sql_sheet in zip(engine_data, sql_data):
+            assert 'error' not in sql_sheet, sql_sheet.get('error')
+            assert engine_sheet['name'] == sql_sheet['name']
+            assert engine_sheet['data'] == sql_sheet['data'], f"{engine_sheet['name']}不一致"
+        assert len(engine_data) == len(sql_data)
+    finally:
+        for table_name in ("processed_records", "activity_sessions"):
+            processor.data_service.delete_task_data_from_table(table_name, processor.task_id)
+
+
+def test_report_engine_matches_sql():
+    """测试有开始/结束状态时报表引擎与统计SQL结果一致"""
+    for seed in range(3):
+        _check_parity(with_sessions=True, seed=seed)
+
+
+def test_report_engine_matches_sql_without_sessions():
+    """测试没有开始/结束状态（简化接管统计）时报表引擎与统计SQL结果一致"""
+    _check_parity(with_sessions=False, seed=0)
+
+
+if __name__ == "__main__":
+    test_report_engine_matches_sql()
+    test_report_engine_matches_sql_without_sessions()
+    print("✅ 报表引擎与统计SQL结果一致")
@@ -0,0 +1,51 @@
+"""
+语句去重测试脚本
+验证精确分组、近似合并，以及含义不同的近似语句不会被合并
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from business_logic.driving_evaluation.utterance_dedup import UtteranceDeduplicator
+
+
+def test_exact_grouping():
+    """测试规范化后相同的语句（标点、空白、全半角不同）分为一组"""
+    deduplicator = UtteranceDeduplicator()
+    groups = deduplicator.group(["开始测试", "开始测试。", "左转 总分六分", "左转，总分六分", "结束测试"])
+    assert groups == [[0, 1], [2, 3], [4]]
+
+
+def test_fuzzy_merges_inserted_characters():
+    """测试近似匹配合并只多出少量字符（语气词、重复字）的语句"""
+    deduplicator = UtteranceDeduplicator(fuzzy=True)
+    groups = deduplicator.group([
+        "左转复杂路口犹豫总分六分小分效率性五分剪辑",
+        "嗯左转复杂路口犹豫总分六分小分效率性五分剪辑",
+        "左转复杂路口犹豫总分七分小分效率性五分剪辑",
+    ])
+    assert groups == [[0, 1], [2]]
+
+
+def test_fuzzy_keeps_different_function_keywords_apart():
+    """测试功能关键词不同的语句（左转/右转）不会合并"""
+    deduplicator = UtteranceDeduplicator(fuzzy=True)
+    groups = deduplicator.group(["左转复杂路口犹豫总分六分", "右转复杂路口犹豫总分六分"])
+    assert groups == [[0], [1]]
+
+
+def test_fuzzy_keeps_substituted_characters_apart():
+    """测试替换了字符的语句（过近/过远）不会合并"""
+    deduplicator = UtteranceDeduplicator(fuzzy=True, max_edit_ratio=0.2)
+    groups = deduplicator.group(["跟车距离过近总分五分安全性四分", "跟车距离过远总分五分安全性四分"])
+    assert groups == [[0], [1]]
+
+
+if __name__ == "__main__":
+    test_exact_grouping()
+    test_fuzzy_merges_inserted_characters()
+    test_fuzzy_keeps_different_function_keywords_apart()
+    test_fuzzy_keeps_substituted_characters_apart()
+    print("✅ 语句去重测试通过")
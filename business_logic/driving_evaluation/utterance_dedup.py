@@ -0,0 +1,165 @@
+"""
+语句去重模块
+按住说话录音中常出现完全相同或几乎相同的重复语句（重录、"开始测试"等状态语），
+AI处理前先按规范化文本分组，每组只调用一次模型，结果再分发回组内各行
+"""
+import re
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from ai_service.ai_cache import normalize_text
+from ai_service.rule_extractor import load_function_keywords
+
+logger = logging.getLogger(__name__)
+
+# 数字字符（阿拉伯数字和中文数字），近似匹配要求两句中的数字完全一致，避免"总分6分"与"总分7分"被合并
+_DIGIT_CHARS = frozenset("0123456789零〇一二两三四五六七八九十百")
+
+
+def _digit_signature(text: str) -> str:
+    """提取文本中的数字字符序列"""
+    return "".join(ch for ch in text if ch in _DIGIT_CHARS)
+
+
+def is_subsequence(short: str, long: str) -> bool:
+    """short中的字符是否按顺序全部出现在long中（long只比short多出若干字符）"""
+    remaining = iter(long)
+    return all(ch in remaining for ch in short)
+
+
+class UtteranceDeduplicator:
+    """语句去重器 - 规范化文本精确分组，可选合并只多出少量字符的近似语句"""
+
+    def __init__(self, fuzzy: bool = False, max_edit_ratio: float = 0.1, min_fuzzy_length: int = 6,
+                 function_keywords: Optional[Iterable[str]] = None):
+        """
+        初始化去重器
+
+        近似匹配只合并"较长语句比较短语句多出若干字符、其余字符按顺序一致"的语句（重复词、语气词），
+        不合并替换了字符的语句（"左转"与"右转"、"过近"与"过远"）；同时要求两句的数字和功能关键词完全一致
+
+        Args:
+            fuzzy: 是否启用近似匹配
+            max_edit_ratio: 近似匹配允许多出的字符数占较长文本长度的比例
+            min_fuzzy_length: 参与近似匹配的最短文本长度（短语句差一个字含义可能完全不同）
+            function_keywords: 功能关键词，默认读取系统提示词中的function_keywords
+        """
+        self.fuzzy = fuzzy
+        self.max_edit_ratio = max_edit_ratio
+        self.min_fuzzy_length = min_fuzzy_length
+
+        self._keyword_pattern = None
+        if fuzzy:
+            keywords = function_keywords if function_keywords is not None else load_function_keywords()
+            # 与规范化后的文本比较；长关键词优先，"导航变道"不会被拆成"导航"+"变道"
+            keywords = sorted({normalize_text(k) for k in keywords if k}, key=len, reverse=True)
+            if keywords:
+                self._keyword_pattern = re.compile("|".join(re.escape(k) for k in keywords))
+        self.reset()
+
+    def reset(self) -> None:
+        """清空已见过的语句"""
+        self._exact: Dict[str, int] = {}
+        # 近似匹配候选：(数字签名, 功能关键词签名) -> 文本长度 -> [(规范化文本, 字符集合, 组号)]
+        self._candidates: Dict[Tuple[str, str], Dict[int, List[Tuple[str, FrozenSet[str], int]]]] = {}
+        self._group_count = 0
+
+    def assign(self, text: str) -> Tuple[int, bool]:
+        """
+        增量分配语句所属的组（流式处理时逐行调用）
+
+        Args:
+            text: 原始语句
+
+        Returns:
+            (组号, 是否为新组)；组号按首次出现的顺序从0开始
+        """
+        normalized = normalize_text(text)
+        group_id = self._exact.get(normalized)
+        if group_id is not None:
+            return group_id, False
+
+        buckets = None
+        if self.fuzzy and len(normalized) >= self.min_fuzzy_length:
+            buckets = self._candidates.setdefault(self._signature(normalized), {})
+            group_id = self._find_similar(normalized, buckets)
+            if group_id is not None:
+                self._exact[normalized] = group_id
+                return group_id, False
+
+        group_id = self._group_count
+        self._group_count += 1
+        self._exact[normalized] = group_id
+        if buckets is not None:
+            buckets.setdefault(len(normalized), []).append((normalized, frozenset(normalized), group_id))
+        return group_id, True
+
+    def group(self, texts: List[str]) -> List[List[int]]:
+        """
+        对语句分组
+
+        Args:
+            texts: 原始语句列表
+
+        Returns:
+            分组列表，每组为原始下标列表；组按首次出现的顺序排列，组内第一个下标为代表语句
+        """
+        self.reset()
+        groups: List[List[int]] = []
+        for index, text in enumerate(texts):
+            group_id, is_new = self.assign(text)
+            if is_new:
+                groups.append([])
+            groups[group_id].append(index)
+        return groups
+
+    def _signature(self, normalized: str) -> Tuple[str, str]:
+        """近似匹配的分桶键：数字序列和出现的功能关键词集合，两者都一致的语句才可能合并"""
+        keywords = ""
+        if self._keyword_pattern is not None:
+            keywords = "|".join(sorted(set(self._keyword_pattern.findall(normalized))))
+        return _digit_signature(normalized), keywords
+
+    def _find_similar(self, normalized: str,
+                      buckets: Dict[int, List[Tuple[str, FrozenSet[str], int]]]) -> Optional[int]:
+        """
+        在同一分桶的候选代表语句中查找只差若干插入字符的一组，多出字符最少的优先
+
+        候选按文本长度分组，只检查长度差在阈值内的组；逐字比较前先用字符集合的包含关系快速排除
+        """
+        size = len(normalized)
+        chars = frozenset(normalized)
+        # 多出的字符数不超过较长文本长度×max_edit_ratio，较长的候选最多比当前语句长 size×r/(1-r)
+        ratio = min(self.max_edit_ratio, 0.5)
+        for extra in range(1, int(size * ratio / (1 - ratio)) + 1):
+            for length in (size - extra, size + extra):
+                if extra > int(max(length, size) * ratio):
+                    continue
+                shorter = length < size
+                for candidate, candidate_chars, group_id in buckets.get(length, ()):
+                    if not (candidate_chars <= chars if shorter else chars <= candidate_chars):
+                        continue
+                    short, long = (candidate, normalized) if shorter else (normalized, candidate)
+                    if is_subsequence(short, long):
+                        return group_id
+        return None
+
+
+def create_deduplicator_from_config(task_config: Optional[Dict]) -> Optional[UtteranceDeduplicator]:
+    """
+    根据task.dedup配置创建去重器
+
+    Args:
+        task_config: 任务配置
+
+    Returns:
+        去重器，未启用时返回None
+    """
+    dedup_config = (task_config or {}).get('dedup') or {}
+    if not dedup_config.get('enabled', False):
+        return None
+    return UtteranceDeduplicator(
+        fuzzy=dedup_config.get('fuzzy', False),
+        max_edit_ratio=dedup_config.get('max_edit_ratio', 0.1),
+        min_fuzzy_length=dedup_config.get('min_fuzzy_length', 6)
+    )
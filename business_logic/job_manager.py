@@ -0,0 +1,286 @@
+"""
+后台任务管理
+将耗时的任务流程（如/ai-process-excel的完整AI处理流程）放到后台线程执行，
+提供任务进度（当前步骤、已处理行数、预计剩余时间、各步骤耗时）、状态查询和取消
+"""
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# 保留的历史任务数
+_MAX_JOBS = 50
+
+
+class TaskCancelledError(Exception):
+    """任务被取消"""
+    pass
+
+
+class TaskProgress:
+    """
+    任务进度报告器
+
+    任务流程在步骤开始/结束和每处理一行时调用，同时检查取消标记；
+    未传入时流程使用不带回调的默认实例，行为与同步调用一致
+    """
+
+    def __init__(self, on_change: Optional[Callable[[], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        """
+        初始化进度报告器
+
+        Args:
+            on_change: 进度变化时的回调
+            cancel_event: 取消标记，被设置后下一次进度报告抛出TaskCancelledError
+        """
+        self._on_change = on_change
+        self._cancel_event = cancel_event
+        self._lock = threading.Lock()
+
+        self.current_step = None
+        self.rows_done = 0
+        self.rows_total = 0
+        self.step_timings: Dict[str, float] = {}
+        self._step_started_at = None
+        self._rows_started_at = None
+
+    def check_cancelled(self) -> None:
+        """检查取消标记"""
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise TaskCancelledError("任务已取消")
+
+    def start_step(self, step_name: str) -> None:
+        """开始一个步骤"""
+        self.check_cancelled()
+        with self._lock:
+            self.current_step = step_name
+            self._step_started_at = time.perf_counter()
+        self._notify()
+
+    def finish_step(self, step_name: str) -> None:
+        """结束一个步骤并记录耗时"""
+        with self._lock:
+            if self._step_started_at is not None:
+                self.step_timings[step_name] = round(time.perf_counter() - self._step_started_at, 3)
+            self._step_started_at = None
+        self._notify()
+
+    def update_rows(self, rows_done: int, rows_total: int) -> None:
+        """更新已处理行数"""
+        self.check_cancelled()
+        with self._lock:
+            if self._rows_started_at is None or rows_done == 0:
+                self._rows_started_at = time.perf_counter()
+            self.rows_done = rows_done
+            self.rows_total = rows_total
+        self._notify()
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """按已处理行的平均速度估算剩余时间"""
+        with self._lock:
+            if not self.rows_done or self._rows_started_at is None or self.rows_done >= self.rows_total:
+                return None
+            elapsed = time.perf_counter() - self._rows_started_at
+            return round(elapsed / self.rows_done * (self.rows_total - self.rows_done), 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """进度快照"""
+        eta_seconds = self.eta_seconds
+        with self._lock:
+            return {
+                "current_step": self.current_step,
+                "rows_done": self.rows_done,
+                "rows_total": self.rows_total,
+                "eta_seconds": eta_seconds,
+                "step_timings": dict(self.step_timings),
+            }
+
+    def _notify(self) -> None:
+        if self._on_change is not None:
+            self._on_change()
+
+
+class Job:
+    """后台任务"""
+
+    def __init__(self, name: str, params: Optional[Dict[str, Any]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.params = params or {}
+        self.status = JOB_PENDING
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        # 每次状态或进度变化时递增，供推送接口判断是否有更新（任务线程写、事件循环读，加锁保护）
+        self._version = 0
+        self._version_lock = threading.Lock()
+        self.progress = TaskProgress(on_change=self.touch, cancel_event=self.cancel_event)
+
+    @property
+    def version(self) -> int:
+        with self._version_lock:
+            return self._version
+
+    def touch(self) -> None:
+        """标记任务有更新"""
+        with self._version_lock:
+            self._version += 1
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态字典"""
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": elapsed,
+            "progress": self.progress.snapshot(),
+            "result": self.result,
+            "error": self.error,
+            "version": self.version,
+        }
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self, max_workers: int = 1):
+        """
+        初始化任务管理器
+
+        Args:
+            max_workers: 同时执行的任务数（模型推理是瓶颈，默认串行执行）
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func: Callable[[TaskProgress], Dict[str, Any]],
+               params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        提交后台任务
+
+        Args:
+            name: 任务名称
+            func: 任务函数，接收进度报告器，返回包含success和error字段的结果字典
+            params: 任务参数（仅用于展示）
+
+        Returns:
+            任务对象
+        """
+        job = Job(name, params)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_locked()
+        self._executor.submit(self._run, job, func)
+        logger.info(f"后台任务已提交: {name} ({job.job_id})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """获取任务，不存在返回None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        取消任务：排队中的任务直接取消，运行中的任务在下一次进度报告时停止
+
+        Returns:
+            任务对象，不存在返回None
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if job.status == JOB_PENDING:
+            self._finish(job, JOB_CANCELLED, error="任务已取消")
+        job.touch()
+        logger.info(f"后台任务取消请求: {job.name} ({job_id})")
+        return job
+
+    def _run(self, job: Job, func: Callable[[TaskProgress], Dict[str, Any]]) -> None:
+        """在工作线程中执行任务"""
+        if job.cancel_event.is_set():
+            return
+
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        job.touch()
+
+        try:
+            result = func(job.progress)
+        except TaskCancelledError:
+            self._finish(job, JOB_CANCELLED, error="任务已取消")
+            return
+        except Exception as e:
+            logger.error(f"后台任务执行失败: {job.name} ({job.job_id}): {e}")
+            self._finish(job, JOB_FAILED, error=str(e))
+            return
+
+        result = result or {}
+        if result.get('cancelled'):
+            self._finish(job, JOB_CANCELLED, result=result, error=result.get('error'))
+        elif result.get('success', True):
+            self._finish(job, JOB_SUCCEEDED, result=result)
+        else:
+            self._finish(job, JOB_FAILED, result=result, error=result.get('error'))
+
+    @staticmethod
+    def _finish(job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.touch()
+        logger.info(f"后台任务结束: {job.name} ({job.job_id}) -> {status}")
+
+    def _prune_locked(self) -> None:
+        """只保留最近的已结束任务（调用方需持有锁）"""
+        while len(self._jobs) > _MAX_JOBS:
+            oldest_id = next((job_id for job_id, job in self._jobs.items() if job.finished), None)
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+
+
+# 全局任务管理器实例
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """获取全局任务管理器实例"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
@@ -29,6 +29,14 @@ class AIConfig:
     max_retries: int
     options: Optional[Dict[str, Any]]
     endpoints: Optional[Dict[str, Any]]  # 端点配置（包含API密钥）
+    cache: Optional[Dict[str, Any]] = None  # AI结果缓存配置
+    rule_fast_path: bool = False  # 是否启用规则快速解析
+    keep_alive: Optional[Any] = None  # Ollama模型保活时长
+    structured_output: bool = False  # 是否启用结构化（JSON Schema约束）输出
+    streaming: Optional[Dict[str, Any]] = None  # 流式输出配置
+    resilience: Optional[Dict[str, Any]] = None  # 重试、对冲和熔断配置
+    load_balancing: Optional[Dict[str, Any]] = None  # 多端点负载均衡配置
+    health_check: Optional[Dict[str, Any]] = None  # 后台健康探测配置
 
 @dataclass
 class ServerConfig:
@@ -68,6 +76,7 @@ class LoggingConfig:
     level: str
     format: str
     log_file: Optional[str]
+    ai_process_log: Optional[Dict[str, Any]] = None  # AI处理日志（JSONL）写入配置
 
 @dataclass
 class ProcessingConfig:
@@ -270,7 +279,15 @@ class Config:
             timeout=ai_data['timeout'],
             max_retries=ai_data['max_retries'],
             options=ai_data['options'],
-            endpoints=ai_data['endpoints']  # 端点配置现在包含API密钥
+            endpoints=ai_data['endpoints'],  # 端点配置现在包含API密钥
+            cache=ai_data.get('cache'),
+            rule_fast_path=ai_data.get('rule_fast_path', False),
+            keep_alive=ai_data.get('keep_alive'),
+            structured_output=ai_data.get('structured_output', False),
+            streaming=ai_data.get('streaming'),
+            resilience=ai_data.get('resilience'),
+            load_balancing=ai_data.get('load_balancing'),
+            health_check=ai_data.get('health_check')
         )
     
     @property
@@ -404,7 +421,8 @@ class Config:
         return LoggingConfig(
             level=log_data['level'],
             format=log_data['format'],
-            log_file=log_data.get('log_file')
+            log_file=log_data.get('log_file'),
+            ai_process_log=log_data.get('ai_process_log')
         )
     
     @property
@@ -456,7 +474,14 @@ class Config:
         return {
             'name': task_data['name'],
             'default_filename_template': task_data['default_filename_template'],
-            'score_mapping': task_data['score_mapping']
+            'score_mapping': task_data['score_mapping'],
+            'realtime': task_data.get('realtime') or {},
+            'dedup': task_data.get('dedup') or {},
+            'checkpoint': task_data.get('checkpoint') or {},
+            'retention': task_data.get('retention') or {},
+            'batch': task_data.get('batch') or {},
+            'report': task_data.get('report') or {},
+            'insert_batch': task_data.get('insert_batch') or {}
         }
     
     @property
@@ -0,0 +1,150 @@
+"""
+任务断点存储
+按(任务目录, 行号)持久化每行的AI处理结果，任务中途失败（如模型服务在第400行宕机）后重新执行时，
+已成功的行直接复用断点结果，只有缺失和失败的行重新调用模型
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .connection import get_db_manager
+
+logger = logging.getLogger(__name__)
+
+# 默认每积累多少行写入一次
+DEFAULT_FLUSH_ROWS = 20
+
+
+class TaskCheckpointStore:
+    """任务断点表的读写"""
+
+    def __init__(self, db_path: str = None):
+        self.db_manager = get_db_manager(db_path)
+
+    def load(self, task_dir: str) -> Dict[int, Tuple[str, str]]:
+        """
+        读取任务中处理成功的行
+
+        Args:
+            task_dir: 任务目录名
+
+        Returns:
+            行号 -> (原始文本, AI结果)
+        """
+        rows = self.db_manager.execute_query(
+            "SELECT row_index, original_text, ai_result FROM task_checkpoints "
+            "WHERE task_dir = ? AND status = 'success'",
+            (task_dir,)
+        )
+        return {row['row_index']: (row['original_text'], row['ai_result']) for row in rows}
+
+    def save_many(self, task_dir: str, entries: List[Tuple[int, str, Optional[str], str, Optional[str]]]) -> None:
+        """
+        批量写入断点（单个事务），同一行重复写入时覆盖
+
+        Args:
+            task_dir: 任务目录名
+            entries: [(行号, 原始文本, AI结果, 状态, 错误信息)]
+        """
+        if not entries:
+            return
+        with self.db_manager.get_connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO task_checkpoints "
+                "(task_dir, row_index, original_text, ai_result, status, error_message, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+                [(task_dir, *entry) for entry in entries]
+            )
+            conn.commit()
+
+    def clear(self, task_dir: str) -> int:
+        """删除任务的所有断点，返回删除的行数"""
+        return self.db_manager.execute_update("DELETE FROM task_checkpoints WHERE task_dir = ?", (task_dir,))
+
+    def summary(self, task_dir: str) -> Dict[str, int]:
+        """按状态统计任务的断点行数"""
+        rows = self.db_manager.execute_query(
+            "SELECT status, COUNT(*) AS count FROM task_checkpoints WHERE task_dir = ? GROUP BY status",
+            (task_dir,)
+        )
+        return {row['status']: row['count'] for row in rows}
+
+
+class TaskCheckpoint:
+    """单个任务的断点读写器 - 启动时读取已成功的行，处理结果先缓冲，每flush_rows行写入一次"""
+
+    def __init__(self, task_dir: str, store: Optional[TaskCheckpointStore] = None,
+                 flush_rows: int = DEFAULT_FLUSH_ROWS):
+        """
+        初始化断点读写器
+
+        Args:
+            task_dir: 任务目录名
+            store: 断点存储，默认使用当前数据库
+            flush_rows: 每积累多少行写入一次
+        """
+        self.task_dir = task_dir
+        self.store = store or TaskCheckpointStore()
+        self.flush_rows = max(1, int(flush_rows))
+        self._completed = self.store.load(task_dir)
+        self._pending: List[Tuple[int, str, Optional[str], str, Optional[str]]] = []
+        if self._completed:
+            logger.info(f"任务{task_dir}存在断点，{len(self._completed)}行已处理成功，将直接复用")
+
+    @property
+    def completed_count(self) -> int:
+        """断点中处理成功的行数"""
+        return len(self._completed)
+
+    def get(self, row_index: int, original_text: str) -> Optional[str]:
+        """
+        获取行的断点结果
+
+        Returns:
+            该行上次处理成功的AI结果；没有断点或原始文本已改变时返回None
+        """
+        entry = self._completed.get(row_index)
+        if entry is None or entry[0] != original_text:
+            return None
+        return entry[1]
+
+    def record(self, row_index: int, original_text: str, ai_result: Optional[str],
+               status: str, error_message: Optional[str] = None) -> None:
+        """记录一行的处理结果（缓冲，满flush_rows行时写入）"""
+        self._pending.append((row_index, original_text, ai_result, status, error_message))
+        if len(self._pending) >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """写入缓冲的断点，写入失败只记录日志（断点不影响任务本身）"""
+        pending, self._pending = self._pending, []
+        try:
+            self.store.save_many(self.task_dir, pending)
+        except Exception as e:
+            logger.error(f"写入任务{self.task_dir}断点失败: {e}")
+
+    def clear(self) -> None:
+        """任务完成后删除断点"""
+        self._pending = []
+        self._completed = {}
+        try:
+            deleted = self.store.clear(self.task_dir)
+            logger.info(f"已删除任务{self.task_dir}的{deleted}条断点记录")
+        except Exception as e:
+            logger.error(f"删除任务{self.task_dir}断点失败: {e}")
+
+
+def create_checkpoint_from_config(task_dir: str, task_config: Optional[Dict[str, Any]]) -> Optional[TaskCheckpoint]:
+    """
+    根据task.checkpoint配置创建断点读写器
+
+    Args:
+        task_dir: 任务目录名
+        task_config: 任务配置
+
+    Returns:
+        断点读写器，未启用时返回None
+    """
+    checkpoint_config = (task_config or {}).get('checkpoint') or {}
+    if not checkpoint_config.get('enabled', False):
+        return None
+    return TaskCheckpoint(task_dir, flush_rows=checkpoint_config.get('flush_rows', DEFAULT_FLUSH_ROWS))
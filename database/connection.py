@@ -1,11 +1,15 @@
 """
 数据库连接管理
 提供单例模式的数据库连接和基础操作
+
+每个线程复用一个SQLite连接（不再每次操作都打开/关闭），sqlite3在连接上缓存已编译的语句，
+重复执行的统计SQL和插入语句不需要重新解析
 """
 import sqlite3
 import threading
+from itertools import islice
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, List, Sequence
 import logging
 from contextlib import contextmanager
 
@@ -13,6 +17,13 @@ from .models import DatabaseSchema
 
 logger = logging.getLogger(__name__)
 
+# 每个连接缓存的已编译语句数
+CACHED_STATEMENTS = 256
+# 其他进程/线程写入时等待锁的超时（秒）
+BUSY_TIMEOUT_SECONDS = 30.0
+# 批量插入时每次executemany的行数
+DEFAULT_INSERT_CHUNK_SIZE = 500
+
 class DatabaseManager:
     """数据库管理器 - 单例模式"""
     
@@ -31,6 +42,7 @@ class DatabaseManager:
             return
             
         self.db_path = db_path or './data/voiceapi_flow.db'
+        self._local = threading.local()
         self._initialized = True
         self._ensure_db_directory()
         self.init_database()
@@ -41,18 +53,32 @@ class DatabaseManager:
         db_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"数据库目录: {db_dir}")
     
+    def _thread_connection(self) -> sqlite3.Connection:
+        """获取当前线程的连接（首次使用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row  # 使结果可以按列名访问
+            self._local.conn = conn
+        return conn
+    
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使结果可以按列名访问
+        """获取数据库连接的上下文管理器（当前线程复用的连接，调用方负责提交）"""
+        conn = self._thread_connection()
         try:
             yield conn
         except Exception as e:
             conn.rollback()
             logger.error(f"数据库操作失败: {e}")
             raise
-        finally:
+    
+    def close_thread_connection(self) -> None:
+        """关闭当前线程的连接（线程结束时连接随线程局部变量一起释放，一般不需要调用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
             conn.close()
     
     def init_database(self):
@@ -62,11 +88,25 @@ class DatabaseManager:
                 # 创建表
                 conn.execute(DatabaseSchema.PROCESSED_RECORDS_TABLE)
                 conn.execute(DatabaseSchema.ACTIVITY_SESSIONS_TABLE)
+                conn.execute(DatabaseSchema.TASK_CHECKPOINTS_TABLE)
+                aggregates_exist = self._table_exists(conn, 'record_aggregates')
+                conn.execute(DatabaseSchema.RECORD_AGGREGATES_TABLE)
+                
+                # 补齐旧版本数据库缺少的列
+                self._migrate_columns(conn)
                 
                 # 创建索引
                 for index_sql in DatabaseSchema.INDEXES:
                     conn.execute(index_sql)
                 
+                # 创建维护统计汇总表的触发器，汇总表首次创建时按已有记录重建
+                for trigger_sql in DatabaseSchema.TRIGGERS:
+                    conn.execute(trigger_sql)
+                if not aggregates_exist:
+                    for rebuild_sql in DatabaseSchema.RECORD_AGGREGATES_REBUILD:
+                        conn.execute(rebuild_sql)
+                    logger.info("统计汇总表已按已有记录重建")
+                
                 conn.commit()
                 logger.info(f"数据库初始化完成: {self.db_path}")
                 
@@ -74,6 +114,22 @@ class DatabaseManager:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    @staticmethod
+    def _table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+        """表是否已存在"""
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+        return row is not None
+    
+    @staticmethod
+    def _migrate_columns(conn: sqlite3.Connection) -> None:
+        """为旧版本数据库添加新增的列（已有数据取列的默认值，生成列按已有数据计算）"""
+        for table_name, column_name, alter_sql in DatabaseSchema.COLUMN_MIGRATIONS:
+            # table_xinfo才包含生成列
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table_name})")}
+            if column_name not in columns:
+                conn.execute(alter_sql)
+                logger.info(f"数据库迁移: {table_name}表添加{column_name}列")
+    
     def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
         """执行查询并返回结果"""
         with self.get_connection() as conn:
@@ -87,6 +143,65 @@ class DatabaseManager:
             conn.commit()
             return cursor.lastrowid
     
+    def execute_many_insert(self, query: str, params_seq: Iterable[Sequence],
+                            chunk_size: int = DEFAULT_INSERT_CHUNK_SIZE) -> List[int]:
+        """
+        在一个事务中批量插入，返回新记录的ID（与参数顺序一致）
+        
+        按chunk_size分块executemany，全部成功后提交一次（只有一次磁盘同步），任一行失败时整体回滚。
+        事务以BEGIN IMMEDIATE开始，持有写锁期间新记录的ID连续分配，每块的ID由last_insert_rowid()倒推，
+        因此query必须是不指定主键、不忽略冲突的普通INSERT
+        
+        当前线程的连接上已有未提交的事务时，插入在该事务的保存点中执行：失败只回滚本次插入，
+        成功后不提交，由调用方决定提交或回滚
+        
+        Args:
+            query: 插入语句
+            params_seq: 每行的参数
+            chunk_size: 每次executemany的行数
+        
+        Returns:
+            新记录的ID列表
+        """
+        chunk_size = max(1, int(chunk_size))
+        params_iter = iter(params_seq)
+        chunk = list(islice(params_iter, chunk_size))
+        if not chunk:
+            return []
+        
+        conn = self._thread_connection()
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT execute_many_insert")
+            try:
+                record_ids = self._insert_chunks(conn, query, chunk, params_iter, chunk_size)
+            except Exception as e:
+                conn.execute("ROLLBACK TO execute_many_insert")
+                conn.execute("RELEASE execute_many_insert")
+                logger.error(f"数据库操作失败: {e}")
+                raise
+            conn.execute("RELEASE execute_many_insert")
+            return record_ids
+        
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            record_ids = self._insert_chunks(conn, query, chunk, params_iter, chunk_size)
+            conn.commit()
+        return record_ids
+    
+    @staticmethod
+    def _insert_chunks(conn: sqlite3.Connection, query: str, chunk: List[Sequence],
+                       params_iter: Iterable[Sequence], chunk_size: int) -> List[int]:
+        """逐块executemany并按last_insert_rowid()倒推每块的ID（调用方负责事务）"""
+        record_ids: List[int] = []
+        while chunk:
+            cursor = conn.executemany(query, chunk)
+            if cursor.rowcount != len(chunk):
+                raise sqlite3.DatabaseError(f"批量插入行数不一致: 期望{len(chunk)}行，实际{cursor.rowcount}行")
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            record_ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+            chunk = list(islice(params_iter, chunk_size))
+        return record_ids
+    
     def execute_update(self, query: str, params: tuple = None) -> int:
         """执行更新操作并返回影响的行数"""
         with self.get_connection() as conn:
@@ -8,7 +8,7 @@ from typing import Dict, List, Optional, Any, Union, Tuple
 from pathlib import Path
 
 # 导入数据库相关模块
-from .connection import get_db_manager
+from .connection import get_db_manager, DEFAULT_INSERT_CHUNK_SIZE
 from .models import ProcessedRecord, DatabaseSchema
 from .queries import BaseQueries, ExportQueries, StatisticsQueries
 from .sql_loader import load_sql, get_sql_loader
@@ -127,25 +127,61 @@ class DataService:
             logger.error(f"执行SQL更新失败: {e}")
             raise DataServiceError(f"执行SQL更新失败: {e}")
     
-    def batch_create_records(self, records_data: List[Dict[str, Any]]) -> List[int]:
+    def execute_many_insert_sql(self, sql: str, params_list: List[Tuple],
+                                chunk_size: Optional[int] = None) -> List[int]:
+        """
+        在一个事务中批量执行SQL插入语句（executemany）
+        
+        Args:
+            sql: SQL插入语句（不指定主键的普通INSERT）
+            params_list: 每行的SQL参数元组
+            chunk_size: 每次executemany的行数，默认为DEFAULT_INSERT_CHUNK_SIZE
+            
+        Returns:
+            新记录的ID列表（与params_list顺序一致）
+            
+        Raises:
+            DataServiceError: SQL执行失败（整批回滚）
+        """
+        try:
+            record_ids = self.db_manager.execute_many_insert(sql, params_list, chunk_size or DEFAULT_INSERT_CHUNK_SIZE)
+            logger.debug(f"成功批量执行SQL插入，共{len(record_ids)}条记录")
+            return record_ids
+            
+        except Exception as e:
+            logger.error(f"批量执行SQL插入失败: {e}")
+            raise DataServiceError(f"批量执行SQL插入失败: {e}")
+    
+    def batch_create_records(self, records_data: List[Dict[str, Any]], table_name: str = "processed_records",
+                             chunk_size: Optional[int] = None) -> List[int]:
         """
         批量创建记录
         
+        列取第一条记录的键，其他记录缺少的列插入NULL；全部记录在一个事务中插入
+        
         Args:
-            records_data: 记录数据列表
+            records_data: 记录数据列表（列名 -> 值）
+            table_name: 表名
+            chunk_size: 每次executemany的行数
             
         Returns:
-            成功创建的记录ID列表
+            新记录的ID列表（与records_data顺序一致）
+            
+        Raises:
+            DataServiceError: 列名不合法或插入失败（整批回滚）
         """
-        record_ids = []
+        if not records_data:
+            return []
         
-        for record_data in records_data:
-            try:
-                record_id = self.create_record(record_data)
-                record_ids.append(record_id)
-            except DataServiceError as e:
-                logger.error(f"批量创建中跳过失败记录: {e}")
-                continue
+        columns = list(records_data[0].keys())
+        if not columns or not all(column.isidentifier() for column in [table_name] + columns):
+            raise DataServiceError(f"批量创建记录的表名或列名不合法: {table_name}, {columns}")
+        
+        sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        record_ids = self.execute_many_insert_sql(
+            sql, [tuple(record.get(column) for column in columns) for record in records_data], chunk_size
+        )
         
         logger.info(f"批量创建完成，成功创建 {len(record_ids)}/{len(records_data)} 条记录")
         return record_ids
@@ -176,6 +212,56 @@ class DataService:
             logger.error(f"删除表 {table_name} 中的所有数据失败: {e}")
         return False
     
+    def delete_task_data_from_table(self, table_name: str, task_id: str) -> int:
+        """
+        删除指定表中某个任务的数据
+
+        Args:
+            table_name: 表名（需包含task_id列）
+            task_id: 任务ID
+
+        Returns:
+            删除的记录数
+
+        Raises:
+            DataServiceError: 删除失败
+        """
+        try:
+            affected_rows = self.db_manager.execute_update(
+                f"DELETE FROM {table_name} WHERE task_id = ?", (task_id,)
+            )
+            logger.info(f"删除表 {table_name} 中任务 {task_id} 的数据，共 {affected_rows} 条记录")
+            return affected_rows
+        except Exception as e:
+            logger.error(f"删除表 {table_name} 中任务 {task_id} 的数据失败: {e}")
+            raise DataServiceError(f"删除任务数据失败: {e}")
+
+    def delete_expired_data_from_table(self, table_name: str, keep_days: int) -> int:
+        """
+        删除指定表中创建时间早于keep_days天前的数据（数据保留策略）
+
+        Args:
+            table_name: 表名（需包含created_at列）
+            keep_days: 保留天数
+
+        Returns:
+            删除的记录数
+
+        Raises:
+            DataServiceError: 删除失败
+        """
+        try:
+            affected_rows = self.db_manager.execute_update(
+                f"DELETE FROM {table_name} WHERE created_at < datetime('now', ?)", (f"-{int(keep_days)} days",)
+            )
+            if affected_rows > 0:
+                # 历史数据删除后不可恢复，按警告级别记录便于审计
+                logger.warning(f"删除表 {table_name} 中超过 {keep_days} 天的数据，共 {affected_rows} 条记录")
+            return affected_rows
+        except Exception as e:
+            logger.error(f"删除表 {table_name} 中的过期数据失败: {e}")
+            raise DataServiceError(f"删除过期数据失败: {e}")
+
     def drop_table(self, table_name: str) -> bool:
         """
         删除指定表中的所有数据
@@ -3,20 +3,102 @@
 基于第一性原理：存储AI处理的原始结果和解析后的结构化数据
 """
 import sqlite3
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 功能类型包含该关键字的记录为接管记录
+TAKEOVER_KEYWORD = '接管'
+
+# 接管标记：由function_type计算的虚拟生成列，任何写入路径都不需要单独维护，
+# 统计SQL按is_takeover = 1过滤即可使用部分索引，不再对每行做LIKE '%接管%'匹配
+_TAKEOVER_FLAG_COLUMN = (
+    f"is_takeover INTEGER GENERATED ALWAYS AS (COALESCE(instr(function_type, '{TAKEOVER_KEYWORD}') > 0, 0)) VIRTUAL"
+)
+
+# AI结果中的评分字段 -> processed_records表的评分列
+SCORE_COLUMNS = {
+    'Mental_Load': 'mental_load',
+    'Predictable': 'predictability',
+    'Timely_Response': 'timely_response',
+    'Comfort': 'comfort',
+    'Efficiency': 'efficiency',
+    'Features': 'features',
+    'Safety': 'safety',
+}
+
+
+# 统计汇总表的分组键（NULL与空字符串分开统计，与GROUP BY一致）和累计列
+_AGGREGATE_KEY = "task_id, IFNULL(function_type, char(0)), IFNULL(rating, char(0))"
+_AGGREGATE_VALUE_COLUMNS = ('record_count',) + tuple(
+    name for column in SCORE_COLUMNS.values() for name in (f"{column}_sum", f"{column}_count")
+) + ('overall_sum', 'overall_count')
+_AGGREGATE_COLUMNS = ('task_id', 'function_type', 'rating') + _AGGREGATE_VALUE_COLUMNS
+# 各评分维度的合计（忽略NULL）和非空数，平均分 = 合计 / 非空数，与AVG一致
+_AGGREGATE_SCORE_COLUMNS_DDL = ',\n        '.join(
+    f"{column}_sum REAL NOT NULL DEFAULT 0, {column}_count INTEGER NOT NULL DEFAULT 0"
+    for column in SCORE_COLUMNS.values()
+)
+
+
+def _aggregate_delta_sql(row: str, sign: str = '') -> str:
+    """
+    触发器中一行记录对统计汇总表的增量（按_AGGREGATE_COLUMNS顺序）
+
+    Args:
+        row: NEW或OLD
+        sign: ''（插入）或'-'（删除）
+    """
+    overall = ' + '.join(f"{row}.{column}" for column in SCORE_COLUMNS.values())
+    values = [f"{row}.task_id", f"{row}.function_type", f"{row}.rating", f"{sign}1"]
+    for column in SCORE_COLUMNS.values():
+        values += [f"{sign}IFNULL({row}.{column}, 0)", f"{sign}({row}.{column} IS NOT NULL)"]
+    values += [f"{sign}IFNULL(({overall}) / 7.0, 0)", f"{sign}(({overall}) IS NOT NULL)"]
+    return ', '.join(values)
+
+
+def _aggregate_upsert_sql(row: str, sign: str = '') -> str:
+    """把一行记录累加到（sign为'-'时从中减去）所在分组的汇总行"""
+    updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in _AGGREGATE_VALUE_COLUMNS)
+    return (
+        f"INSERT INTO record_aggregates ({', '.join(_AGGREGATE_COLUMNS)}) "
+        f"VALUES ({_aggregate_delta_sql(row, sign)}) "
+        f"ON CONFLICT ({_AGGREGATE_KEY}) DO UPDATE SET {updates};"
+    )
+
+
+def _aggregate_cleanup_sql(row: str) -> str:
+    """删除记录数减为0的汇总行"""
+    return (
+        f"DELETE FROM record_aggregates WHERE task_id = {row}.task_id "
+        f"AND IFNULL(function_type, char(0)) = IFNULL({row}.function_type, char(0)) "
+        f"AND IFNULL(rating, char(0)) = IFNULL({row}.rating, char(0)) "
+        f"AND record_count <= 0;"
+    )
+
+
+def _aggregate_select_sql() -> str:
+    """由processed_records全量计算各分组的汇总行（首次创建汇总表时使用）"""
+    overall = ' + '.join(SCORE_COLUMNS.values())
+    values = ['task_id', 'function_type', 'rating', 'COUNT(*)']
+    for column in SCORE_COLUMNS.values():
+        values += [f"TOTAL({column})", f"COUNT({column})"]
+    values += [f"TOTAL(({overall}) / 7.0)", f"COUNT({overall})"]
+    return f"SELECT {', '.join(values)} FROM processed_records GROUP BY task_id, function_type, rating"
+
+
 class DatabaseSchema:
     """数据库结构定义"""
     
     # 结构化数据表 - 存储语音识别和AI处理的完整数据
-    PROCESSED_RECORDS_TABLE = """
+    PROCESSED_RECORDS_TABLE = f"""
     CREATE TABLE IF NOT EXISTS processed_records (
         id INTEGER PRIMARY KEY AUTOINCREMENT,                    -- 主键ID，自增
+        task_id VARCHAR(64) NOT NULL DEFAULT '',                 -- 任务ID（任务目录名）
         timestamp DATETIME NOT NULL,                             -- 记录时间戳
         original_text TEXT,                                      -- 语音识别的原始文本
         comment TEXT,                                            -- 用户评论内容
@@ -30,7 +112,8 @@ class DatabaseSchema:
         safety DECIMAL(3,1),                                     -- 安全性评分（1-10分）
         rating VARCHAR(10),                                      -- 评级等级：pos(好)/avg(中)/neg(差)/bad(很差)
         is_clipped VARCHAR(2),                                   -- 是否剪辑：是/否
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP            -- 记录创建时间
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,           -- 记录创建时间
+        {_TAKEOVER_FLAG_COLUMN}                                  -- 是否接管记录：1/0（由function_type计算）
     );
     """
     
@@ -41,12 +124,29 @@ class DatabaseSchema:
         "CREATE INDEX IF NOT EXISTS idx_processed_records_function ON processed_records(function_type);",
         "CREATE INDEX IF NOT EXISTS idx_activity_sessions_timestamp ON activity_sessions(timestamp);",
         "CREATE INDEX IF NOT EXISTS idx_activity_sessions_status ON activity_sessions(status);",
+        "CREATE INDEX IF NOT EXISTS idx_processed_records_task ON processed_records(task_id, function_type);",
+        "CREATE INDEX IF NOT EXISTS idx_activity_sessions_task ON activity_sessions(task_id, timestamp);",
+        # 接管统计只读取接管记录，部分索引只包含这些行
+        "CREATE INDEX IF NOT EXISTS idx_processed_records_takeover ON processed_records(task_id, timestamp) "
+        "WHERE is_takeover = 1;",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_record_aggregates_key ON record_aggregates({_AGGREGATE_KEY});",
+    ]
+    
+    # 旧版本数据库缺少的列：(表名, 列名, 添加列的SQL)，在创建索引前补齐
+    COLUMN_MIGRATIONS = [
+        ("processed_records", "task_id",
+         "ALTER TABLE processed_records ADD COLUMN task_id VARCHAR(64) NOT NULL DEFAULT ''"),
+        ("activity_sessions", "task_id",
+         "ALTER TABLE activity_sessions ADD COLUMN task_id VARCHAR(64) NOT NULL DEFAULT ''"),
+        ("processed_records", "is_takeover",
+         f"ALTER TABLE processed_records ADD COLUMN {_TAKEOVER_FLAG_COLUMN}"),
     ]
     
     # 活动状态表 - 存储测试活动的开始和结束状态
     ACTIVITY_SESSIONS_TABLE = """
     CREATE TABLE IF NOT EXISTS activity_sessions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,                    -- 主键ID，自增
+        task_id VARCHAR(64) NOT NULL DEFAULT '',                 -- 任务ID（任务目录名）
         timestamp DATETIME NOT NULL,                             -- 状态变更时间戳
         original_text TEXT,                                      -- 语音识别的原始文本
         status VARCHAR(10) NOT NULL,                             -- 活动状态：start/end
@@ -55,6 +155,66 @@ class DatabaseSchema:
     );
     """
 
+    # 统计汇总表 - 按(任务, 功能类型, 评级)分组的记录数和各评分维度的合计/非空数，
+    # 由processed_records上的触发器在插入、删除、更新时同步维护，评级/场景评级/平均分统计只需汇总分组行
+    RECORD_AGGREGATES_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS record_aggregates (
+        task_id VARCHAR(64) NOT NULL,                            -- 任务ID
+        function_type VARCHAR(50),                               -- 功能场景类型
+        rating VARCHAR(10),                                      -- 评级等级
+        record_count INTEGER NOT NULL DEFAULT 0,                 -- 记录数
+        {_AGGREGATE_SCORE_COLUMNS_DDL},
+        overall_sum REAL NOT NULL DEFAULT 0,                     -- 七项评分都不为空的记录的七项平均分合计
+        overall_count INTEGER NOT NULL DEFAULT 0                 -- 七项评分都不为空的记录数
+    );
+    """
+
+    # 维护统计汇总表的触发器
+    TRIGGERS = [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_record_aggregates_insert AFTER INSERT ON processed_records
+        BEGIN
+            {_aggregate_upsert_sql('NEW')}
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_record_aggregates_delete AFTER DELETE ON processed_records
+        BEGIN
+            {_aggregate_upsert_sql('OLD', '-')}
+            {_aggregate_cleanup_sql('OLD')}
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_record_aggregates_update
+        AFTER UPDATE OF task_id, function_type, rating, {', '.join(SCORE_COLUMNS.values())} ON processed_records
+        BEGIN
+            {_aggregate_upsert_sql('OLD', '-')}
+            {_aggregate_cleanup_sql('OLD')}
+            {_aggregate_upsert_sql('NEW')}
+        END;
+        """,
+    ]
+
+    # 按已有记录重建统计汇总表
+    RECORD_AGGREGATES_REBUILD = [
+        "DELETE FROM record_aggregates;",
+        f"INSERT INTO record_aggregates ({', '.join(_AGGREGATE_COLUMNS)}) {_aggregate_select_sql()};",
+    ]
+
+    # 任务断点表 - 按(任务目录, 行号)记录每行的AI处理结果，任务中途失败后重新执行时复用
+    TASK_CHECKPOINTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS task_checkpoints (
+        task_dir TEXT NOT NULL,                                  -- 任务目录名
+        row_index INTEGER NOT NULL,                              -- Excel行号
+        original_text TEXT,                                      -- 语音识别的原始文本（文本变化时断点失效）
+        ai_result TEXT,                                          -- AI处理结果
+        status VARCHAR(10) NOT NULL,                             -- 处理状态：success/failed/error
+        error_message TEXT,                                      -- 错误信息
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,           -- 更新时间
+        PRIMARY KEY (task_dir, row_index)
+    );
+    """
+
 class ProcessedRecord:
     """AI处理的完整数据模型"""
     
@@ -92,3 +252,72 @@ class ProcessedRecord:
             'safety': self.scores.get('Safety', 0)
         })
         return result
+
+
+@dataclass(slots=True)
+class ProcessedRow:
+    """
+    流水线中的单行处理记录
+
+    AI结果只解析一次，之后以该对象在评分维度展开、评级和入库之间传递，
+    字段与processed_records表的列一一对应（使用__slots__，大任务下内存占用和属性访问开销都更小）
+    """
+    timestamp: str
+    task_id: str = ''
+    original_text: str = ''
+    comment: str = ''
+    function_type: str = ''
+    rating: str = 'bad'
+    mental_load: float = 0.0
+    predictability: float = 0.0
+    timely_response: float = 0.0
+    comfort: float = 0.0
+    efficiency: float = 0.0
+    features: float = 0.0
+    safety: float = 0.0
+    is_clipped: str = '否'
+    row_index: Optional[int] = None
+
+    # 插入processed_records的列，顺序与to_params一致
+    INSERT_COLUMNS = (
+        'task_id', 'timestamp', 'original_text', 'comment', 'function_type', 'rating',
+        'mental_load', 'predictability', 'timely_response', 'comfort',
+        'efficiency', 'features', 'safety', 'is_clipped',
+    )
+
+    @classmethod
+    def from_ai_data(cls, ai_data: Dict[str, Any], timestamp: str, original_text: str = '',
+                     rating: str = 'bad', row_index: Optional[int] = None,
+                     task_id: str = '') -> 'ProcessedRow':
+        """
+        由展开评分维度后的AI结果字典创建记录
+
+        Args:
+            ai_data: AI结果（已包含Mental_Load等英文评分字段）
+            timestamp: 时间戳字符串
+            original_text: 语音识别原始文本
+            rating: 评级
+            row_index: Excel行号（仅用于日志）
+            task_id: 任务ID
+        """
+        row = cls(
+            timestamp=timestamp,
+            task_id=task_id,
+            original_text=original_text,
+            comment=ai_data.get('comment', ''),
+            function_type=ai_data.get('function', ''),
+            rating=rating,
+            is_clipped=ai_data.get('是否剪辑', '否'),
+            row_index=row_index,
+        )
+        for field_name, column in SCORE_COLUMNS.items():
+            setattr(row, column, ai_data.get(field_name, 0.0))
+        return row
+
+    def to_params(self) -> Tuple:
+        """按INSERT_COLUMNS顺序返回SQL参数元组"""
+        return (
+            self.task_id, self.timestamp, self.original_text, self.comment, self.function_type, self.rating,
+            self.mental_load, self.predictability, self.timely_response, self.comfort,
+            self.efficiency, self.features, self.safety, self.is_clipped,
+        )
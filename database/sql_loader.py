@@ -1,32 +1,65 @@
 """
 SQL加载器 - 统一管理和加载SQL文件
+
+每个SQL目录对应一个加载器（默认为当前任务的业务目录 business_logic/<task.name>/），
+首次使用时加载并校验目录下所有SQL，之后直接返回内存中的内容；
+文件修改时间按check_interval间隔检查，只有修改时间变化的文件才会重新读取（热更新）
 """
-import os
+import re
+import time
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, Optional
-from functools import lru_cache
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# 项目根目录
+project_root = Path(__file__).parent.parent
+
+# 默认的文件修改时间检查间隔（秒），间隔内的重复加载不访问文件系统
+DEFAULT_CHECK_INTERVAL = 1.0
+
+# SQL中的命名参数（:task_id）
+_NAMED_PARAM_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def default_sql_dir() -> Path:
+    """当前任务的SQL目录：business_logic/<task.name>/"""
+    from config_manager import get_config
+    return project_root / 'business_logic' / get_config().task['name']
+
+
+class _CachedSQL:
+    """缓存的SQL内容"""
+    __slots__ = ('content', 'mtime_ns', 'checked_at')
+    
+    def __init__(self, content: str, mtime_ns: int, checked_at: float):
+        self.content = content
+        self.mtime_ns = mtime_ns
+        self.checked_at = checked_at
+
+
 class SQLLoader:
     """SQL文件加载器"""
     
-    def __init__(self, sql_dir: str = None):
+    def __init__(self, sql_dir: str = None, check_interval: float = DEFAULT_CHECK_INTERVAL):
         """
         初始化SQL加载器
         
         Args:
-            sql_dir: SQL文件目录，默认为当前目录下的sql文件夹
+            sql_dir: SQL文件目录，默认为当前任务的业务目录
+            check_interval: 文件修改时间检查间隔（秒），0表示每次加载都检查
         """
-        if sql_dir is None:
-            # 获取当前文件所在目录
-            current_dir = Path(__file__).parent
-            sql_dir = current_dir / 'sql'
-        
-        self.sql_dir = Path(sql_dir)
+        self.sql_dir = Path(sql_dir) if sql_dir is not None else default_sql_dir()
+        self.check_interval = check_interval
         self._validate_sql_directory()
         
+        self._cache: Dict[str, _CachedSQL] = {}
+        self._lock = threading.Lock()
+        # 最近一次validate_with_database的结果（未校验时为None）
+        self.validation_results: Optional[Dict[str, Optional[str]]] = None
+        
         logger.info(f"SQL加载器初始化完成，SQL目录: {self.sql_dir}")
     
     def _validate_sql_directory(self):
@@ -37,34 +70,43 @@ class SQLLoader:
         if not self.sql_dir.is_dir():
             raise NotADirectoryError(f"SQL路径不是目录: {self.sql_dir}")
     
-    @lru_cache(maxsize=32)
+    @staticmethod
+    def _normalize_filename(filename: str) -> str:
+        """确保文件名有.sql扩展名"""
+        return filename if filename.endswith('.sql') else filename + '.sql'
+    
     def load_sql(self, filename: str) -> str:
         """
         加载SQL文件内容
         
+        距上次检查不足check_interval时直接返回缓存；否则检查文件修改时间，未变化时仍返回缓存
+        
         Args:
             filename: SQL文件名（可以带.sql扩展名，也可以不带）
-            
+        
         Returns:
             SQL文件内容
-            
+        
         Raises:
             FileNotFoundError: 当SQL文件不存在时
             IOError: 当读取文件失败时
         """
-        # 确保文件名有.sql扩展名
-        if not filename.endswith('.sql'):
-            filename += '.sql'
+        filename = self._normalize_filename(filename)
+        entry = self._cache.get(filename)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry.content
         
         sql_file_path = self.sql_dir / filename
-        
         try:
+            mtime_ns = sql_file_path.stat().st_mtime_ns
+            if entry is not None and entry.mtime_ns == mtime_ns:
+                entry.checked_at = now
+                return entry.content
+            
             with open(sql_file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            
-            logger.debug(f"成功加载SQL文件: {filename}")
-            return content
-            
+        
         except FileNotFoundError:
             logger.error(f"SQL文件不存在: {filename}")
             raise FileNotFoundError(f"SQL文件不存在: {sql_file_path}")
@@ -72,6 +114,51 @@ class SQLLoader:
         except IOError as e:
             logger.error(f"读取SQL文件失败: {filename}, 错误: {e}")
             raise IOError(f"读取SQL文件失败: {sql_file_path}, 错误: {e}")
+        
+        with self._lock:
+            self._cache[filename] = _CachedSQL(content, mtime_ns, now)
+        if entry is not None:
+            logger.info(f"SQL文件已修改，重新加载: {filename}")
+        else:
+            logger.debug(f"成功加载SQL文件: {filename}")
+        return content
+    
+    def preload(self) -> List[str]:
+        """
+        加载目录下所有SQL文件
+        
+        Returns:
+            加载的SQL文件名列表
+        """
+        filenames = self.list_sql_files()
+        for filename in filenames:
+            self.load_sql(filename)
+        return filenames
+    
+    def validate_with_database(self, db_manager) -> Dict[str, Optional[str]]:
+        """
+        在数据库上编译（EXPLAIN）目录下所有SQL，检查语法和引用的表、列是否存在
+        
+        Args:
+            db_manager: 数据库管理器
+        
+        Returns:
+            文件名 -> 错误信息（通过时为None）
+        """
+        results = {}
+        with db_manager.get_connection() as conn:
+            for filename in self.preload():
+                content = self.load_sql(filename)
+                params = dict.fromkeys(_NAMED_PARAM_PATTERN.findall(content))
+                try:
+                    conn.execute(f"EXPLAIN {content.strip().rstrip(';')}", params).fetchall()
+                    results[filename] = None
+                except Exception as e:
+                    results[filename] = str(e)
+                    logger.error(f"SQL校验失败: {filename}, 错误: {e}")
+        self.validation_results = results
+        logger.info(f"SQL校验完成: {sum(error is None for error in results.values())}/{len(results)}个通过")
+        return results
     
     def load_sql_with_params(self, filename: str, params: Dict[str, any] = None) -> str:
         """
@@ -80,7 +167,7 @@ class SQLLoader:
         Args:
             filename: SQL文件名
             params: 参数字典，用于替换SQL中的占位符
-            
+        
         Returns:
             参数替换后的SQL内容
         """
@@ -111,23 +198,23 @@ class SQLLoader:
             
             logger.info(f"发现 {len(sql_files)} 个SQL文件")
             return sorted(sql_files)
-            
+        
         except Exception as e:
             logger.error(f"列出SQL文件失败: {e}")
             return []
     
     def reload_sql(self, filename: str) -> str:
         """
-        重新加载SQL文件（清除缓存）
+        重新加载SQL文件（清除该文件的缓存）
         
         Args:
             filename: SQL文件名
-            
+        
         Returns:
             重新加载的SQL内容
         """
-        # 清除缓存
-        self.load_sql.cache_clear()
+        with self._lock:
+            self._cache.pop(self._normalize_filename(filename), None)
         
         # 重新加载
         return self.load_sql(filename)
@@ -138,13 +225,11 @@ class SQLLoader:
         
         Args:
             filename: SQL文件名
-            
+        
         Returns:
             包含文件信息的字典
         """
-        if not filename.endswith('.sql'):
-            filename += '.sql'
-        
+        filename = self._normalize_filename(filename)
         sql_file_path = self.sql_dir / filename
         
         try:
@@ -160,7 +245,7 @@ class SQLLoader:
                 'character_count': len(content),
                 'exists': True
             }
-            
+        
         except FileNotFoundError:
             return {
                 'filename': filename,
@@ -174,7 +259,7 @@ class SQLLoader:
         
         Args:
             filename: SQL文件名
-            
+        
         Returns:
             验证结果字典
         """
@@ -204,7 +289,7 @@ class SQLLoader:
                 'issues': issues,
                 'line_count': len(content.splitlines())
             }
-            
+        
         except Exception as e:
             return {
                 'filename': filename,
@@ -213,25 +298,28 @@ class SQLLoader:
                 'line_count': 0
             }
 
-# 全局SQL加载器实例
-_sql_loader = None
+# 全局SQL加载器实例（SQL目录 -> 加载器）
+_sql_loaders: Dict[str, SQLLoader] = {}
+_sql_loaders_lock = threading.Lock()
 
 def get_sql_loader(sql_dir: str = None) -> SQLLoader:
     """
-    获取SQL加载器单例
+    获取SQL目录对应的加载器单例
     
     Args:
-        sql_dir: SQL文件目录
-        
+        sql_dir: SQL文件目录，默认为当前任务的业务目录
+    
     Returns:
         SQL加载器实例
     """
-    global _sql_loader
-    
-    if _sql_loader is None:
-        _sql_loader = SQLLoader(sql_dir)
-    
-    return _sql_loader
+    key = str(Path(sql_dir).resolve() if sql_dir is not None else default_sql_dir().resolve())
+    loader = _sql_loaders.get(key)
+    if loader is None:
+        with _sql_loaders_lock:
+            loader = _sql_loaders.get(key)
+            if loader is None:
+                loader = _sql_loaders[key] = SQLLoader(key)
+    return loader
 
 # 便捷函数
 def load_sql(filename: str, params: Dict[str, any] = None) -> str:
@@ -241,7 +329,7 @@ def load_sql(filename: str, params: Dict[str, any] = None) -> str:
     Args:
         filename: SQL文件名
         params: 参数字典
-        
+    
     Returns:
         SQL内容
     """
@@ -1,13 +1,184 @@
 """
 JSON工具类 - 提供JSON格式验证、修复和解析功能
+
+解析先走快速路径（安装了orjson时使用orjson，否则使用标准库json的C实现），
+失败时用单遍扫描的容错解析器处理模型输出中常见的问题：
+代码块标记和前后说明文字、键名缺少引号、单引号字符串、末尾多余逗号、分号分隔、被截断的对象
 """
 import json
 import re
 import logging
 from typing import Dict, Any, Optional, Union
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# 快速路径使用的解析函数（orjson.JSONDecodeError是ValueError的子类）
+_fast_loads = orjson.loads if orjson is not None else json.loads
+
+_NUMBER_PATTERN = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_WHITESPACE_PATTERN = re.compile(r'\s*')
+# 字符串中需要特殊处理的字符：结束引号或转义符
+_STRING_SPECIAL = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+# 无引号键名在这些字符处结束
+_BARE_KEY_END = re.compile(r'[:：,;，；{}\[\]\s]')
+# 无引号值在这些字符处结束
+_BARE_VALUE_END = re.compile(r'[,;，；}\]\n]')
+
+# 分隔符（容忍分号和全角标点）
+_SEPARATORS = frozenset(',;，；')
+# 数字后允许出现的字符
+_VALUE_TERMINATORS = frozenset(' \t\r\n}]') | _SEPARATORS
+
+_LITERALS = {'true': True, 'false': False, 'null': None,
+             'True': True, 'False': False, 'None': None}
+_ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class _TolerantParser:
+    """单遍容错JSON解析器：每个字符至多扫描一次，输入截断时按已读内容闭合"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.pos = 0
+
+    def parse(self) -> Any:
+        """从第一个{或[开始解析一个值，找不到时抛出ValueError"""
+        text = self.text
+        # 跳过思考块
+        think_end = text.rfind('</think>')
+        start = think_end + len('</think>') if think_end != -1 else 0
+        starts = [i for i in (text.find('{', start), text.find('[', start)) if i != -1]
+        if not starts:
+            raise ValueError("未找到JSON对象")
+        self.pos = min(starts)
+        return self._parse_value()
+
+    def _skip_whitespace(self) -> None:
+        self.pos = _WHITESPACE_PATTERN.match(self.text, self.pos).end()
+
+    def _peek(self) -> str:
+        return self.text[self.pos] if self.pos < self.length else ''
+
+    def _parse_value(self) -> Any:
+        self._skip_whitespace()
+        char = self._peek()
+        if char == '{':
+            return self._parse_object()
+        if char == '[':
+            return self._parse_array()
+        if char in ('"', "'"):
+            return self._parse_string()
+        match = _NUMBER_PATTERN.match(self.text, self.pos)
+        if match and (match.end() == self.length or self.text[match.end()] in _VALUE_TERMINATORS):
+            self.pos = match.end()
+            number = match.group(0)
+            return float(number) if any(c in number for c in '.eE') else int(number)
+        return self._parse_bare_value()
+
+    def _parse_object(self) -> Dict[str, Any]:
+        self.pos += 1
+        result = {}
+        while True:
+            self._skip_separators()
+            char = self._peek()
+            if char == '' or char == '}':
+                self.pos += 1 if char else 0
+                return result
+            if char == ']':
+                # 括号不匹配，视为对象结束
+                return result
+
+            key = self._parse_string() if char in ('"', "'") else self._parse_bare_key()
+            self._skip_whitespace()
+            if self._peek() not in (':', '：'):
+                # 截断或缺少冒号：丢弃不完整的键
+                if self._peek() == '':
+                    return result
+                continue
+            self.pos += 1
+            self._skip_whitespace()
+            if self._peek() == '' or self._peek() == '}' or self._peek() in _SEPARATORS:
+                # 截断在冒号之后或值缺失：丢弃该键
+                continue
+            result[key] = self._parse_value()
+
+    def _parse_array(self) -> list:
+        self.pos += 1
+        result = []
+        while True:
+            self._skip_separators()
+            char = self._peek()
+            if char == '' or char == ']':
+                self.pos += 1 if char else 0
+                return result
+            if char == '}':
+                return result
+            result.append(self._parse_value())
+
+    def _skip_separators(self) -> None:
+        """跳过空白和分隔符（容忍多余和缺失的分隔符）"""
+        while True:
+            self._skip_whitespace()
+            if self._peek() in _SEPARATORS:
+                self.pos += 1
+            else:
+                return
+
+    def _parse_string(self) -> str:
+        quote = self.text[self.pos]
+        self.pos += 1
+        special = _STRING_SPECIAL[quote]
+        chunks = []
+        while True:
+            match = special.search(self.text, self.pos)
+            if match is None:
+                # 字符串被截断
+                chunks.append(self.text[self.pos:])
+                self.pos = self.length
+                return ''.join(chunks)
+            chunks.append(self.text[self.pos:match.start()])
+            self.pos = match.end()
+            if match.group(0) == quote:
+                return ''.join(chunks)
+            # 转义序列
+            escape = self._peek()
+            if escape == 'u' and self.pos + 5 <= self.length:
+                try:
+                    chunks.append(chr(int(self.text[self.pos + 1:self.pos + 5], 16)))
+                    self.pos += 5
+                    continue
+                except ValueError:
+                    pass
+            if escape:
+                chunks.append(_ESCAPES.get(escape, escape))
+                self.pos += 1
+
+    def _parse_bare_key(self) -> str:
+        match = _BARE_KEY_END.search(self.text, self.pos)
+        end = match.start() if match else self.length
+        key = self.text[self.pos:end]
+        if not key:
+            # 无法识别的字符，跳过以保证前进
+            self.pos += 1
+        else:
+            self.pos = end
+        return key
+
+    def _parse_bare_value(self) -> Any:
+        match = _BARE_VALUE_END.search(self.text, self.pos)
+        end = match.start() if match else self.length
+        value = self.text[self.pos:end].strip()
+        self.pos = max(end, self.pos + 1) if not value else end
+        if value in _LITERALS:
+            return _LITERALS[value]
+        return value or None
+
 
 class JSONUtils:
     """JSON处理工具类"""
@@ -27,9 +198,9 @@ class JSONUtils:
             return False
         
         try:
-            json.loads(text.strip())
+            _fast_loads(text.strip())
             return True
-        except json.JSONDecodeError:
+        except ValueError:
             return False
     
     @staticmethod
@@ -57,36 +228,43 @@ class JSONUtils:
         
         return None
     
+    @staticmethod
+    def tolerant_parse(text: str) -> Optional[Any]:
+        """
+        单遍容错解析：从文本中的第一个JSON对象/数组开始解析，容忍常见格式问题
+        
+        Args:
+            text: 包含JSON的文本（可以带代码块标记、说明文字或思考块）
+            
+        Returns:
+            解析得到的对象或数组，找不到JSON时返回None
+        """
+        if not text:
+            return None
+        try:
+            return _TolerantParser(text).parse()
+        except (ValueError, RecursionError) as e:
+            logger.debug(f"容错解析JSON失败: {e}")
+            return None
+    
     @staticmethod
     def fix_common_json_issues(text: str) -> str:
         """
-        修复常见的JSON格式问题
+        修复常见的JSON格式问题（容错解析后重新序列化，不改动字符串值中的内容）
         
         Args:
             text: 需要修复的JSON字符串
             
         Returns:
-            str: 修复后的JSON字符串
+            str: 修复后的JSON字符串，无法解析时返回去除首尾空白的原文
         """
         if not text or not text.strip():
             return text
         
-        # 移除前后空白
-        fixed = text.strip()
-        
-        # 修复常见的引号问题
-        # 将 "; 替换为 ",
-        fixed = fixed.replace('";', '",')
-        # 将 '; 替换为 ',
-        fixed = fixed.replace("';", "',")
-        
-        # 修复键名缺少引号的问题
-        fixed = re.sub(r'(\w+):', r'"\1":', fixed)
-        
-        # 移除多余的逗号（JSON对象或数组末尾的逗号）
-        fixed = re.sub(r',(\s*[}\]])', r'\1', fixed)
-        
-        return fixed
+        data = JSONUtils.tolerant_parse(text)
+        if data is None:
+            return text.strip()
+        return json.dumps(data, ensure_ascii=False)
     
     @staticmethod
     def safe_parse_json(text: str, fix_errors: bool = True) -> Optional[Dict[str, Any]]:
@@ -104,29 +282,19 @@ class JSONUtils:
             logger.warning("JSON字符串为空")
             return None
         
-        # 首先尝试直接解析
+        # 快速路径：合法JSON直接解析
         try:
-            return json.loads(text.strip())
-        except json.JSONDecodeError as e:
+            return _fast_loads(text.strip())
+        except ValueError as e:
             logger.debug(f"直接解析JSON失败: {e}")
             
             if not fix_errors:
                 return None
         
-        # 尝试提取JSON部分
-        extracted = JSONUtils.extract_json_from_text(text)
-        if extracted:
-            try:
-                return json.loads(extracted)
-            except json.JSONDecodeError:
-                logger.debug("提取的JSON部分解析失败，尝试修复")
-                
-                # 尝试修复常见问题
-                fixed = JSONUtils.fix_common_json_issues(extracted)
-                try:
-                    return json.loads(fixed)
-                except json.JSONDecodeError as e:
-                    logger.warning(f"修复后仍无法解析JSON: {e}")
+        # 容错解析（单遍扫描）
+        result = JSONUtils.tolerant_parse(text)
+        if result is not None:
+            return result
         
         logger.warning(f"无法解析JSON，原始内容: {text[:100]}...")
         return None